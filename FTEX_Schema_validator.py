@@ -1,9 +1,17 @@
 import json
+import os
 import sys
 import argparse
+import hashlib
 from collections import Counter
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+
+# Protocol JSONs the test datasets and featuresets are checked against (by default)
+PROTOCOL_FILES = [
+    "FTEX_Controller_Public_CANOpen/FTEX_Controller_CANOpen_Protocol.json",
+    "FTEX_Controller_Internal_CANOpen/FTEX_Controller_Internal_CANOpen_Protocol.json",
+    "FTEX_Peripherals_CANOpen/FTEX_BMS_CANOpen/FTEX_BMS_CANOpen_Protocol.json",
+    "FTEX_Peripherals_CANOpen/FTEX_PAS_CANOpen_protocol.json",
+]
 
 # Allowed integer types for parameters using Valid_Flags
 INT_TYPES = {"uint8_t", "uint16_t", "uint32_t", "int8_t", "int16_t", "int32_t"}
@@ -18,6 +26,16 @@ TYPE_MAX_VALUES = {
     "int32_t": 0x7FFFFFFF,
 }
 
+# Minimum values for each integer type
+TYPE_MIN_VALUES = {
+    "uint8_t": 0,
+    "uint16_t": 0,
+    "uint32_t": 0,
+    "int8_t": -0x80,
+    "int16_t": -0x8000,
+    "int32_t": -0x80000000,
+}
+
 # Custom exception for duplicate keys
 class DuplicateKeyError(Exception):
     pass
@@ -35,18 +53,54 @@ def json_load_with_duplicates_check(file_path):
     with open(file_path, 'r') as file:
         return json.load(file, object_pairs_hook=raise_on_duplicates)
 
+# Check the schema and build its validator, once for all the validated files
+def schema_validator(schema):
+    # jsonschema takes longer to import than the rest of the validation: only load it when needed
+    from jsonschema.validators import validator_for
+
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
 # Function to validate JSON data against the schema
-def validate_json(data, schema):
-    try:
-        validate(instance=data, schema=schema)
-        print("Schema validation passed.")
-    except ValidationError as err:
+def validate_json(data, schema, validator=None):
+    from jsonschema.exceptions import best_match
+
+    # Same error as jsonschema.validate(), without checking the schema again for every file
+    err = best_match((validator or schema_validator(schema)).iter_errors(data))
+    if err is not None:
         print("Schema validation failed.")
         print(f"Validation error message:\n{err.message}")
         print(f"Error occurred at: {' -> '.join(map(str, err.absolute_path))}")
         return False
+    print("Schema validation passed.")
     return True
 
+# Validation cache: data file path -> hash of the schema and data file contents that passed
+def schema_validation_key(schema_path, data_path):
+    digest = hashlib.sha256()
+    for path in (schema_path, data_path):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def load_validation_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_validation_cache(cache_path, cache):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(cache, file, indent=4)
+        os.replace(tmp_path, cache_path)
+    except OSError as err:
+        print(f"Could not write the validation cache: {err}")
+
 # Function to check uniqueness of CO_ID keys
 def validate_unique_co_ids(data):
     print("Running CO_ID validation...")
@@ -301,15 +355,171 @@ def validate_active_sub_code_consistency(data):
     print(f"All {len(active_sub_code_params)} CO_PARAM_ACTIVE_SUB_CODE parameters have consistent Valid_Options.")
     return True
 
-# class argument:
-#     schema_file = ""
-#     data_file = ""
+# Hashed index of the protocol parameters, for the test files: every reference is a dictionary lookup
+class ProtocolIndex:
+    def __init__(self):
+        self.by_name = {}  # parameter name -> [parameter data], one per protocol defining the name
+        self.by_address = {}  # (index, subindex) -> [parameter data] (the peripherals reuse controller indexes)
+        self.co_ids = {}  # CO_ID -> parameter names
+
+    # Parameter names defined by several protocols: {name: [protocol files]}
+    def duplicate_names(self):
+        return {name: [param["_protocol"] for param in params] for name, params in self.by_name.items() if len(params) > 1}
+
+    def add_protocol(self, data, protocol_file=None):
+        for key, value in data.items():
+            if key == "protocol" or not isinstance(value, dict):
+                continue
+            for co_id, co_id_data in value.items():
+                if not co_id.startswith("CO_ID_") or not isinstance(co_id_data, dict):
+                    continue
+                index = int(co_id_data["CANOpen_Index"], 16)
+                params = co_id_data.get("Parameters", {})
+                self.co_ids.setdefault(co_id, []).extend(params)
+                for param_name, param_data in params.items():
+                    param = dict(param_data, Name=param_name, _protocol=protocol_file)
+                    # Valid_Options and Valid_Flags prepared once: each value check is a set lookup or a mask
+                    if isinstance(param_data.get("Valid_Options"), list):
+                        param["_option_values"] = {option.get("value") for option in param_data["Valid_Options"]}
+                    if isinstance(param_data.get("Valid_Flags"), list):
+                        param["_flags_mask"] = 0
+                        for flag in param_data["Valid_Flags"]:
+                            param["_flags_mask"] |= flag.get("value", 0)
+                    self.by_name.setdefault(param_name, []).append(param)
+                    self.by_address.setdefault((index, int(param_data["Subindex"], 16)), []).append(param)
+
+def access_allows(protocol_access, access):
+    # "R/W" allows "R", "W" and "R/W"
+    return set(access.split("/")) <= set((protocol_access or "").split("/"))
+
+# Every error of a value of a parameter of the index: Type bounds, Valid_Range, Valid_Options, Valid_Flags
+def check_parameter_value(param, value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        return [f"{value!r} is not an integer"]
+    errors = []
+    type_name = param.get("Type")
+    if type_name in TYPE_MAX_VALUES and not TYPE_MIN_VALUES[type_name] <= value <= TYPE_MAX_VALUES[type_name]:
+        errors.append(f"{value} out of {type_name} bounds")
+    valid_range = param.get("Valid_Range")
+    if isinstance(valid_range, dict) and not valid_range.get("min", value) <= value <= valid_range.get("max", value):
+        errors.append(f"{value} out of Valid_Range [{valid_range.get('min')}, {valid_range.get('max')}]")
+    option_values = param.get("_option_values")
+    if option_values is not None and value not in option_values:
+        errors.append(f"{value} not in Valid_Options {sorted(option_values)}")
+    flags_mask = param.get("_flags_mask")
+    if flags_mask is not None and value & ~flags_mask:
+        errors.append(f"{value} sets bits outside Valid_Flags ({flags_mask:#x})")
+    return errors
+
+# Walk a test file: yield (location, parameter name, values) for the datasets, and
+# (location, index, subindex, access) for the featureset entries referencing a parameter by index
+def iter_parameter_references(obj, path_prefix=None):
+    if path_prefix is None:
+        path_prefix = []
+    if not isinstance(obj, dict):
+        return
+    for key, value in obj.items():
+        location = path_prefix + [key]
+        if isinstance(value, dict) and "index" in value and "subindex" in value:
+            yield location, None, value
+        elif key.startswith("CO_PARAM") or key.startswith("CO_ID_"):
+            yield location, key, value if isinstance(value, list) else [value]
+        elif isinstance(value, dict):
+            yield from iter_parameter_references(value, location)
+
+# Function to validate a test dataset or featureset against the protocol parameters
+def validate_test_file(data, protocol_index, write_test=False):
+    print("Running protocol reference validation...")
+    errors = []
+    references = 0
+    for location, param_name, reference in iter_parameter_references(data):
+        references += 1
+        where = " -> ".join(location)
+        if param_name is not None:
+            params = protocol_index.by_name.get(param_name)
+            if params is not None and len(params) > 1:
+                protocol_files = ", ".join(str(param["_protocol"]) for param in params)
+                errors.append(f"{where}: {param_name} is ambiguous, defined by several protocols ({protocol_files})")
+                continue
+            param = params[0] if params else None
+            if param is None:
+                if param_name in protocol_index.co_ids:
+                    params = protocol_index.co_ids[param_name]
+                    errors.append(f"{where}: {param_name} is an object, not a parameter (parameters: {', '.join(params)})")
+                else:
+                    errors.append(f"{where}: unknown parameter {param_name}")
+                continue
+            if write_test and not access_allows(param.get("Access"), "W"):
+                errors.append(f"{where}: written by the test but its Access is {param.get('Access')}")
+            for value in reference:
+                errors.extend(f"{where}: {error}" for error in check_parameter_value(param, value))
+            continue
+
+        try:
+            address = (int(str(reference["index"]), 16), int(str(reference["subindex"]), 16))
+        except ValueError:
+            errors.append(f"{where}: invalid index/subindex {reference['index']}/{reference['subindex']}")
+            continue
+        candidates = protocol_index.by_address.get(address)
+        if not candidates:
+            errors.append(f"{where}: no parameter at index {reference['index']} subindex {reference['subindex']}")
+            continue
+        access = reference.get("access")
+        if access and not any(access_allows(param.get("Access"), access) for param in candidates):
+            found = ", ".join(f"{param['Name']} ({param.get('Access')})" for param in candidates)
+            errors.append(f"{where}: access {access} not allowed by {found}")
+
+    if errors:
+        print("Protocol reference validation errors:")
+        for e in errors:
+            print(f"- {e}")
+        return False
+    print(f"All {references} parameter references match the protocol.")
+    return True
+
+# Function to run every check of a protocol JSON
+def validate_protocol(data, schema, validator, cached=False):
+    if cached:
+        print("Schema validation passed (unchanged since the last validation).")
+        schema_validation_passed = True
+    else:
+        schema_validation_passed = validate_json(data, schema, validator)
+    co_id_validation_passed = validate_unique_co_ids(data)
+    canopen_index_validation_passed = validate_unique_canopen_indexes(data)
+    unique_subindexes_passed = check_unique_subindexes(data)
+    param_names_passed = check_parameter_names(data)
+    valid_flags_passed = validate_valid_flags(data)
+    active_sub_code_consistency_passed = validate_active_sub_code_consistency(data)
+    return (schema_validation_passed and co_id_validation_passed and canopen_index_validation_passed and
+            unique_subindexes_passed and param_names_passed and valid_flags_passed and active_sub_code_consistency_passed)
+
+# JSON files of the given paths, directories walked recursively (hidden directories skipped)
+def collect_json_files(paths):
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.json'))
+    return files
+
+def is_protocol(data):
+    return isinstance(data, dict) and "protocol" in data
 
 def main():
     # Set up command-line argument parsing
-    parser = argparse.ArgumentParser(description='Validate JSON data against a JSON Schema.')
+    parser = argparse.ArgumentParser(description='Validate protocol JSONs against a JSON Schema, and test datasets '
+                                                 'and featuresets against the protocol JSONs.')
     parser.add_argument('schema_file', help='Path to the JSON Schema file')
-    parser.add_argument('data_file', help='Path to the JSON data file')
+    parser.add_argument('data_files', nargs='+', metavar='data_file',
+                        help='Path to a JSON data file (protocol, test dataset or featureset), or a directory of them')
+    parser.add_argument('--protocol', action='append', default=[],
+                        help='Protocol JSON the test files reference, may be repeated (default: the protocol JSONs '
+                             'of the repository, and the validated ones)')
+    parser.add_argument('--cache', help='Validation cache file: skip the JSON Schema validation of data files '
+                                        'that already passed it, unchanged, against the same schema')
     args = parser.parse_args()
 
     # Load the JSON Schema
@@ -324,33 +534,82 @@ def main():
         sys.exit(1)
 
     # Load the JSON Data with duplicate key check
-    try:
-        data = json_load_with_duplicates_check(args.data_file)
-    except DuplicateKeyError as err:
-        print(f"Duplicate key error: {err}")
-        sys.exit(1)
-    except FileNotFoundError:
-        print(f"Data file not found: {args.data_file}")
-        sys.exit(1)
-    except json.JSONDecodeError as err:
-        print(f"Error parsing the data file: {err}")
-        sys.exit(1)
-
-    # Validate the data
-    schema_validation_passed = validate_json(data, schema)
-    co_id_validation_passed = validate_unique_co_ids(data)
-    canopen_index_validation_passed = validate_unique_canopen_indexes(data)
-    unique_subindexes_passed = check_unique_subindexes(data)
-    param_names_passed = check_parameter_names(data)
-    valid_flags_passed = validate_valid_flags(data)
-    active_sub_code_consistency_passed = validate_active_sub_code_consistency(data)
+    files = {}
+    unreadable = []
+    schema_path = os.path.abspath(args.schema_file)
+    for data_file in collect_json_files(args.data_files):
+        if os.path.abspath(data_file) == schema_path:
+            continue
+        try:
+            files[data_file] = json_load_with_duplicates_check(data_file)
+        except DuplicateKeyError as err:
+            print(f"Duplicate key error in {data_file}: {err}")
+            unreadable.append(data_file)
+        except FileNotFoundError:
+            print(f"Data file not found: {data_file}")
+            unreadable.append(data_file)
+        except json.JSONDecodeError as err:
+            print(f"Error parsing the data file {data_file}: {err}")
+            unreadable.append(data_file)
+
+    protocols = {path: data for path, data in files.items() if is_protocol(data)}
+    test_files = {path: data for path, data in files.items() if not is_protocol(data)}
+
+    # Validate the protocol JSONs
+    failed = list(unreadable)
+    cache = load_validation_cache(args.cache) if args.cache else {}
+    validator = None
+    for data_file, data in protocols.items():
+        print(f"\nValidating {data_file}")
+        data_path = os.path.abspath(data_file)
+        cache_key = schema_validation_key(args.schema_file, data_file) if args.cache else None
+        cached = cache_key is not None and cache.get(data_path) == cache_key
+        if not cached and validator is None:
+            validator = schema_validator(schema)
+        if validate_protocol(data, schema, validator, cached):
+            if args.cache:
+                cache[data_path] = cache_key
+        else:
+            failed.append(data_file)
+    if args.cache and protocols:
+        save_validation_cache(args.cache, cache)
+
+    # Validate the test files against the index of the protocol parameters
+    if test_files:
+        # Protocol JSONs already loaded for their validation are not read again
+        loaded = {os.path.abspath(path): data for path, data in protocols.items()}
+        if args.protocol:
+            protocol_files = [os.path.abspath(path) for path in args.protocol]
+        else:
+            repo_root = os.path.dirname(os.path.abspath(__file__))
+            protocol_files = [os.path.join(repo_root, path) for path in PROTOCOL_FILES]
+            protocol_files += [path for path in loaded if path not in protocol_files]
+        protocol_index = ProtocolIndex()
+        for protocol_file in protocol_files:
+            if protocol_file not in loaded:
+                with open(protocol_file, 'r') as file:
+                    loaded[protocol_file] = json.load(file)
+            protocol_index.add_protocol(loaded[protocol_file], protocol_file)
+        duplicate_names = protocol_index.duplicate_names()
+        if duplicate_names:
+            print("\nParameter names defined by several protocols (ambiguous in the test files):")
+            for name, sources in duplicate_names.items():
+                print(f"- {name}: {', '.join(sources)}")
+        for data_file, data in test_files.items():
+            print(f"\nValidating {data_file}")
+            # The test datasets (testWrite*) hold values written to the device
+            if not validate_test_file(data, protocol_index, write_test="testWrite" in os.path.basename(data_file)):
+                failed.append(data_file)
 
     # Exit with appropriate code
-    if schema_validation_passed and co_id_validation_passed and canopen_index_validation_passed and unique_subindexes_passed and param_names_passed and valid_flags_passed and active_sub_code_consistency_passed:
-        print("JSON data is valid.")
+    checked = len(files) + len(unreadable)
+    if not failed:
+        print(f"\nJSON data is valid ({checked} file(s)).")
         sys.exit(0)  # Success
     else:
-        print("JSON data validation failed.")
+        print(f"\nJSON data validation failed: {len(failed)} of {checked} file(s):")
+        for data_file in failed:
+            print(f"- {data_file}")
         sys.exit(1)  # Failure
 
 if __name__ == '__main__':
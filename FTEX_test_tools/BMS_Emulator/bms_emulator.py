@@ -2,12 +2,22 @@ import re
 import can
 import time
 import os
+import sys
 import json
-from utils.list_channels import list_available_channels
+import argparse
+# The metrics and profiler are shared with the CAN Logger. Both tools have a `utils` package: import them
+# through their package path from FTEX_test_tools, so that neither shadows (or merges into) the other
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from BMS_Emulator.utils.list_channels import list_available_channels
+from CAN_Logger.utils.metrics import METRICS_FORMATS, MetricsExporter, MetricsRegistry
+from CAN_Logger.utils.sampling_profiler import SamplingProfiler
+from BMS_Emulator.utils.sdo_response_table import SdoResponseTable
+from BMS_Emulator.utils.dual_battery import DualBatteryAggregator
 # Configuration variables
 BITRATE = 500000  # CAN bitrate
 BAUDRATE = 2000000  # CAN baudrate
 NODE_ID = 5  # BMS node ID
+SECOND_NODE_ID = 0x15  # Second battery node ID (dual-battery mode)
 SEND_INTERVAL = 100  # Time in seconds between messages
 # Path to the EDS file
 EDS_BMS_PATH = "bms.eds"  
@@ -16,6 +26,8 @@ BMS_JSON_VALUES_PATH = "bms_values.json"
 
 # Simulated parameter values
 bms_values_dict = {}
+# Print every request and response (disable for load tests at real-time query rates)
+VERBOSE = True
 
 # Network setup function
 def setup_bus(channel: str, bitrate: int, baudrate: int) -> can.Bus:
@@ -113,14 +125,15 @@ def parse_eds_to_dic(eds_file_path):
     
     return object_dict
 
-def parse_sdo_request(bus, msg, target_node_id, object_dict, bms_values_dict):
+def parse_sdo_request(bus, msg, response_tables):
 
     # Check if the message is an SDO request (0x600 - 0x67F range)
     if (msg.arbitration_id & 0x780) == 0x600:
         node_id = msg.arbitration_id & 0x7F  # Extract Node ID
 
-        # Filter messages for the specified node_id
-        if node_id != target_node_id:
+        # Filter messages for the emulated node(s)
+        response_table = response_tables.get(node_id)
+        if response_table is None:
             return  # Ignore messages from other nodes
 
         command_byte = msg.data[0]
@@ -130,34 +143,38 @@ def parse_sdo_request(bus, msg, target_node_id, object_dict, bms_values_dict):
         # Process the request based on the command
         # BMS is read-only
         if command_byte == 0x40:  # SDO Read Request
-            print(f"SDO Read Request for Index {hex(index)}, Subindex {hex(subindex)}")
-            # Get parameter name from object dictionary
-            parameter_name = get_parameter_name(object_dict, index, subindex)
+            if VERBOSE:
+                print(f"SDO Read Request for Index {hex(index)}, Subindex {hex(subindex)}")
+            # The response is encoded when the value changes, not on each read
+            response_msg = response_table.response(index, subindex)
 
-            if parameter_name:
-                # Get parameter value from parameter_values
-                print(f"Requested: {parameter_name}")
-                parameter_value = get_parameter_value(bms_values_dict, parameter_name)
-                send_sdo_response(bus, target_node_id, index, subindex, parameter_value, object_dict)
+            if response_msg is not None:
+                bus.send(response_msg)
+                if VERBOSE:
+                    print(f"Sent SDO Response: {response_msg}")
 
             else:
-                print("Parameter not found in the object dictionary.")
-                send_sdo_error_response(bus, target_node_id, index, subindex, 0x05)  # Error: Parameter not found
+                if VERBOSE:
+                    print("Parameter not found in the object dictionary.")
+                send_sdo_error_response(bus, node_id, index, subindex, 0x05)  # Error: Parameter not found
 
         elif command_byte in {0x23, 0x2F}:  # SDO Write Request
             # 0x23: Expedited Write Request with 4 bytes
             # 0x2F: Expedited Write Request with 1 byte
-            print(f"SDO Write Request for Index {hex(index)}, Subindex {hex(subindex)}")
+            if VERBOSE:
+                print(f"SDO Write Request for Index {hex(index)}, Subindex {hex(subindex)}")
             data = msg.data[4:]  # Extract the write data
-            print(f"Write Data: {data.hex()}")
+            if VERBOSE:
+                print(f"Write Data: {data.hex()}")
 
             # Add logic for handling SDO write requests here
             # For now, we will just acknowledge the write with a response
-            # Todo: send_sdo_write_acknowledgment(bus, target_node_id, index, subindex)
+            # Todo: send_sdo_write_acknowledgment(bus, node_id, index, subindex)
 
         else:
-            print(f"Unknown SDO Command: {hex(command_byte)}")
-            send_sdo_error_response(bus, target_node_id, index, subindex, 0x02)  # Error: Unknown command
+            if VERBOSE:
+                print(f"Unknown SDO Command: {hex(command_byte)}")
+            send_sdo_error_response(bus, node_id, index, subindex, 0x02)  # Error: Unknown command
 
 def send_sdo_error_response(bus, target_node_id, index, subindex, error_code):
 
@@ -174,7 +191,8 @@ def send_sdo_error_response(bus, target_node_id, index, subindex, error_code):
     ]
     response_msg = can.Message(arbitration_id=(target_node_id | 0x600), data=response_data, is_extended_id=False)
     bus.send(response_msg)
-    print(f"Sent SDO Error Response to Node {target_node_id}: Error Code {hex(error_code)}")
+    if VERBOSE:
+        print(f"Sent SDO Error Response to Node {target_node_id}: Error Code {hex(error_code)}")
 
 def send_sdo_write_acknowledgment(bus, target_node_id, index, subindex):
     # Format the acknowledgment response as per the CANopen SDO protocol (write acknowledgment)
@@ -190,90 +208,32 @@ def send_sdo_write_acknowledgment(bus, target_node_id, index, subindex):
     ]
     response_msg = can.Message(arbitration_id=(target_node_id | 0x600), data=response_data, is_extended_id=False)
     bus.send(response_msg)
-    print(f"Sent SDO Write Acknowledgment to Node {target_node_id} for Index {hex(index)}, Subindex {hex(subindex)}")
+    if VERBOSE:
+        print(f"Sent SDO Write Acknowledgment to Node {target_node_id} for Index {hex(index)}, Subindex {hex(subindex)}")
 
-def listen_and_respond_to_sdo(bus, node_id, object_dict, bms_values_dict):
+def listen_and_respond_to_sdo(bus, response_tables, metrics=None):
     try:
         print("Listening to BMS CAN messages. Press Ctrl+C to stop.")
-        for msg in bus:  # Continuously listen for messages
-            parse_sdo_request(bus, msg, node_id, object_dict, bms_values_dict)
+        if metrics is None:
+            for msg in bus:  # Continuously listen for messages
+                parse_sdo_request(bus, msg, response_tables)
+        else:
+            frames_received = metrics.counter("bms_emulator_frames_received_total", "Frames received by the emulator")
+            sdo_requests = metrics.counter("bms_emulator_sdo_requests_total", "SDO requests handled by the emulator")
+            # From the reception of the request (driver timestamp) until its response is sent
+            response_seconds = metrics.histogram("bms_emulator_sdo_response_seconds", "SDO request handling time")
+            for msg in bus:
+                frames_received.inc()
+                parse_sdo_request(bus, msg, response_tables)
+                if (msg.arbitration_id & 0x780) == 0x600 and (msg.arbitration_id & 0x7F) in response_tables:
+                    sdo_requests.inc()
+                    response_seconds.observe(time.time() - msg.timestamp)
 
     except KeyboardInterrupt:
         print("\nListener stopped by user.")
     finally:
         bus.shutdown()  # Cleanup resources when done
 
-def get_parameter_name(object_dictionary, index, subindex):
-      # Lookup index in the object dictionary
-    if index in object_dictionary:
-        subindices = object_dictionary[index].get('subindices', {})
-        if subindex in subindices:
-            return subindices[subindex].get('ParameterName')
-    return None
-
-def get_parameter_value(parameter_values, parameter_name):
-    if not isinstance(parameter_values, dict):
-        raise TypeError(f"Expected 'parameter_values' to be a dict, got {type(parameter_values).__name__}")
-    return parameter_values.get(parameter_name)
-
-import struct
-
-def send_sdo_response(bus, node_id, index, subindex, data, object_dictionary):
-    response_id = 0x580 + node_id
-    
-    # Get the data type for the parameter from the object dictionary
-    data_type_str = object_dictionary.get(index, {}).get('subindices', {}).get(subindex, {}).get('DataType')
-
-    if data_type_str is None:
-        print(f"Error: DataType not found for index {index} and subindex {subindex}")
-        return
-    
-    data_type = int(data_type_str, 16)
-    
-    # Define a mapping for the data type to command byte and data size
-    data_type_mapping = {
-        0x0003: (0x4B, 2),  # Signed16 (Int16)
-        0x0004: (0x43, 4),  # Signed32 (Int32)
-        0x0005: (0x4F, 1),  # Unsigned8 (8 bits)
-        0x0006: (0x4B, 2),  # Unsigned16 (16 bits)
-        0x0007: (0x43, 4),  # Unsigned32 (32 bits)
-    }
-
-    # Check if the data type is valid and get the command byte and data size
-    if data_type not in data_type_mapping:
-        print(f"Error: Unsupported data type {data_type} for parameter.")
-        return
-    
-    command_byte, data_size = data_type_mapping[data_type]
-    
-    # Initialize response_data with 8 bytes, since the total response is 8 bytes
-    response_data = bytearray(8)  # 8 bytes for the response
-    
-    # Set up the response data bytes
-    response_data[0] = command_byte  # Command byte (0x4F, 0x4B, 0x47, 0x43, 0x45)
-    response_data[1:3] = index.to_bytes(2, byteorder='little')  # Index
-    response_data[3] = subindex  # Subindex
-    
-    # Pack the data based on its type
-    if data_type == 0x0005:  # Unsigned8 (8 bits)
-        response_data[4] = data & 0xFF
-    elif data_type == 0x0006:  # Unsigned16 (16 bits)
-        response_data[4:6] = data.to_bytes(2, byteorder='little')
-    elif data_type == 0x0007:  # Unsigned32 (32 bits)
-        response_data[4:8] = data.to_bytes(4, byteorder='little')
-    elif data_type == 0x0003:  # Signed16 (Int16)
-        response_data[4:6] = data.to_bytes(2, byteorder='little', signed=True)
-    elif data_type == 0x0004:  # Signed32 (Int32)
-        response_data[4:8] = data.to_bytes(4, byteorder='little', signed=True)
-    
-    # Send the message
-    msg = can.Message(arbitration_id=response_id, data=response_data, is_extended_id=False)
-    bus.send(msg)
-    print(f"Sent SDO Response: {msg}\nValue = {data}\n")
-    print("Listening to BMS CAN messages. Press Ctrl+C to stop.")
-
-
-
 def select_channel():
     # List available channels
     available_channels = list_available_channels()
@@ -297,16 +257,92 @@ def select_channel():
             print("Invalid input. Please enter a number.")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Emulate a BMS answering SDO requests on the CAN.')
+    parser.add_argument('--metrics-file', help='Metrics file rewritten periodically: Prometheus text format, '
+                                               'or a JSON snapshot for a .json file')
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, help='Format of the metrics file (default: from its suffix)')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='Seconds between two metrics file updates')
+    parser.add_argument('--profile', metavar='PREFIX',
+                        help='Run the sampling profiler, dumping <PREFIX>_<time>.folded on SIGUSR1 and on exit')
+    parser.add_argument('--model', help='Simulate the battery with this model (e.g. equivalent_circuit) instead of '
+                                        'reporting the static values of bms_values.json')
+    parser.add_argument('--load-current', type=float,
+                        help='Constant load of the simulation in mA, positive when discharging '
+                             '(default: CO_PARAM_EXTERNAL_BMS_CONTINUOUS_CURRENT)')
+    parser.add_argument('--load-profile', help='CSV load profile of the simulation (time_s,current_ma), looped')
+    parser.add_argument('--sim-rate', type=float, default=1000.0, help='Simulation steps per second (default: 1000)')
+    parser.add_argument('--sim-speed', type=float, default=1.0,
+                        help='Simulated seconds per real second, to go through a discharge faster (default: 1)')
+    parser.add_argument('--dual', action='store_true',
+                        help=f'Emulate two batteries: the main node {NODE_ID:#04x} reports the combined capabilities, '
+                             f'the second pack answers on {SECOND_NODE_ID:#04x}')
+    parser.add_argument('--second-values', default=BMS_JSON_VALUES_PATH,
+                        help=f'Values of the second battery in dual mode (default: {BMS_JSON_VALUES_PATH})')
+    parser.add_argument('--quiet', action='store_true', help='Do not print each request and response')
+    return parser.parse_args()
+
+def start_battery_simulation(args, pack_values, publish):
+    # NumPy is only needed for the simulation
+    from BMS_Emulator.utils.battery_model import BATTERY_MODELS, BatterySimulation, ConstantLoad, CsvLoadProfile, SharedLoad
+
+    if args.model not in BATTERY_MODELS:
+        raise ValueError(f"Unknown battery model '{args.model}', expected one of {', '.join(BATTERY_MODELS)}")
+    model = BATTERY_MODELS[args.model](pack_values)
+    if args.load_profile:
+        load_profile = CsvLoadProfile(args.load_profile)
+    else:
+        load_current = args.load_current
+        if load_current is None:
+            load_current = sum(values["CO_PARAM_EXTERNAL_BMS_CONTINUOUS_CURRENT"] for values in pack_values)
+        load_profile = ConstantLoad(load_current)
+    print(f"Simulating {len(pack_values)} battery pack(s) with the {args.model} model at {args.sim_rate:g} steps/s "
+          f"(x{args.sim_speed:g} speed)")
+    return BatterySimulation(model, SharedLoad(load_profile, len(pack_values)), publish,
+                             served_packs=tuple(range(len(pack_values))), rate_hz=args.sim_rate,
+                             speed=args.sim_speed).start()
+
+def create_response_tables(object_dict, pack_values):
+    """
+    Return the SDO response tables by node ID, and the function publishing new
+    values of a pack into them (the aggregation of the main node in dual mode).
+    """
+    main_table = SdoResponseTable(NODE_ID, object_dict)
+    if len(pack_values) == 1:
+        main_table.update(pack_values[0])
+        return {NODE_ID: main_table}, lambda pack, values: main_table.update(values)
+
+    second_table = SdoResponseTable(SECOND_NODE_ID, object_dict)
+    aggregator = DualBatteryAggregator(main_table, second_table, pack_values)
+    return {NODE_ID: main_table, SECOND_NODE_ID: second_table}, aggregator.update
+
+def emulator_file(path):
+    # Default files of the emulator directory when not found in the working directory (e.g. run through ftex)
+    if os.path.exists(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+def load_values(path):
+    if not os.path.exists(path):
+        print(f"Error: The file {path} does not exist.")
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
 def main():
+    global VERBOSE
+    args = parse_args()
+    VERBOSE = not args.quiet
+    metrics = MetricsRegistry() if args.metrics_file else None
+    exporter = None
+    profiler = None
+    simulation = None
     try:
-
-        # Check if the file exists
-        if os.path.exists(BMS_JSON_VALUES_PATH):
-        # Load the JSON file
-            with open(BMS_JSON_VALUES_PATH, "r") as file:
-                bms_values_dict = json.load(file)
-        else:
-            print(f"Error: The file {BMS_JSON_VALUES_PATH} does not exist.")
+        # Load the values of the emulated pack(s)
+        pack_values = [load_values(emulator_file(BMS_JSON_VALUES_PATH))]
+        if args.dual:
+            pack_values.append(load_values(emulator_file(args.second_values)))
+        if None in pack_values:
             return
 
         #Select COM port channel
@@ -318,16 +354,34 @@ def main():
         print(f"User selected channel: {channel}")
 
         # Parse the EDS file to get the object dictionary
-        object_dict = parse_eds_to_dic(EDS_BMS_PATH)
+        object_dict = parse_eds_to_dic(emulator_file(EDS_BMS_PATH))
         # print(object_dict)
+        response_tables, publish = create_response_tables(object_dict, pack_values)
+        if args.model:
+            simulation = start_battery_simulation(args, pack_values, publish)
         usb_to_can = setup_bus(channel, BITRATE, BAUDRATE)
         time.sleep(1)
-        
-        listen_and_respond_to_sdo(usb_to_can, NODE_ID, object_dict, bms_values_dict)
+
+        if metrics is not None:
+            exporter = MetricsExporter(metrics, args.metrics_file, args.metrics_format, args.metrics_interval).start()
+        if args.profile:
+            profiler = SamplingProfiler(args.profile).start()
+            if profiler.install_signal_handler():
+                print(f"Profiling: send SIGUSR1 to dump the profile (pid {os.getpid()})")
+
+        listen_and_respond_to_sdo(usb_to_can, response_tables, metrics)
     except Exception as e:
         print(type(e), e.args, e)
-            
+    finally:
+        if simulation is not None:
+            simulation.stop()
+        if exporter is not None:
+            exporter.stop()
+        if profiler is not None:
+            profiler.stop()
+            profiler.dump()
+
+
 
-    
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import abc
+import csv
+import threading
+import time
+
+import numpy as np
+
+# Error state flags of the BMS protocol (CO_PARAM_EXTERNAL_BMS_ERROR_STATE)
+OVERTEMPERATURE_ERROR = 0x01
+UNDERTEMPERATURE_ERROR = 0x02
+OVERVOLTAGE_ERROR = 0x08
+UNDERVOLTAGE_ERROR = 0x10
+CHARGE_OVERCURRENT_ERROR = 0x20
+DISCHARGE_OVERCURRENT_ERROR = 0x40
+
+# Battery states (CO_PARAM_EXTERNAL_BMS_STATE)
+STATE_CHARGING = 1
+STATE_DISCHARGING = 2
+STATE_FULLY_CHARGED = 3
+STATE_FULLY_DISCHARGED = 4
+STATE_ERROR = 5
+
+CYCLE_SOC_THRESHOLD = 95.0  # a discharge cycle is counted when the SOC goes below 95%
+
+
+class BatteryModel(abc.ABC):
+    """
+    Base class of the battery models: the state of `pack_count` packs, one NumPy
+    array per quantity, advanced by `step(dt, current_ma)` for all packs at once.
+
+    `pack_values` holds the initial state and characteristics of the packs, as in
+    bms_values.json: one dictionary for all the packs, or a list with one per pack.
+    `values(pack)` returns the BMS protocol parameters of one pack, as they must
+    be reported over SDO. Subclasses implement `step`.
+    """
+
+    max_temperature = 60.0  # C
+    min_temperature = -20.0  # C
+
+    def __init__(self, pack_values, pack_count=1):
+        if isinstance(pack_values, dict):
+            pack_values = [pack_values] * pack_count
+        pack_count = len(pack_values)
+
+        def pack_array(name, dtype=float):
+            return np.array([values[name] for values in pack_values], dtype=dtype)
+
+        self.pack_count = pack_count
+        self.full_voltage = pack_array("CO_PARAM_EXTERNAL_BMS_FULL_VOLTAGE")  # cV
+        self.empty_voltage = pack_array("CO_PARAM_EXTERNAL_BMS_EMPTY_VOLTAGE")  # cV
+        self.undervoltage_limit = pack_array("CO_PARAM_EXTERNAL_BMS_UNDERVOLTAGE_LIMIT")  # cV
+        self.overvoltage_limit = pack_array("CO_PARAM_EXTERNAL_BMS_OVERVOLTAGE_LIMIT")  # cV
+        self.max_discharge_current = pack_array("CO_PARAM_EXTERNAL_BMS_MAX_DISCHARGE_CURRENT")  # mA
+        self.max_charge_current = pack_array("CO_PARAM_EXTERNAL_BMS_MAX_CHARGE_CURRENT")  # mA
+        self.capacity_wh = pack_array("CO_PARAM_EXTERNAL_BMS_MAXIMUM_CAPACITY")
+        # The remaining capacity is the state; the SOC is derived from it
+        self.remaining_wh = pack_array("CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY")
+        if np.any((self.remaining_wh < 0) | (self.remaining_wh > self.capacity_wh)):
+            raise ValueError("CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY must be between 0 and the maximum capacity")
+        configured_soc = np.array([values.get("CO_PARAM_EXTERNAL_BMS_SOC", np.nan) for values in pack_values], dtype=float)
+        if np.any(np.abs(configured_soc - self.soc) > 1.0):
+            raise ValueError("CO_PARAM_EXTERNAL_BMS_SOC does not match the remaining and maximum capacities "
+                             f"(expected {np.round(self.soc).astype(int).tolist()})")
+        self.temperature = pack_array("CO_PARAM_EXTERNAL_BMS_TEMPERATURE")  # C
+        self.current = np.zeros(pack_count)  # mA, positive when discharging
+        self.voltage = self.open_circuit_voltage()
+        self.cycle_count = pack_array("CO_PARAM_EXTERNAL_BMS_CYCLE_COUNT", np.int64)
+        self.error_state = np.zeros(pack_count, dtype=np.int64)
+        self.state = np.full(pack_count, STATE_DISCHARGING, dtype=np.int64)
+        self._below_cycle_threshold = self.soc < CYCLE_SOC_THRESHOLD
+
+    @property
+    def soc(self):
+        return 100.0 * self.remaining_wh / self.capacity_wh
+
+    def open_circuit_voltage(self):
+        # Linear between the empty (0% SOC) and full (100% SOC) voltages
+        return self.empty_voltage + (self.full_voltage - self.empty_voltage) * self.soc / 100.0
+
+    @abc.abstractmethod
+    def step(self, dt, current_ma):
+        """Advance all the packs by `dt` seconds, drawing `current_ma` (per pack, positive when discharging)."""
+
+    def update_state(self):
+        """Derive the error flags, battery state and cycle count from the electrical and thermal state."""
+        error = np.zeros(self.pack_count, dtype=np.int64)
+        error |= np.where(self.temperature > self.max_temperature, OVERTEMPERATURE_ERROR, 0)
+        error |= np.where(self.temperature < self.min_temperature, UNDERTEMPERATURE_ERROR, 0)
+        error |= np.where(self.voltage > self.overvoltage_limit, OVERVOLTAGE_ERROR, 0)
+        error |= np.where(self.voltage < self.undervoltage_limit, UNDERVOLTAGE_ERROR, 0)
+        error |= np.where(-self.current > self.max_charge_current, CHARGE_OVERCURRENT_ERROR, 0)
+        error |= np.where(self.current > self.max_discharge_current, DISCHARGE_OVERCURRENT_ERROR, 0)
+        self.error_state = error
+
+        soc = self.soc
+        state = np.where(self.current < 0, STATE_CHARGING, STATE_DISCHARGING)
+        state = np.where((soc >= 100.0) & (self.current <= 0), STATE_FULLY_CHARGED, state)
+        state = np.where(soc <= 0.0, STATE_FULLY_DISCHARGED, state)
+        self.state = np.where(error != 0, STATE_ERROR, state)
+
+        below = soc < CYCLE_SOC_THRESHOLD
+        self.cycle_count += below & ~self._below_cycle_threshold
+        self._below_cycle_threshold = below
+
+    def values(self, pack=0):
+        return {
+            "CO_PARAM_EXTERNAL_BMS_ERROR_STATE": int(self.error_state[pack]),
+            "CO_PARAM_EXTERNAL_BMS_TEMPERATURE": round(float(self.temperature[pack])),
+            "CO_PARAM_EXTERNAL_BMS_SOC": round(float(self.soc[pack])),
+            "CO_PARAM_EXTERNAL_BMS_VOLTAGE": round(float(self.voltage[pack])),
+            "CO_PARAM_EXTERNAL_BMS_CURRENT": round(float(self.current[pack])),
+            "CO_PARAM_EXTERNAL_BMS_STATE": int(self.state[pack]),
+            "CO_PARAM_EXTERNAL_BMS_CYCLE_COUNT": int(self.cycle_count[pack]),
+            "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": round(float(self.remaining_wh[pack])),
+        }
+
+
+class EquivalentCircuitModel(BatteryModel):
+    """
+    Open-circuit voltage linear in SOC behind an internal resistance, energy
+    counting for the SOC, and a first-order thermal model (Joule heating against
+    cooling to the ambient temperature). The BMS cuts the discharge current at 0% SOC.
+    """
+
+    def __init__(self, pack_values, pack_count=1, internal_resistance=0.08, ambient_temperature=None,
+                 thermal_capacity=2000.0, thermal_conductance=1.5):
+        super().__init__(pack_values, pack_count)
+        self.internal_resistance = internal_resistance  # ohm
+        self.ambient_temperature = self.temperature.copy() if ambient_temperature is None else ambient_temperature
+        self.thermal_capacity = thermal_capacity  # J/K
+        self.thermal_conductance = thermal_conductance  # W/K
+        self.update_state()
+
+    def step(self, dt, current_ma):
+        current = np.broadcast_to(np.asarray(current_ma, dtype=float), self.current.shape)
+        current = np.where((self.remaining_wh <= 0.0) & (current > 0), 0.0, current)
+        current = np.where((self.remaining_wh >= self.capacity_wh) & (current < 0), 0.0, current)
+        amps = current / 1000.0
+
+        ocv = self.open_circuit_voltage()
+        self.voltage = ocv - amps * self.internal_resistance * 100.0  # cV
+        energy_wh = (self.voltage / 100.0) * amps * dt / 3600.0
+        self.remaining_wh = np.clip(self.remaining_wh - energy_wh, 0.0, self.capacity_wh)
+
+        heating = amps * amps * self.internal_resistance
+        cooling = self.thermal_conductance * (self.temperature - self.ambient_temperature)
+        self.temperature = self.temperature + (heating - cooling) * dt / self.thermal_capacity
+        self.current = current
+        self.update_state()
+
+
+BATTERY_MODELS = {
+    "equivalent_circuit": EquivalentCircuitModel,
+}
+
+
+class ConstantLoad:
+    def __init__(self, current_ma):
+        self.current_ma = current_ma
+
+    def __call__(self, t):
+        return self.current_ma
+
+
+class SharedLoad:
+    """Splits the total current of a load profile equally between packs in parallel (per-pack currents pass through)."""
+
+    def __init__(self, load_profile, pack_count):
+        self.load_profile = load_profile
+        self.pack_count = pack_count
+
+    def __call__(self, t):
+        current = self.load_profile(t)
+        return current / self.pack_count if np.ndim(current) == 0 else current
+
+
+class CsvLoadProfile:
+    """
+    Load profile from a CSV file with `time_s` and `current_ma` columns (one column
+    per pack, `current_ma_<pack>`, is also accepted), interpolated and looped.
+    """
+
+    def __init__(self, path):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise ValueError(f"Empty load profile: {path}")
+        self.times = np.array([float(row["time_s"]) for row in rows])
+        columns = sorted(name for name in rows[0] if name.startswith("current_ma"))
+        self.currents = np.array([[float(row[name]) for row in rows] for name in columns])
+        self.period = self.times[-1] if self.times[-1] > 0 else 1.0
+
+    def __call__(self, t):
+        t = t % self.period
+        currents = [np.interp(t, self.times, column) for column in self.currents]
+        return currents[0] if len(currents) == 1 else np.array(currents)
+
+
+class BatterySimulation:
+    """
+    Runs a battery model in real time (times `speed`) on a background thread, at
+    `rate_hz` steps per second, and publishes the values of the served packs
+    after each step, by calling `publish(pack, values)`.
+    """
+
+    def __init__(self, model, load_profile, publish, served_packs=(0,), rate_hz=1000.0, speed=1.0):
+        self.model = model
+        self.load_profile = load_profile
+        self.publish = publish
+        self.served_packs = served_packs
+        self.period = 1.0 / rate_hz
+        self.speed = speed
+        self.sim_time = 0.0
+        self.steps = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="battery-simulation", daemon=True)
+
+    def start(self):
+        for pack in self.served_packs:
+            self.publish(pack, self.model.values(pack))
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        last = time.perf_counter()
+        next_step = last
+        while not self._stop.is_set():
+            next_step += self.period
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -self.period:
+                next_step = time.perf_counter()  # too far behind: do not try to catch up step by step
+            now = time.perf_counter()
+            # Real elapsed time: a late step (coarse OS timer) catches up instead of slowing the simulation
+            dt = (now - last) * self.speed
+            last = now
+            self.sim_time += dt
+            self.model.step(dt, self.load_profile(self.sim_time))
+            self.steps += 1
+            for pack in self.served_packs:
+                self.publish(pack, self.model.values(pack))
@@ -0,0 +1,100 @@
+SOC = "CO_PARAM_EXTERNAL_BMS_SOC"
+MAXIMUM_CAPACITY = "CO_PARAM_EXTERNAL_BMS_MAXIMUM_CAPACITY"
+
+# How the main node combines the values of two packs in parallel
+AGGREGATION = {
+    SOC: "capacity_weighted",
+    "CO_PARAM_EXTERNAL_BMS_CURRENT": "sum",
+    "CO_PARAM_EXTERNAL_BMS_MAX_DISCHARGE_CURRENT": "sum",
+    "CO_PARAM_EXTERNAL_BMS_MAX_CHARGE_CURRENT": "sum",
+    "CO_PARAM_EXTERNAL_BMS_MAX_DISCHARGE_TIME": "min",
+    "CO_PARAM_EXTERNAL_BMS_CONTINUOUS_CURRENT": "sum",
+    "CO_PARAM_EXTERNAL_BMS_FULL_VOLTAGE": "min",
+    "CO_PARAM_EXTERNAL_BMS_EMPTY_VOLTAGE": "max",
+    "CO_PARAM_EXTERNAL_BMS_UNDERVOLTAGE_LIMIT": "max",
+    "CO_PARAM_EXTERNAL_BMS_OVERVOLTAGE_LIMIT": "min",
+    MAXIMUM_CAPACITY: "sum",
+    "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": "sum",
+}
+
+# Valid_Range of the aggregated parameters in the BMS protocol: the sum of two packs may exceed it
+VALID_RANGES = {
+    SOC: (0, 100),
+    "CO_PARAM_EXTERNAL_BMS_CURRENT": (-100000, 100000),
+    "CO_PARAM_EXTERNAL_BMS_MAX_DISCHARGE_CURRENT": (1, 100000),
+    "CO_PARAM_EXTERNAL_BMS_MAX_CHARGE_CURRENT": (1, 100000),
+    "CO_PARAM_EXTERNAL_BMS_MAX_DISCHARGE_TIME": (1, 300000),
+    "CO_PARAM_EXTERNAL_BMS_CONTINUOUS_CURRENT": (1, 100000),
+    "CO_PARAM_EXTERNAL_BMS_FULL_VOLTAGE": (2000, 10000),
+    "CO_PARAM_EXTERNAL_BMS_EMPTY_VOLTAGE": (2000, 10000),
+    "CO_PARAM_EXTERNAL_BMS_UNDERVOLTAGE_LIMIT": (2000, 10000),
+    "CO_PARAM_EXTERNAL_BMS_OVERVOLTAGE_LIMIT": (2000, 10000),
+    MAXIMUM_CAPACITY: (100, 5000),
+    "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": (0, 5000),
+}
+
+
+class DualBatteryAggregator:
+    """
+    Publishes the values of two packs: the second pack on its own node, and the
+    main pack on the main node, except for the values the main node reports for
+    both packs combined, as required by the BMS protocol notes: the current and
+    the Battery_capabilities currents and capacities are summed, the SOC is the
+    capacity-weighted SOC of both packs, and the voltages and times are the most
+    restrictive of both packs. Every combined value is clamped to the Valid_Range
+    of the protocol: above 5000 Wh the capacities saturate, while the SOC is still
+    computed from the actual capacities of both packs.
+
+    Aggregates are maintained incrementally: a pack value change updates only the
+    aggregates depending on it and re-encodes those responses, so reads never
+    compute anything and unchanged values cost nothing.
+    """
+
+    def __init__(self, main_table, second_table, pack_values):
+        self.tables = (main_table, second_table)
+        self.pack_values = [{name: values[name] for name in AGGREGATION} for values in pack_values]
+        self.aggregates = {name: self._combine(name) for name in AGGREGATION}
+        self.aggregate_updates = 0
+        for pack, values in enumerate(pack_values):
+            self.tables[pack].update({name: value for name, value in values.items() if name not in AGGREGATION})
+        second_table.update(self.pack_values[1])
+        main_table.update(self.aggregates)
+
+    def _combine(self, name):
+        rule = AGGREGATION[name]
+        values = [pack[name] for pack in self.pack_values]
+        if rule == "sum":
+            aggregate = sum(values)
+        elif rule == "min":
+            aggregate = min(values)
+        elif rule == "max":
+            aggregate = max(values)
+        else:
+            capacities = [pack[MAXIMUM_CAPACITY] for pack in self.pack_values]
+            aggregate = round(sum(value * capacity for value, capacity in zip(values, capacities)) / sum(capacities))
+        low, high = VALID_RANGES[name]
+        return min(max(aggregate, low), high)
+
+    def _publish(self, name):
+        aggregate = self._combine(name)
+        if aggregate != self.aggregates[name]:
+            self.aggregates[name] = aggregate
+            self.tables[0].set(name, aggregate)
+            self.aggregate_updates += 1
+
+    def update(self, pack, values):
+        """Publish new values of `pack` (0: main, 1: second)."""
+        table = self.tables[pack]
+        pack_values = self.pack_values[pack]
+        for name, value in values.items():
+            if name not in AGGREGATION:
+                table.set(name, value)
+                continue
+            if value == pack_values[name]:
+                continue
+            pack_values[name] = value
+            if pack == 1:
+                table.set(name, value)
+            self._publish(name)
+            if name == MAXIMUM_CAPACITY:
+                self._publish(SOC)  # weighted by the capacities
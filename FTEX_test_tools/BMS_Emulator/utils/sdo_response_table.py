@@ -0,0 +1,90 @@
+import can
+
+# EDS DataType -> (SDO upload response command byte, data size, signed)
+EDS_DATA_TYPES = {
+    0x0002: (0x4F, 1, True),   # Integer8
+    0x0003: (0x4B, 2, True),   # Integer16
+    0x0004: (0x43, 4, True),   # Integer32
+    0x0005: (0x4F, 1, False),  # Unsigned8
+    0x0006: (0x4B, 2, False),  # Unsigned16
+    0x0007: (0x43, 4, False),  # Unsigned32
+}
+
+
+class _Entry:
+    __slots__ = ('frame', 'size', 'signed', 'value')
+
+    def __init__(self, frame, size, signed):
+        self.frame = frame
+        self.size = size
+        self.signed = signed
+        self.value = None
+
+
+class SdoResponseTable:
+    """
+    Ready-to-send SDO upload responses of one node, for every parameter of the
+    object dictionary.
+
+    Values are encoded into the response frames when they are set, so answering
+    a read is a dictionary lookup and a send. A frame is replaced as a whole on
+    every update (a single reference assignment), so a read running on another
+    thread gets either the old or the new value, never a mix of both.
+    """
+
+    def __init__(self, node_id, object_dict):
+        self.node_id = node_id
+        self.response_id = 0x580 + node_id
+        self._entries = {}  # (index, subindex) -> _Entry
+        self._by_name = {}  # parameter name -> _Entry
+        for index, obj in object_dict.items():
+            for subindex, parameter in obj.get('subindices', {}).items():
+                data_type = EDS_DATA_TYPES.get(int(parameter.get('DataType', '0'), 16))
+                if data_type is None:
+                    continue
+                command_byte, size, signed = data_type
+                frame = bytes([command_byte, *index.to_bytes(2, byteorder='little'), subindex, 0, 0, 0, 0])
+                entry = _Entry(frame, size, signed)
+                self._entries[(index, subindex)] = entry
+                if 'ParameterName' in parameter:
+                    self._by_name[parameter['ParameterName']] = entry
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def names(self):
+        return list(self._by_name)
+
+    def set(self, name, value):
+        """Encode `value` into the response of parameter `name`. Returns False for an unknown parameter."""
+        entry = self._by_name.get(name)
+        if entry is None:
+            return False
+        value = int(value)
+        if value == entry.value:
+            return True
+        size = entry.size
+        if entry.signed:
+            low, high = -(1 << (8 * size - 1)), (1 << (8 * size - 1)) - 1
+        else:
+            low, high = 0, (1 << (8 * size)) - 1
+        # Saturate rather than wrap around: a model overshooting must not report a nonsense value
+        payload = min(max(value, low), high).to_bytes(size, byteorder='little', signed=entry.signed)
+        entry.frame = entry.frame[:4] + payload + bytes(4 - size)
+        entry.value = value
+        return True
+
+    def update(self, values):
+        for name, value in values.items():
+            self.set(name, value)
+
+    def value(self, name):
+        entry = self._by_name.get(name)
+        return entry.value if entry is not None else None
+
+    def response(self, index, subindex):
+        """Return the response message of a read request, or None when the parameter is unknown or unset."""
+        entry = self._entries.get((index, subindex))
+        if entry is None or entry.value is None:
+            return None
+        return can.Message(arbitration_id=self.response_id, data=entry.frame, is_extended_id=False)
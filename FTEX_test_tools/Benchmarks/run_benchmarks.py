@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import can
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+TOOLS_DIR = REPO_ROOT / "FTEX_test_tools"
+# The CAN Logger modules import their helpers as `utils.*`, the BMS emulator ones are imported as BMS_Emulator.*
+sys.path[:0] = [str(REPO_ROOT), str(TOOLS_DIR), str(TOOLS_DIR / "CAN_Logger")]
+
+PROTOCOL_FILES = [
+    "FTEX_Controller_Public_CANOpen/FTEX_Controller_CANOpen_Protocol.json",
+    "FTEX_Controller_Internal_CANOpen/FTEX_Controller_Internal_CANOpen_Protocol.json",
+    "FTEX_Peripherals_CANOpen/FTEX_BMS_CANOpen/FTEX_BMS_CANOpen_Protocol.json",
+    "FTEX_Peripherals_CANOpen/FTEX_PAS_CANOpen_protocol.json",
+]
+SCHEMA_FILE = REPO_ROOT / "FTEX_Protocol_JSON_Schema.json"
+BMS_EDS_FILE = TOOLS_DIR / "BMS_Emulator" / "bms.eds"
+BMS_VALUES_FILE = TOOLS_DIR / "BMS_Emulator" / "bms_values.json"
+
+FTEX_CLI = REPO_ROOT / "ftex.py"
+
+# Frames per second of a fully loaded bus, for 8-byte standard frames (~125 bits with stuffing)
+BUS_LOADS = {"500kbps": 4000, "1Mbps": 8000}
+DEFAULT_THRESHOLD = 10.0  # percent
+
+
+def measure(func, repeat=5, number=1):
+    """Run `func` `number` times per round, return the median time per call over `repeat` rounds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return statistics.median(timings)
+
+
+def result(value, unit, higher_is_better=False, budget=None):
+    entry = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+    if budget is not None:
+        entry["budget"] = budget  # absolute limit, checked on every run
+    return entry
+
+
+def over_budget(results):
+    return [name for name, entry in results.items()
+            if entry.get("budget") is not None and entry["value"] > entry["budget"]]
+
+
+@contextlib.contextmanager
+def quiet():
+    # The tools print on every call: keep the terminal out of the measurements
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_schema_validator():
+    import FTEX_Schema_validator as validator
+
+    with open(SCHEMA_FILE, 'r') as f:
+        schema = json.load(f)
+    schema_validator = validator.schema_validator(schema)
+    protocol_index = validator.ProtocolIndex()
+    results = {}
+    for protocol_file in PROTOCOL_FILES:
+        data = validator.json_load_with_duplicates_check(REPO_ROOT / protocol_file)
+        protocol_index.add_protocol(data, protocol_file)
+
+        def validate():
+            validator.validate_json(data, schema, schema_validator)
+            validator.validate_unique_co_ids(data)
+            validator.validate_unique_canopen_indexes(data)
+            validator.check_unique_subindexes(data)
+            validator.check_parameter_names(data)
+            validator.validate_valid_flags(data)
+            validator.validate_active_sub_code_consistency(data)
+
+        with quiet():
+            results[f"validator/{Path(protocol_file).stem}"] = result(measure(validate) * 1000, "ms")
+
+    # Test datasets against the protocol parameters, with every dataset value of the protocol (x10 each)
+    dataset = {param["Name"]: [param.get("Valid_Range", {}).get("min", 0)] * 10
+               for params in protocol_index.by_name.values() for param in params}
+    with quiet():
+        results["validator/test_dataset_all_parameters"] = result(
+            measure(lambda: validator.validate_test_file(dataset, protocol_index, write_test=True)) * 1000, "ms")
+    return results
+
+
+def write_synthetic_eds(path, object_count=2000, subindex_count=8):
+    with open(path, 'w') as f:
+        f.write("[FileInfo]\nFileName=synthetic.eds\n\n[DeviceInfo]\nVendorName=FTEX\n\n")
+        for obj in range(object_count):
+            index = 0x2000 + obj
+            f.write(f"[{index:04X}]\nParameterName=CO_ID_SYNTHETIC_{obj}\nObjectType=0x8\nSubNumber={subindex_count}\n\n")
+            for sub in range(subindex_count):
+                f.write(f"[{index:04X}sub{sub}]\nParameterName=CO_PARAM_SYNTHETIC_{obj}_{sub}\nObjectType=0x07 ; variable\n"
+                        f"AccessType=r\nDataType=0x0007 ;Unsigned32\nDOMapping=0\n\n")
+
+
+def bench_eds_parser():
+    from BMS_Emulator.bms_emulator import parse_eds_to_dic
+
+    results = {}
+    with quiet():
+        results["eds/bms.eds"] = result(measure(lambda: parse_eds_to_dic(str(BMS_EDS_FILE)), repeat=7, number=20) * 1000, "ms")
+        with tempfile.TemporaryDirectory() as tmp:
+            eds_path = os.path.join(tmp, "synthetic.eds")
+            write_synthetic_eds(eds_path)
+            results["eds/synthetic_16k_entries"] = result(measure(lambda: parse_eds_to_dic(eds_path)) * 1000, "ms")
+    return results
+
+
+def bench_sdo_codec(count=20000):
+    from BMS_Emulator.bms_emulator import parse_eds_to_dic
+    from BMS_Emulator.utils.sdo_response_table import SdoResponseTable
+    from utils.canopen import decode_value, sdo_address, sdo_expedited_payload
+
+    with quiet():
+        object_dict = parse_eds_to_dic(str(BMS_EDS_FILE))
+    table = SdoResponseTable(5, object_dict)
+    frames = []
+
+    def encode():
+        frames.clear()
+        for i in range(count):
+            table.set("CO_PARAM_EXTERNAL_BMS_VOLTAGE", i & 0xFFFF)
+            frames.append(table.response(0x0030, 1).data)
+
+    encode_time = measure(encode, repeat=3)
+
+    def decode():
+        for data in frames:
+            sdo_address(data)
+            decode_value(sdo_expedited_payload(data), "uint16_t")
+
+    decode_time = measure(decode, repeat=3)
+    return {
+        "sdo/encode": result(encode_time / count * 1e6, "us/frame"),
+        "sdo/decode": result(decode_time / count * 1e6, "us/frame"),
+    }
+
+
+def bench_live_store(count=20000):
+    from utils.live_store import LiveStoreReader, LiveStoreWriter
+    from utils.protocol_index import ProtocolIndex
+
+    data = bytes([0x4B, 0x30, 0x00, 0x01, 0x34, 0x12, 0, 0])  # CO_PARAM_EXTERNAL_BMS_VOLTAGE upload response
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = LiveStoreWriter(Path(tmp) / "live_store", ProtocolIndex.load())
+        reader = LiveStoreReader(writer.path)
+
+        def publish():
+            for i in range(count):
+                writer.add(float(i), 0x585, data)
+
+        publish_time = measure(publish, repeat=3)
+        read_time = measure(lambda: reader.read(5, 0x0030, 1), number=count)
+        snapshot_time = measure(reader.snapshot, number=10)
+        reader.close()
+        writer.close()
+    return {
+        "live_store/publish": result(publish_time / count * 1e6, "us/frame"),
+        "live_store/read": result(read_time * 1e6, "us"),
+        f"live_store/snapshot_{writer.slot_count}_slots": result(snapshot_time * 1000, "ms"),
+    }
+
+
+def bench_bms_emulator_latency(requests=500):
+    from BMS_Emulator.bms_emulator import parse_eds_to_dic, parse_sdo_request
+    from BMS_Emulator.utils.sdo_response_table import SdoResponseTable
+
+    with open(BMS_VALUES_FILE, 'r') as f:
+        values = json.load(f)
+    channel = "bench_bms"
+    stop = threading.Event()
+
+    with quiet():
+        response_table = SdoResponseTable(5, parse_eds_to_dic(str(BMS_EDS_FILE)))
+        response_table.update(values)
+        response_tables = {5: response_table}
+
+        def serve():
+            with can.Bus(interface='virtual', channel=channel) as bus:
+                while not stop.is_set():
+                    msg = bus.recv(0.1)
+                    if msg is not None:
+                        parse_sdo_request(bus, msg, response_tables)
+
+        server = threading.Thread(target=serve)
+        server.start()
+        time.sleep(0.2)
+        latencies = []
+        with can.Bus(interface='virtual', channel=channel) as client:
+            request = can.Message(arbitration_id=0x605, data=[0x40, 0x30, 0x00, 0x01, 0, 0, 0, 0], is_extended_id=False)
+            for _ in range(requests):
+                start = time.perf_counter()
+                client.send(request)
+                while True:
+                    response = client.recv(1.0)
+                    if response is None or response.arbitration_id == 0x585:
+                        break
+                latencies.append(time.perf_counter() - start)
+        stop.set()
+        server.join()
+
+    latencies.sort()
+    return {
+        "bms_emulator/latency_p50": result(latencies[len(latencies) // 2] * 1e6, "us"),
+        "bms_emulator/latency_p99": result(latencies[int(len(latencies) * 0.99)] * 1e6, "us"),
+    }
+
+
+def bench_battery_model(pack_count=48, steps=2000):
+    from BMS_Emulator.utils.battery_model import EquivalentCircuitModel
+
+    with open(BMS_VALUES_FILE, 'r') as f:
+        values = json.load(f)
+    model = EquivalentCircuitModel(values, pack_count)
+    load = [5000.0 + 100 * pack for pack in range(pack_count)]
+
+    def step():
+        for _ in range(steps):
+            model.step(0.001, load)
+
+    return {f"battery_model/step_{pack_count}_packs": result(measure(step, repeat=3) / steps * 1e6, "us/step")}
+
+
+def bench_logger_capture(duration=3.0):
+    from utils.headless_capture import HeadlessCapture
+    from utils.log_segments import SegmentedLogWriter
+    from utils.capture_index import SegmentIndexBuilder
+
+    results = {}
+    for load_name, frames_per_second in BUS_LOADS.items():
+        channel = f"bench_logger_{load_name}"
+        frame_count = int(frames_per_second * duration)
+        with tempfile.TemporaryDirectory() as tmp, can.Bus(interface='virtual', channel=channel) as bus:
+            log_writer = SegmentedLogWriter(tmp, compression="gzip", index_builder_factory=SegmentIndexBuilder)
+            capture = HeadlessCapture(bus, log_writer, {"obj_dir_filter": []}, stats_interval=3600)
+
+            def produce():
+                # Paced producer: send in 1 ms slots to emulate the bus load
+                with can.Bus(interface='virtual', channel=channel) as producer:
+                    msg = can.Message(arbitration_id=0x585, data=[0x4F, 0x30, 0, 0, 85, 0, 0, 0], is_extended_id=False)
+                    start = time.perf_counter()
+                    for i in range(frame_count):
+                        target = start + i / frames_per_second
+                        delay = target - time.perf_counter()
+                        if delay > 0.001:
+                            time.sleep(delay)
+                        producer.send(msg)
+
+            producer = threading.Thread(target=produce)
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            producer.start()
+            capture.run(max_frames=frame_count, duration=duration * 3)
+            producer.join()
+            log_writer.close()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+
+        results[f"logger/{load_name}_captured_ratio"] = result(capture.frames_written / frame_count, "ratio", True)
+        results[f"logger/{load_name}_cpu"] = result(cpu / wall * 100, "% of one core")
+    return results
+
+
+def imported_modules(command):
+    """Top-level packages imported by a Python command line, from `python -X importtime`."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", *command], capture_output=True, text=True).stderr
+    modules = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "imported package" not in line:
+            modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def bench_cli_startup(runs=10):
+    from ftex import HEAVY_MODULES, STARTUP_BUDGETS
+
+    def start_time(command):
+        # Best of `runs`: the start time without the noise of the other processes
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    results = {}
+    interpreter = start_time([sys.executable, "-c", "pass"])
+    with tempfile.TemporaryDirectory() as tmp:
+        commands = {
+            "help": [str(FTEX_CLI), "--help"],
+            # Second run onwards: the protocol file is unchanged, it skips the JSON Schema validation
+            "validate": [str(FTEX_CLI), "validate", str(SCHEMA_FILE), str(REPO_ROOT / PROTOCOL_FILES[0]),
+                         "--cache", os.path.join(tmp, "schema_validation.json")],
+        }
+        for name, command in commands.items():
+            results[f"cli/ftex_{name}_start"] = result(start_time([sys.executable, *command]) - interpreter, "ms",
+                                                       budget=STARTUP_BUDGETS[name])
+            heavy = sorted(imported_modules(command) & set(HEAVY_MODULES))
+            if heavy:
+                print(f"ftex {name} imports {', '.join(heavy)}")
+            results[f"cli/ftex_{name}_heavy_imports"] = result(len(heavy), "modules", budget=0)
+    return results
+
+
+BENCHMARKS = {
+    "cli": bench_cli_startup,
+    "validator": bench_schema_validator,
+    "eds": bench_eds_parser,
+    "sdo": bench_sdo_codec,
+    "live_store": bench_live_store,
+    "bms_emulator": bench_bms_emulator_latency,
+    "battery_model": bench_battery_model,
+    "logger": bench_logger_capture,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(selected):
+    results = {}
+    for name in selected:
+        print(f"Running {name} benchmarks...", flush=True)
+        results.update(BENCHMARKS[name]())
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "python-can": can.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print the change of every benchmark against the baseline, return the regressions beyond `threshold` %."""
+    regressions = []
+    print(f"\n{'benchmark':<52} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, entry in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or not base["value"]:
+            print(f"{name:<52} {'-':>12} {entry['value']:>12.3f}")
+            continue
+        change = (entry["value"] - base["value"]) / base["value"] * 100
+        worse = -change if entry["higher_is_better"] else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<52} {base['value']:>12.3f} {entry['value']:>12.3f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the protocol tooling hot paths.')
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Baseline results JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Regression threshold in percent (default: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    current = run(args.benchmarks or list(BENCHMARKS))
+    for name, entry in current["results"].items():
+        print(f"{name:<52} {entry['value']:>12.3f} {entry['unit']}")
+
+    failed_budgets = over_budget(current["results"])
+    if failed_budgets:
+        print(f"\nOver budget: {', '.join(failed_budgets)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo regression beyond {args.threshold}%.")
+    if failed_budgets:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import json
+import sys
+
+import can
+
+from utils.bus import open_bus
+from utils.fleet_audit import (
+    AUDIT_CACHE_FILE, SerialNumberCache, audit_fleet, load_golden, select_parameters, simulated_fleet_values
+)
+from utils.multi_channel import channel_configs
+from utils.protocol_index import ProtocolIndex
+from utils.sdo_client import DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES
+from utils.simulated_nodes import SimulatedSdoNodes
+
+SIMULATION_CHANNEL = "fleet_audit"
+
+
+def parse_node_ids(text):
+    return [int(node_id, 0) for node_id in text.split(',') if node_id.strip()]
+
+
+def print_report(report):
+    print(f"\n{'bus':<12} {'node':<6} {'serial number':<18} {'result':<7} {'reads':>6} {'cached':>6} {'reads/s':>8} "
+          f"{'mismatches':>10} {'errors':>6}")
+    for device in report["devices"]:
+        rate = f"{device['reads_per_s']:8.1f}" if device['reads_per_s'] is not None else "       -"
+        print(f"{device['bus']:<12} {device['node']:<6} {device['serial_number'] or '-':<18} "
+              f"{'PASS' if device['passed'] else 'FAIL':<7} {device['reads']:>6} {device['cached']:>6} {rate} "
+              f"{len(device['mismatches']):>10} {len(device['errors']):>6}")
+    for device in report["devices"]:
+        if device["mismatches"] or device["errors"] or device["unchecked"]:
+            print(f"\n{device['bus']} node {device['node']} ({device['serial_number'] or 'unknown serial number'}):")
+            for name, diff in device["mismatches"].items():
+                print(f"  {name}: expected {diff['expected']}, read {diff['actual']}")
+            for name, error in device["errors"].items():
+                print(f"  {name}: {error}")
+            for name in device["unchecked"]:
+                print(f"  {name}: not checked (not in the protocol, or not readable over expedited SDO)")
+    for bus_name, error in report["bus_errors"].items():
+        print(f"\nBus {bus_name} failed: {error}")
+    if report["unknown_golden_parameters"]:
+        print(f"\nGolden parameters not in the protocol (devices fail): {', '.join(report['unknown_golden_parameters'])}")
+    summary = report["summary"]
+    print(f"\n{summary['passed']}/{summary['devices']} device(s) passed | {summary['reads']} reads "
+          f"({summary['cached']} cached) in {summary['elapsed_s']} s: {summary['reads_per_s']} reads/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit the configuration of many controllers against a golden parameter set.')
+    parser.add_argument('golden', nargs='?', help='Golden JSON: {name: value} or {name: [accepted values]} '
+                                                  '(like FTEX_Controller_CANOpen_testWritePersistent_datasets.json)')
+    parser.add_argument('--column', type=int, help='Only accept the value at this position of the golden value lists')
+    parser.add_argument('--config', default='can_config.json', help='Logger configuration file: bus(es) to audit')
+    parser.add_argument('--interface', help='python-can interface (overrides the configuration)')
+    parser.add_argument('--channel', help='CAN channel (overrides the configuration)')
+    parser.add_argument('--nodes', default='1', help='Comma-separated controller node IDs on each bus (default: 1). '
+                                                     'A "nodes" key in a configured channel overrides it')
+    parser.add_argument('--param', action='append', default=[], help='Only audit this parameter, may be repeated')
+    parser.add_argument('--golden-only', action='store_true', help='Only read the parameters of the golden set')
+    parser.add_argument('--window', type=int, default=1, help='SDO requests in flight per node (default: 1)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_READ_TIMEOUT, help='SDO response timeout in seconds')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='Retries of an unanswered request')
+    parser.add_argument('--cache', default=str(AUDIT_CACHE_FILE), help='Boot-up parameter cache by serial number '
+                                                                        f'(default: {AUDIT_CACHE_FILE})')
+    parser.add_argument('--no-cache', action='store_true', help='Read everything, do not use nor update the cache')
+    parser.add_argument('--report', help='Write the full report (with every value read) to this JSON file')
+    parser.add_argument('--simulate', type=int, metavar='N', help='Audit N simulated controllers on a virtual bus')
+    parser.add_argument('--simulate-mismatch-rate', type=float, default=0.0,
+                        help='Fraction of wrong golden values on the simulated controllers')
+    args = parser.parse_args()
+
+    protocol_index = ProtocolIndex.load()
+    golden = load_golden(args.golden, args.column) if args.golden else None
+    if golden is not None and args.param:
+        golden = {name: expected for name, expected in golden.items() if name in args.param}
+    parameters = select_parameters(protocol_index, golden, args.param, args.golden_only)
+    unknown = [name for name in (golden or {}) if protocol_index.parameter(name, "controller") is None]
+
+    simulation = None
+    if args.simulate:
+        node_ids = list(range(1, args.simulate + 1))
+        nodes = simulated_fleet_values(parameters, golden, node_ids, args.simulate_mismatch_rate)
+        simulation = SimulatedSdoNodes(can.Bus(interface='virtual', channel=SIMULATION_CHANNEL), nodes).start()
+        targets = [("virtual", can.Bus(interface='virtual', channel=SIMULATION_CHANNEL), node_ids)]
+    else:
+        from can_logger import load_config
+
+        config = load_config(args.config)
+        overrides = {"interface": args.interface, "channel": args.channel}
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        if args.interface or args.channel:
+            config['channels'] = []
+        targets = []
+        for channel_config in channel_configs(config):
+            node_ids = channel_config.get('nodes') or parse_node_ids(args.nodes)
+            if isinstance(node_ids, str):
+                node_ids = parse_node_ids(node_ids)
+            # Only the SDO responses of the audited nodes reach the reader
+            channel_config['can_id_filter'] = [0x580 + node_id for node_id in node_ids]
+            targets.append((channel_config['name'], open_bus(channel_config), node_ids))
+
+    cache = SerialNumberCache(None if args.no_cache else args.cache)
+    try:
+        report = audit_fleet(targets, parameters, golden, cache, args.window, args.timeout, args.retries)
+    finally:
+        for _, bus, _ in targets:
+            bus.shutdown()
+        if simulation is not None:
+            simulation.stop()
+    report["unknown_golden_parameters"] = unknown
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=4)
+    return 0 if report["summary"]["passed"] == report["summary"]["devices"] and not report["bus_errors"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+import can
+
+from utils.headless_capture import HeadlessCapture
+from utils.log_segments import SegmentedLogWriter
+
+BENCH_CHANNEL = 'can_logger_bench'
+
+
+def produce_frames(frame_count, channel=BENCH_CHANNEL):
+    # Mix of SDO requests/responses and heartbeats, like the controller traffic
+    frames = [
+        can.Message(arbitration_id=0x605, data=[0x40, 0x30, 0x00, 0x00, 0, 0, 0, 0], is_extended_id=False),
+        can.Message(arbitration_id=0x585, data=[0x4F, 0x30, 0x00, 0x00, 85, 0, 0, 0], is_extended_id=False),
+        can.Message(arbitration_id=0x601, data=[0x40, 0x00, 0x20, 0x01, 0, 0, 0, 0], is_extended_id=False),
+        can.Message(arbitration_id=0x581, data=[0x4B, 0x00, 0x20, 0x01, 0xE8, 0x03, 0, 0], is_extended_id=False),
+        can.Message(arbitration_id=0x704, data=[0x05], is_extended_id=False),
+    ]
+    with can.Bus(interface='virtual', channel=channel) as bus:
+        for i in range(frame_count):
+            bus.send(frames[i % len(frames)])
+
+
+def run_benchmark(frame_count, compression, stats_interval=3600.0):
+    """Capture `frame_count` frames from a virtual bus, return the throughput results."""
+    log_dir = tempfile.mkdtemp(prefix="can_logger_bench_")
+    config = {"obj_dir_filter": []}
+    try:
+        with can.Bus(interface='virtual', channel=BENCH_CHANNEL) as bus:
+            log_writer = SegmentedLogWriter(log_dir, compression=compression)
+            capture = HeadlessCapture(bus, log_writer, config, stats_interval=stats_interval)
+
+            producer = threading.Thread(target=produce_frames, args=(frame_count,))
+            start = time.perf_counter()
+            producer.start()
+            capture.run(max_frames=frame_count, duration=60)
+            capture_time = time.perf_counter() - start
+            producer.join()
+            log_writer.close()
+            total_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    return {
+        "frames": capture.frames_received,
+        "compression": log_writer.compression,
+        "capture_s": capture_time,
+        "capture_fps": capture.frames_received / capture_time,
+        "written_s": total_time,
+        "written_fps": capture.frames_received / total_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the headless capture throughput on a virtual CAN bus.')
+    parser.add_argument('--frames', type=int, default=200000, help='Number of frames to capture')
+    parser.add_argument('--compression', default='gzip', choices=['none', 'gzip', 'zstd'])
+    args = parser.parse_args()
+
+    result = run_benchmark(args.frames, args.compression)
+    print(f"Captured {result['frames']} frames ({result['compression']}): "
+          f"receive {result['capture_fps']:.0f} frames/s, "
+          f"written to disk {result['written_fps']:.0f} frames/s")
+    # For reference: a saturated 500 kbps bus carries ~4000 frames/s, 1 Mbps ~8000 frames/s
+    print(f"Headroom vs a saturated 1 Mbps bus: {result['written_fps'] / 8000:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
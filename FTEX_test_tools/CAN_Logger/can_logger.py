@@ -4,34 +4,62 @@ import can
 import time
 import os
 import json
+import argparse
 from datetime import datetime
 from curses import wrapper
 from utils.list_channels import list_available_channels
 from collections import deque
 from pathlib import Path
-import csv
+from utils.can_filters import compile_obj_dir_filter, upgrade_obj_dir_filter
+from utils.headless_capture import HeadlessCapture
+from utils.multi_channel import channel_configs, open_capture_bus
+from utils.protocol_index import ProtocolIndex
+from utils.capture_index import SegmentIndexBuilder
+from utils.live_store import LiveStoreWriter, default_store_path
+from utils.log_segments import SegmentedLogWriter, format_can_data, format_timestamp_ms
+from utils.metrics import METRICS_FORMATS, MetricsExporter, MetricsRegistry
+from utils.sampling_profiler import SamplingProfiler
+from utils.timing_stats import TimingStats, HEARTBEAT_PERIOD_REQUIREMENT
 
 CONFIG_FILE = 'can_config.json'
-STATIC_LINES_IN_TERMINAL = 7  # Maximum number of messages to store in history
+STATIC_LINES_IN_TERMINAL = 8  # Maximum number of messages to store in history
 
-def load_config():
+def load_config(config_file=CONFIG_FILE):
     default_config = {
+        "interface": "seeedstudio",  # python-can interface
         "channel": "",
         "bitrate": 500,  # in kbps
         "baudrate": 2000000,  # in bps
         "common_bitrates": [125, 250, 500, 1000],  # in kbps
         "common_baudrates": [115200, 921600, 2000000],  # in bps
         "can_id_filter": "",
-        "obj_dir_filter": ""
+        "obj_dir_filter": "",
+        "log_compression": "gzip",  # none, gzip or zstd
+        "log_segment_max_mb": 64,  # uncompressed size before rotating to a new segment
+        "log_segment_max_minutes": 60,  # age before rotating to a new segment
+        "log_dir": "logs",
+        "log_index": True,  # build the sidecar index of each segment while logging
+        "channels": [],  # multi-channel capture: [{"name": ..., "channel": ..., "interface": ..., "bitrate": ...}, ...]
+        "merge_max_latency_ms": 50  # maximum time a frame waits for the other channels before being released
     }
     
-    if os.path.exists(CONFIG_FILE):
+    config = default_config
+    if os.path.exists(config_file):
         try:
-            with open(CONFIG_FILE, 'r') as f:
-                return json.load(f)
+            with open(config_file, 'r') as f:
+                # Keep the defaults for keys missing from older config files
+                config = {**default_config, **json.load(f)}
         except:
             return default_config
-    return default_config
+
+    try:
+        config['obj_dir_filter'], conversions = upgrade_obj_dir_filter(config['obj_dir_filter'])
+    except ValueError as e:
+        raise SystemExit(f"{config_file}: {e}")
+    for old_entry, new_entry in conversions:
+        # Integer entries were saved by earlier versions (index | subindex << 16)
+        print(f"{config_file}: obj_dir_filter entry {old_entry:#08x} read as \"{new_entry}\" (INDEX:SUBINDEX)")
+    return config
 
 def save_config(config):
     with open(CONFIG_FILE, 'w') as f:
@@ -46,7 +74,7 @@ def setup_initial_config():
     print(f"Bitrate: {config['bitrate']} kbps")
     print(f"Baudrate: {config['baudrate']} bps")
     print(f"CANOpen ID Filter: {[hex(id_) for id_ in config['can_id_filter']]}")
-    print(f"Object Directory Address Filter: {[hex(addr) for addr in config['obj_dir_filter']]}")
+    print(f"Object Directory Address Filter: {config['obj_dir_filter']}")
 
 
     edit = input("\nDo you want to edit the configuration? (y/n): ").lower()
@@ -114,8 +142,13 @@ def setup_initial_config():
         can_id_filter = input("\nEnter CANOpen ID filter(s) (comma-separated, leave empty for all messages): ")
         config['can_id_filter'] = [int(x.strip(), 16) for x in can_id_filter.split(',') if x.strip()] if can_id_filter else []
 
-        obj_dir_filter = input("Enter Object Directory Address filter(s) (comma-separated, leave empty for all messages): ")
-        config['obj_dir_filter'] = [int(x.strip(), 16) for x in obj_dir_filter.split(',') if x.strip()] if obj_dir_filter else []
+        while True:
+            obj_dir_filter = input("Enter Object Directory Address filter(s) (comma-separated index or index:subindex, e.g. 2000 or 2000:01, leave empty for all messages): ")
+            try:
+                config['obj_dir_filter'], _ = upgrade_obj_dir_filter([x.strip() for x in obj_dir_filter.split(',') if x.strip()])
+                break
+            except ValueError as e:
+                print(e)
 
 
         save_config(config)
@@ -123,21 +156,23 @@ def setup_initial_config():
     
     return config
 
-def create_log_file():
+def create_log_file(config):
     # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
+    log_dir = Path(config.get('log_dir', "logs"))
     log_dir.mkdir(exist_ok=True)
     
-    # Create a new log file with timestamp
+    # Create a new session directory with timestamp, holding the rolling log segments
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = log_dir / f"can_log_{timestamp}.csv"
+    session_dir = log_dir / f"can_log_{timestamp}"
     
-    # Initialize CSV file with headers
-    with open(log_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['Time', 'ID', 'Data'])
-    
-    return log_file
+    return SegmentedLogWriter(
+        session_dir,
+        compression=config['log_compression'],
+        max_segment_bytes=config['log_segment_max_mb'] * 1024 * 1024,
+        max_segment_seconds=config['log_segment_max_minutes'] * 60,
+        with_channel=len(channel_configs(config)) > 1,
+        index_builder_factory=SegmentIndexBuilder if config.get('log_index', True) else None
+    )
 
 class CANMonitorUI:
     def __init__(self, stdscr, config):
@@ -147,14 +182,12 @@ class CANMonitorUI:
         self.messages = deque(maxlen=max(STATIC_LINES_IN_TERMINAL, self.max_display_messages))  # Ensure at least 10 messages
         self.running = True
         self.setup_colors()
-        self.log_file = create_log_file()
-        # Statistics
-        self.msg_count = 0
-        self.start_time = time.time()
-        self.last_msg_time = None
-        self.max_gap = 0
-        self.min_gap = float('inf')  # Initialize min_gap to infinity
-        self.msg_per_id = {}
+        self.log_writer = create_log_file(config)
+        # Statistics, driven by the frame timestamps reported by the interface
+        self.stats = TimingStats(top_k=3)
+        self.show_id_stats = False
+        self.multi_channel = len(channel_configs(config)) > 1
+        self.bus = None
         
     def setup_colors(self):
         curses.start_color()
@@ -169,60 +202,90 @@ class CANMonitorUI:
         self.stdscr.addstr(0, (curses.COLS - len(header)) // 2, header, curses.color_pair(1))
         
         # Show current configuration
-        config_str = f"Channel: {self.config['channel']} | Bitrate: {self.config['bitrate']} kbps | Baudrate: {self.config['baudrate']} bps"
+        if self.multi_channel and self.bus is not None:
+            config_str = "Channels: " + " | ".join(
+                f"{channel['name']} rx {channel['received']} drop {channel['dropped']} err {channel['error_frames']}"
+                for channel in self.bus.channel_stats())
+        else:
+            config_str = f"Channel: {self.config['channel']} | Bitrate: {self.config['bitrate']} kbps | Baudrate: {self.config['baudrate']} bps"
         self.stdscr.addstr(1, 0, config_str, curses.color_pair(4))
         
         # Show statistics
-        runtime = time.time() - self.start_time
-        msg_rate = self.msg_count / runtime if runtime > 0 else 0
-        stats = f"Messages: {self.msg_count} | Rate: {msg_rate:.1f} msg/s | Gap min/max: {self.min_gap*1000:.1f}/{self.max_gap*1000:.1f}ms"
-        self.stdscr.addstr(2, 0, stats, curses.color_pair(4))
+        stats = self.stats
+        min_gap = stats.min_gap if stats.msg_count > 1 else 0
+        stats_str = f"Messages: {stats.msg_count} | Rate: {stats.rate:.1f} msg/s | Gap min/max: {min_gap*1000:.1f}/{stats.max_gap*1000:.1f}ms"
+        self.stdscr.addstr(2, 0, stats_str, curses.color_pair(4))
         
         # Show top IDs
-        if self.msg_per_id:
-            top_ids = sorted(self.msg_per_id.items(), key=lambda x: x[1], reverse=True)[:3]
-            top_ids_str = "Top IDs: " + " | ".join(f"{id_}: {count}" for id_, count in top_ids)
+        top_ids = stats.top_ids()
+        if top_ids:
+            top_ids_str = "Top IDs: " + " | ".join(f"{id_:#04x}: {count}" for id_, count in top_ids)
             self.stdscr.addstr(3, 0, top_ids_str, curses.color_pair(4))
         
+        # Show heartbeat periods against the requirement
+        heartbeats = stats.heartbeats()
+        if heartbeats:
+            parts = []
+            for node_id, id_stats in heartbeats:
+                verdict = stats.meets_heartbeat_requirement(id_stats)
+                status = "--" if verdict is None else ("OK" if verdict else "LATE")
+                parts.append(f"node {node_id:#04x} max {id_stats.max_period*1000:.1f}ms {status}")
+            heartbeat_str = f"Heartbeats (<= {HEARTBEAT_PERIOD_REQUIREMENT*1000:.0f}ms): " + " | ".join(parts)
+            color = curses.color_pair(3) if any(stats.meets_heartbeat_requirement(s) is False for _, s in heartbeats) else curses.color_pair(4)
+            self.stdscr.addstr(4, 0, heartbeat_str[:curses.COLS - 1], color)
+        
         # Column headers
-        self.stdscr.addstr(4, 0, "Time          ID      Data", curses.color_pair(1))
-        self.stdscr.addstr(5, 0, "-" * curses.COLS, curses.color_pair(1))
+        if self.show_id_stats:
+            self.stdscr.addstr(5, 0, "ID      Count     Rate/s  p50 ms  p99 ms  max ms  jitter ms", curses.color_pair(1))
+        elif self.multi_channel:
+            self.stdscr.addstr(5, 0, "Time          ID      Data                        Channel", curses.color_pair(1))
+        else:
+            self.stdscr.addstr(5, 0, "Time          ID      Data", curses.color_pair(1))
+        self.stdscr.addstr(6, 0, "-" * curses.COLS, curses.color_pair(1))
 
     def draw_messages(self):
-        start_row = 6
-        for i, msg in enumerate(self.messages):
+        start_row = 7
+        lines = self.format_id_stats() if self.show_id_stats else self.messages
+        for i, msg in enumerate(lines):
             if start_row + i >= curses.LINES - 1:  # Leave room for status line
                 break
             self.stdscr.addstr(start_row + i, 0, msg, curses.color_pair(2))
 
+    def format_id_stats(self):
+        def ms(value):
+            return f"{value*1000:7.1f}" if value is not None else "      -"
+
+        lines = []
+        for can_id, id_stats in sorted(self.stats.per_id.items()):
+            max_period = id_stats.max_period if id_stats.histogram.count else None
+            lines.append(f"{can_id:#05x}  {id_stats.count:>8}  {id_stats.rate:>8.1f} {ms(id_stats.p50_period)} "
+                         f"{ms(id_stats.p99_period)} {ms(max_period)}    {ms(id_stats.jitter)}")
+        return lines
+
     def draw_status(self):
-        log_name = Path(self.log_file).name
-        status = f"Logging to: {log_name} | Press 'q' to quit | 'p' to pause/resume"
+        log_name = f"{self.log_writer.session_dir.name}/{self.log_writer.current_segment_name or ''}"
+        status = f"Logging to: {log_name} | Press 'q' to quit | 'p' to pause/resume | 's' for per-ID stats"
         self.stdscr.addstr(curses.LINES - 1, 0, status, curses.color_pair(4))
 
     def format_can_message(self, msg):
         timestamp = self.format_timestamp_ms(msg.timestamp)
         data = self.format_can_data(msg.data)
+        if self.multi_channel:
+            return f"{timestamp}  {msg.arbitration_id:#04x}    {data:<24}  {msg.channel}"
         return f"{timestamp}  {msg.arbitration_id:#04x}    {data}"
 
     @staticmethod
     def format_can_data(data: bytes) -> str:
-        return ' '.join(f"{b:02X}" for b in data)
+        return format_can_data(data)
 
     @staticmethod
     def format_timestamp_ms(timestamp: float) -> str:
-        dt = datetime.fromtimestamp(timestamp)
-        return dt.strftime('%H:%M:%S.%f')[:-3]
+        return format_timestamp_ms(timestamp)
 
     def run(self):
         try:
-            bus = can.interface.Bus(
-                interface='seeedstudio',
-                channel=self.config['channel'],
-                bitrate=self.config['bitrate'] * 1000,
-                baudrate=self.config['baudrate'],
-                timeout=0.1
-            )
+            bus = self.bus = open_capture_bus(self.config)
+            obj_dir_matches = compile_obj_dir_filter(self.config['obj_dir_filter'])
             
             paused = False
             while self.running:
@@ -240,6 +303,8 @@ class CANMonitorUI:
                         self.running = False
                     elif key == ord('p'):
                         paused = not paused
+                    elif key == ord('s'):
+                        self.show_id_stats = not self.show_id_stats
                 except curses.error:
                     pass
 
@@ -247,47 +312,18 @@ class CANMonitorUI:
                     # Check for CAN messages (non-blocking due to timeout)
                     msg = bus.recv()
                     if msg:
-                         # Apply filters
-                        can_id_filter = self.config['can_id_filter']
-                        obj_dir_filter = self.config['obj_dir_filter']
-                        msg_id = msg.arbitration_id
-                        if can_id_filter:
-                            if can_id_filter and msg_id not in can_id_filter:
-                                continue
-                        
-                        if obj_dir_filter:
-                            obj_dir = int.from_bytes(msg.data[1:4], byteorder='little') if len(msg.data) > 3 else None
-                            if obj_dir is None or obj_dir not in obj_dir_filter:
-                                continue
+                        # Apply the object directory address filter
+                        if obj_dir_matches is not None and not obj_dir_matches(msg):
+                            continue
                         
                         # Update statistics
-                        self.msg_count += 1
-                        current_time = time.time()
-                        
-                        # Update message gap tracking
-                        if self.last_msg_time is not None:
-                            gap = current_time - self.last_msg_time
-                            if gap > self.max_gap:
-                                self.max_gap = gap
-                            if gap < self.min_gap:
-                                self.min_gap = gap
-                        self.last_msg_time = current_time
-                        
-                        # Update ID counting
-                        msg_id = f"{msg.arbitration_id:#04x}"
-                        self.msg_per_id[msg_id] = self.msg_per_id.get(msg_id, 0) + 1
+                        self.stats.add(msg.timestamp, msg.arbitration_id)
                         
                         formatted_msg = self.format_can_message(msg)
                         self.messages.append(formatted_msg)
                         
-                        # Log message to CSV
-                        with open(self.log_file, 'a', newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow([
-                                self.format_timestamp_ms(msg.timestamp),
-                                f"{msg.arbitration_id:#04x}",
-                                self.format_can_data(msg.data)
-                            ])
+                        # Hand the frame over to the background segment writer
+                        self.log_writer.write(msg.timestamp, msg.arbitration_id, msg.data, msg.channel)
 
                 time.sleep(0.01)  # Small delay to prevent high CPU usage
 
@@ -298,8 +334,87 @@ class CANMonitorUI:
         finally:
             if 'bus' in locals():
                 bus.shutdown()
+            self.log_writer.close()
+
+def run_headless(config, duration=None, stats_interval=10.0, stats_file=None,
+                 metrics_file=None, metrics_format=None, metrics_interval=10.0, profile=None, live_store=None):
+    bus = open_capture_bus(config)
+    # Everything created after the bus is released by the finally below, even when a later step fails
+    log_writer = store = capture = exporter = profiler = None
+    try:
+        log_writer = create_log_file(config)
+        metrics = MetricsRegistry() if metrics_file else None
+        if live_store:
+            store = LiveStoreWriter(live_store, ProtocolIndex.load())
+            print(f"Publishing the latest values of {store.slot_count} parameters to {store.path}", flush=True)
+        capture = HeadlessCapture(bus, log_writer, config, stats_interval=stats_interval, stats_file=stats_file,
+                                  metrics=metrics, live_store=store)
+        capture.install_signal_handlers()
+        exporter = MetricsExporter(metrics, metrics_file, metrics_format, metrics_interval).start() if metrics else None
+        if profile:
+            profiler = SamplingProfiler(profile).start()
+            if profiler.install_signal_handler():
+                print(f"Profiling: send SIGUSR1 to dump the profile (pid {os.getpid()})", flush=True)
+        channels = ", ".join(f"{channel['interface']}:{channel['channel']}" for channel in channel_configs(config))
+        print(f"Capturing {channels} to {log_writer.session_dir} "
+              f"(Ctrl+C or SIGTERM to stop, SIGHUP to rotate the log segment)", flush=True)
+        capture.run(duration=duration)
+    finally:
+        bus.shutdown()
+        try:
+            if log_writer is not None:
+                log_writer.close()  # raises if the log writer failed
+        finally:
+            if capture is not None:
+                capture.report_stats()
+            if exporter is not None:
+                exporter.stop()
+            if profiler is not None:
+                profiler.stop()
+                profiler.dump()
+            if store is not None:
+                store.close()
+    print(f"Capture stopped, {len(log_writer.manifests)} segment(s) written.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Record the traffic of a CAN channel.')
+    parser.add_argument('--headless', action='store_true',
+                        help='Capture without prompts or UI, using the configuration file and the arguments below')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'Configuration file (default: {CONFIG_FILE})')
+    parser.add_argument('--interface', help='python-can interface (overrides the configuration)')
+    parser.add_argument('--channel', help='CAN channel (overrides the configuration)')
+    parser.add_argument('--bitrate', type=int, help='Bitrate in kbps (overrides the configuration)')
+    parser.add_argument('--log-dir', help='Directory receiving the capture sessions (overrides the configuration)')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds (headless only)')
+    parser.add_argument('--stats-interval', type=float, default=10.0, help='Seconds between two stats lines (headless only)')
+    parser.add_argument('--stats-file', help='JSON file rewritten with the latest stats (headless only)')
+    parser.add_argument('--metrics-file', help='Metrics file rewritten periodically: Prometheus text format, '
+                                               'or a JSON snapshot for a .json file (headless only)')
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, help='Format of the metrics file (default: from its suffix)')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='Seconds between two metrics file updates')
+    parser.add_argument('--profile', metavar='PREFIX',
+                        help='Run the sampling profiler, dumping <PREFIX>_<time>.folded on SIGUSR1 and on exit (headless only)')
+    parser.add_argument('--live-store', nargs='?', const=default_store_path(), metavar='PATH',
+                        help='Publish the latest parameter values to a shared memory file read by live_values.py '
+                             f'(default: {default_store_path()}, headless only)')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+
+    if args.headless:
+        config = load_config(args.config)
+        overrides = {"interface": args.interface, "channel": args.channel, "bitrate": args.bitrate, "log_dir": args.log_dir}
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        if not all(channel['channel'] for channel in channel_configs(config)):
+            print("No channel configured. Exiting.")
+            return
+        run_headless(config, duration=args.duration, stats_interval=args.stats_interval, stats_file=args.stats_file,
+                     metrics_file=args.metrics_file, metrics_format=args.metrics_format,
+                     metrics_interval=args.metrics_interval, profile=args.profile,
+                     live_store=args.live_store)
+        return
+
     # First do the regular config setup
     config = setup_initial_config()
     if not config:
@@ -319,4 +434,4 @@ def main():
     wrapper(start_ui)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from utils.capture_export import DEFAULT_BATCH_SIZE, EXPORT_FORMATS, export_capture
+
+FORMAT_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrows"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a CAN logger capture to Parquet or Arrow, with decoded SDO values.')
+    parser.add_argument('capture', help='Capture session directory (or single CSV file from older logger versions)')
+    parser.add_argument('-o', '--output', help='Output file (default: next to the capture)')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='parquet', help='Output format (default: parquet)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Frames per record batch')
+    parser.add_argument('--compression', default='zstd', help='Parquet compression codec (default: zstd)')
+    args = parser.parse_args()
+
+    capture = Path(args.capture)
+    output = args.output or str(capture.with_name(capture.stem + FORMAT_EXTENSIONS[args.format]))
+
+    start = time.perf_counter()
+    try:
+        exported = export_capture(capture, output, file_format=args.format, batch_size=args.batch_size,
+                                  compression=args.compression)
+    except RuntimeError as err:
+        print(err)
+        sys.exit(1)
+    print(f"Exported {exported} frames to {output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
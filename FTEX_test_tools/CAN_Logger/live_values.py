@@ -0,0 +1,64 @@
+import argparse
+import sys
+import time
+
+from utils.live_store import LiveStoreReader, default_store_path
+from utils.protocol_index import ProtocolIndex
+
+
+def open_store(path):
+    try:
+        return LiveStoreReader(path)
+    except FileNotFoundError:
+        return None
+
+
+def print_values(reader, protocol_index, node_ids=None):
+    now = time.time()
+    print(f"{'node':<6} {'parameter':<48} {'value':>12} {'age s':>8}")
+    for (node_id, index, subindex), (value, timestamp) in sorted(reader.snapshot().items()):
+        if node_ids and node_id not in node_ids:
+            continue
+        parameter = protocol_index.lookup(node_id, index, subindex)
+        name = parameter.name if parameter is not None else f"{index:#06x}/{subindex:#04x}"
+        print(f"{node_id:<#6x} {name:<48} {value:>12} {now - timestamp:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the latest parameter values published by a headless '
+                                                 'capture (can_logger.py --headless --live-store).')
+    parser.add_argument('--store', default=default_store_path(), help=f'Live store file (default: {default_store_path()})')
+    parser.add_argument('--node', type=lambda x: int(x, 0), action='append', default=[],
+                        help='Only print the values of this node ID, may be repeated')
+    parser.add_argument('--watch', type=float, metavar='INTERVAL', help='Print the values again every INTERVAL seconds')
+    args = parser.parse_args()
+
+    reader = open_store(args.store)
+    if reader is None and not args.watch:
+        print(f"No live store at {args.store}: start the logger with --headless --live-store", file=sys.stderr)
+        return 1
+    protocol_index = ProtocolIndex.load()
+    try:
+        while True:
+            if reader is not None and reader.is_stale():
+                # The logger stopped or restarted: follow the store it (re)created
+                reader.close()
+                reader = open_store(args.store)
+            if reader is not None:
+                print_values(reader, protocol_index, set(args.node))
+            else:
+                print(f"Waiting for the live store at {args.store}...")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+            print()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if reader is not None:
+            reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import sys
+from datetime import datetime
+
+from utils.capture_index import build_capture_index, query_capture
+from utils.canopen import SDO_REQUEST, SDO_RESPONSE, FUNCTION_CODE_MASK
+from utils.capture_reader import TimeOfDayResolver, capture_segments, parse_time_of_day
+from utils.log_segments import format_can_data
+from utils.protocol_index import ProtocolIndex
+
+def parse_time(text, capture_start):
+    """Parse an ISO date-time, or a time of day taken on the day of the capture."""
+    if 'T' in text or '-' in text:
+        return datetime.fromisoformat(text).timestamp()
+    return TimeOfDayResolver(capture_start).resolve(parse_time_of_day(text))
+
+
+def is_sdo_write_request(frame):
+    # Expedited download commands: 0x23, 0x27, 0x2B, 0x2F
+    return (frame.can_id & FUNCTION_CODE_MASK) == SDO_REQUEST and frame.data and (frame.data[0] & 0xE0) == 0x20
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the frames of a CAN logger capture using its sidecar index.')
+    parser.add_argument('capture', help='Capture session directory (or single CSV file from older logger versions)')
+    parser.add_argument('--build', action='store_true', help='Build the missing sidecar indexes before querying')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild all the sidecar indexes')
+    parser.add_argument('--id', action='append', default=[], help='Arbitration ID (hex), may be repeated')
+    parser.add_argument('--node', type=lambda x: int(x, 0), help='Node ID: SDO requests and responses of this node')
+    parser.add_argument('--param', help='Parameter name from the protocol JSONs (e.g. CO_PARAM_MAX_VEHICLE_SPEED)')
+    parser.add_argument('--index', type=lambda x: int(x, 16), help='SDO index (hex)')
+    parser.add_argument('--subindex', type=lambda x: int(x, 16), default=0, help='SDO subindex (hex, default 0)')
+    parser.add_argument('--writes', action='store_true', help='Only keep SDO write requests')
+    parser.add_argument('--start', help='Start time (ISO date-time or HH:MM:SS[.mmm])')
+    parser.add_argument('--end', help='End time (ISO date-time or HH:MM:SS[.mmm])')
+    args = parser.parse_args()
+
+    if args.build or args.rebuild:
+        written = build_capture_index(args.capture, force=args.rebuild)
+        print(f"{len(written)} index file(s) written.", file=sys.stderr)
+
+    can_ids = {int(can_id, 16) for can_id in args.id}
+    sdo = None
+    node_ids = [args.node] if args.node is not None else []
+    if args.param:
+        protocol_index = ProtocolIndex.load()
+        try:
+            parameter = protocol_index.parameter(args.param, protocol_index.device_by_node.get(args.node))
+        except ValueError as e:
+            print(f"{e}: give the node of the device with --node", file=sys.stderr)
+            sys.exit(1)
+        if parameter is None:
+            print(f"Unknown parameter: {args.param}", file=sys.stderr)
+            sys.exit(1)
+        sdo = (parameter.index, parameter.subindex)
+        if not node_ids:
+            node_ids = protocol_index.node_ids(parameter.device)
+    elif args.index is not None:
+        sdo = (args.index, args.subindex)
+    for node_id in node_ids:
+        can_ids.add(SDO_REQUEST + node_id)
+        if not args.writes:
+            can_ids.add(SDO_RESPONSE + node_id)
+
+    segments = capture_segments(args.capture)
+    if not segments:
+        print(f"No capture found at {args.capture}", file=sys.stderr)
+        sys.exit(1)
+    capture_start = segments[0].base_time
+    start_time = parse_time(args.start, capture_start) if args.start else None
+    end_time = parse_time(args.end, capture_start) if args.end else None
+
+    count = 0
+    print("Time,ID,Data,Channel")
+    for frame in query_capture(args.capture, can_ids=can_ids or None, sdo=sdo, start_time=start_time, end_time=end_time):
+        if args.writes and not is_sdo_write_request(frame):
+            continue
+        timestamp = datetime.fromtimestamp(frame.timestamp).isoformat(timespec='milliseconds')
+        print(f"{timestamp},{frame.can_id:#04x},{format_can_data(frame.data)},{frame.channel or ''}")
+        count += 1
+    print(f"{count} frame(s) found.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
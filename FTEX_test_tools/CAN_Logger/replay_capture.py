@@ -0,0 +1,71 @@
+import argparse
+import sys
+import time
+
+import can
+
+from utils.bus import open_bus
+from utils.capture_reader import iter_capture
+
+
+def replay(bus, capture, speed=1.0, can_ids=None):
+    """
+    Send the frames of a capture on a bus with their original spacing (divided by
+    `speed`, no wait at all with a speed of 0). Returns the number of frames sent.
+    """
+    sent = 0
+    start = first_timestamp = None
+    for frame in iter_capture(capture):
+        if can_ids is not None and frame.can_id not in can_ids:
+            continue
+        if first_timestamp is None:
+            start, first_timestamp = time.perf_counter(), frame.timestamp
+        if speed > 0:
+            delay = start + (frame.timestamp - first_timestamp) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        bus.send(can.Message(arbitration_id=frame.can_id, data=frame.data, is_extended_id=frame.can_id > 0x7FF))
+        sent += 1
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a CAN capture on a CAN bus, with its original timing.')
+    parser.add_argument('capture', help='Capture session directory or CSV file')
+    parser.add_argument('--config', default='can_config.json', help='Logger configuration file: bus to replay on')
+    parser.add_argument('--interface', help='python-can interface (overrides the configuration)')
+    parser.add_argument('--channel', help='CAN channel (overrides the configuration)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed: 2 for twice as fast, 0 to send the frames back-to-back (default: 1)')
+    parser.add_argument('--ids', help='Only replay these CAN IDs (comma-separated, hex)')
+    parser.add_argument('--loop', action='store_true', help='Replay the capture again and again until Ctrl+C')
+    args = parser.parse_args()
+
+    from can_logger import load_config
+
+    config = load_config(args.config)
+    overrides = {"interface": args.interface, "channel": args.channel}
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    can_ids = {int(can_id, 16) for can_id in args.ids.split(',')} if args.ids else None
+
+    bus = open_bus(config)
+    print("Replaying the capture. Press Ctrl+C to stop.")
+    total = 0
+    try:
+        while True:
+            start = time.monotonic()
+            sent = replay(bus, args.capture, args.speed, can_ids)
+            total += sent
+            print(f"{sent} frames replayed in {time.monotonic() - start:.1f} s")
+            if not args.loop or sent == 0:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.shutdown()
+    print(f"Total: {total} frames replayed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from utils.capture_reader import iter_capture
+from utils.protocol_index import ProtocolIndex
+from utils.sdo_latency import DEFAULT_SDO_TIMEOUT, SDO_ABORT_CODES, SdoLatencyAnalyzer
+
+
+def print_report(analyzer):
+    report = analyzer.report()
+
+    def print_table(title, rows):
+        print(f"\n{title}")
+        print(f"{'':<48} {'responses':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'timeouts':>8} {'aborts':>6}")
+        for name, stats in rows.items():
+            def ms(value):
+                return f"{value:8.2f}" if value is not None else "       -"
+            print(f"{name:<48} {stats['responses']:>9} {ms(stats['p50_ms'])} {ms(stats['p99_ms'])} "
+                  f"{ms(stats['max_ms'])} {stats['timeouts']:>8} {sum(stats['aborts'].values()):>6}")
+
+    print_table("SDO response latency per node", report["nodes"])
+    print_table("SDO response latency per parameter (node, parameter)", report["parameters"])
+    print(f"\nPending requests: {report['pending_requests']} | Responses without request: {report['unmatched_responses']}")
+
+    if analyzer.recent_aborts:
+        print("\nRecent aborts:")
+        for timestamp, node, index, subindex, code in analyzer.recent_aborts:
+            when = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]
+            description = SDO_ABORT_CODES.get(code, "Unknown abort code")
+            print(f"- {when} node {node:#04x} {analyzer.parameter_name((node, index, subindex))}: {code:#010x} {description}")
+
+
+def run_live(analyzer, config, duration, report_interval):
+    from utils.bus import open_bus
+
+    bus = open_bus(config)
+    start = last_report = time.monotonic()
+    print("Analyzing live SDO traffic. Press Ctrl+C to stop.")
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            msg = bus.recv(0.5)
+            if msg is not None:
+                analyzer.add(msg.timestamp, msg.arbitration_id, msg.data)
+            else:
+                analyzer.expire(time.time())
+            if time.monotonic() - last_report >= report_interval:
+                last_report = time.monotonic()
+                print_report(analyzer)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure SDO response latency, timeouts and aborts per node and parameter.')
+    parser.add_argument('capture', nargs='?', help='Capture session directory or CSV file (offline analysis)')
+    parser.add_argument('--live', action='store_true', help='Analyze the traffic of a CAN bus instead of a capture')
+    parser.add_argument('--config', default='can_config.json', help='Logger configuration file used in live mode')
+    parser.add_argument('--interface', help='python-can interface (live mode, overrides the configuration)')
+    parser.add_argument('--channel', help='CAN channel (live mode, overrides the configuration)')
+    parser.add_argument('--duration', type=float, help='Live analysis duration in seconds (default: until Ctrl+C)')
+    parser.add_argument('--report-interval', type=float, default=10.0, help='Seconds between two live reports')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_SDO_TIMEOUT, help='SDO response timeout in seconds')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    analyzer = SdoLatencyAnalyzer(timeout=args.timeout, protocol_index=ProtocolIndex.load())
+    if args.live:
+        from can_logger import load_config
+
+        config = load_config(args.config)
+        overrides = {"interface": args.interface, "channel": args.channel}
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        run_live(analyzer, config, args.duration, args.report_interval)
+    elif args.capture:
+        last_timestamp = None
+        for frame in iter_capture(args.capture):
+            analyzer.add(frame.timestamp, frame.can_id, frame.data)
+            last_timestamp = frame.timestamp
+        if last_timestamp is not None:
+            analyzer.expire(last_timestamp)
+    else:
+        parser.error("give a capture to analyze, or --live")
+
+    print_report(analyzer)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(analyzer.report(), f, indent=4)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
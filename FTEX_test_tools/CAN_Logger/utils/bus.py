@@ -0,0 +1,17 @@
+import can
+
+from utils.can_filters import build_can_filters
+
+
+def open_bus(config, timeout=0.1):
+    """Open the CAN bus described by the logger configuration."""
+    # CAN ID filters are applied by the interface (or by python-can before
+    # frames are returned) instead of in the receive loop
+    return can.interface.Bus(
+        interface=config.get('interface', 'seeedstudio'),
+        channel=config['channel'],
+        bitrate=config['bitrate'] * 1000,
+        baudrate=config['baudrate'],
+        timeout=timeout,
+        can_filters=build_can_filters(config['can_id_filter'])
+    )
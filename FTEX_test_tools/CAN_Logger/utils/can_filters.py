@@ -0,0 +1,121 @@
+from utils.canopen import FUNCTION_CODE_MASK, SDO_FUNCTION_CODES
+
+STANDARD_ID_MASK = 0x7FF
+
+
+def _merge_id_masks(pairs):
+    # Two entries with the same mask that differ in a single masked bit cover an
+    # aligned block of IDs: replace them with one entry that ignores that bit.
+    pairs = set(pairs)
+    merged = True
+    while merged:
+        merged = False
+        for can_id, mask in sorted(pairs):
+            for bit in range(11):
+                flag = 1 << bit
+                if not mask & flag or can_id & flag:
+                    continue
+                partner = (can_id | flag, mask)
+                if partner in pairs:
+                    pairs.discard((can_id, mask))
+                    pairs.discard(partner)
+                    pairs.add((can_id, mask & ~flag))
+                    merged = True
+                    break
+            if merged:
+                break
+    return sorted(pairs)
+
+
+def build_can_filters(can_ids):
+    """
+    Translate a list of 11-bit CAN IDs into python-can `can_filters`.
+
+    Consecutive aligned blocks of IDs are merged into a single id/mask pair, so
+    that interfaces with a limited number of hardware filters can still apply
+    them. Returns None (receive everything) when no ID is given.
+    """
+    if not can_ids:
+        return None
+    pairs = _merge_id_masks((can_id & STANDARD_ID_MASK, STANDARD_ID_MASK) for can_id in can_ids)
+    return [{"can_id": can_id, "can_mask": mask, "extended": False} for can_id, mask in pairs]
+
+
+def parse_obj_dir_entry(entry):
+    """
+    Parse an `obj_dir_filter` entry into (index, subindex), subindex None for every subindex of the index.
+
+    Entries are hex strings: "2000" is index 0x2000 (any subindex), "2000:01" is index 0x2000, subindex 0x01.
+    An integer is an entry saved by earlier versions of the logger: the address bytes of an SDO frame read as
+    little endian (index | subindex << 16, e.g. 0x012000 for index 0x2000, subindex 0x01).
+    Raises ValueError for any other entry.
+    """
+    if isinstance(entry, int) and not isinstance(entry, bool):
+        if not 0 <= entry <= 0xFFFFFF:
+            raise ValueError(f"obj_dir_filter entry {entry:#x} is out of range: integer entries are "
+                             f"index | subindex << 16, at most 0xffffff")
+        return entry & 0xFFFF, entry >> 16
+    if isinstance(entry, str):
+        index_text, separator, subindex_text = entry.strip().partition(':')
+        try:
+            index = int(index_text, 16)
+            subindex = int(subindex_text, 16) if separator else None
+        except ValueError:
+            index = subindex = -1
+        if 0 <= index <= 0xFFFF and (subindex is None or 0 <= subindex <= 0xFF):
+            return index, subindex
+    raise ValueError(f"Invalid obj_dir_filter entry {entry!r}: expected \"INDEX\" or \"INDEX:SUBINDEX\" in hex, "
+                     f"e.g. \"2000\" or \"2000:01\"")
+
+
+def format_obj_dir_entry(index, subindex=None):
+    return f"{index:04X}" if subindex is None else f"{index:04X}:{subindex:02X}"
+
+
+def upgrade_obj_dir_filter(obj_dir_filter):
+    """
+    Rewrite an `obj_dir_filter` in the string format.
+
+    Returns (entries, conversions), `conversions` listing the (integer, string)
+    pairs of the entries saved by earlier versions. Raises ValueError for an invalid entry.
+    """
+    entries, conversions = [], []
+    for entry in obj_dir_filter or []:
+        text = format_obj_dir_entry(*parse_obj_dir_entry(entry))
+        if not isinstance(entry, str):
+            conversions.append((entry, text))
+        entries.append(text)
+    return entries, conversions
+
+
+def compile_obj_dir_filter(obj_dir_filter):
+    """
+    Compile the object directory address filter into a predicate on received frames.
+
+    Entries are parsed by `parse_obj_dir_entry`: an index matches every subindex
+    of it, an index and subindex match that address only. Only SDO frames carry
+    an object directory address, any other frame is rejected.
+    Returns None when the filter is empty, raises ValueError for an invalid entry.
+    """
+    if not obj_dir_filter:
+        return None
+
+    index_bitmap = bytearray(0x10000)
+    addresses = set()
+    for entry in obj_dir_filter:
+        index, subindex = parse_obj_dir_entry(entry)
+        if subindex is None:
+            index_bitmap[index] = 1
+        else:
+            addresses.add((index, subindex))
+
+    def matches(msg):
+        if (msg.arbitration_id & FUNCTION_CODE_MASK) not in SDO_FUNCTION_CODES:
+            return False
+        data = msg.data
+        if len(data) < 4:
+            return False
+        index = data[1] | (data[2] << 8)
+        return bool(index_bitmap[index]) or (index, data[3]) in addresses
+
+    return matches
@@ -0,0 +1,86 @@
+FUNCTION_CODE_MASK = 0x780
+NODE_ID_MASK = 0x07F
+
+SDO_RESPONSE = 0x580  # server -> client (0x580 + node)
+SDO_REQUEST = 0x600  # client -> server (0x600 + node)
+HEARTBEAT = 0x700
+SDO_FUNCTION_CODES = frozenset((SDO_RESPONSE, SDO_REQUEST))
+
+SDO_ABORT = 0x80
+
+# Services of the CANopen predefined connection set, by function code
+SERVICES = {
+    0x000: "NMT",
+    0x080: "EMCY",
+    0x100: "TIME",
+    0x180: "TPDO1",
+    0x200: "RPDO1",
+    0x280: "TPDO2",
+    0x300: "RPDO2",
+    0x380: "TPDO3",
+    0x400: "RPDO3",
+    0x480: "TPDO4",
+    0x500: "RPDO4",
+    SDO_RESPONSE: "SDO_RESPONSE",
+    SDO_REQUEST: "SDO_REQUEST",
+    HEARTBEAT: "HEARTBEAT",
+}
+
+TYPE_FORMATS = {
+    "uint8_t": (1, False),
+    "uint16_t": (2, False),
+    "uint32_t": (4, False),
+    "int8_t": (1, True),
+    "int16_t": (2, True),
+    "int32_t": (4, True),
+}
+
+
+def classify_frame(can_id):
+    """Return the (service, node ID) of a standard CANopen COB-ID."""
+    function_code = can_id & FUNCTION_CODE_MASK
+    node_id = can_id & NODE_ID_MASK
+    if function_code == 0x080 and node_id == 0:
+        return "SYNC", 0
+    return SERVICES.get(function_code, "UNKNOWN"), node_id
+
+
+def is_sdo(can_id):
+    return (can_id & FUNCTION_CODE_MASK) in SDO_FUNCTION_CODES
+
+
+def sdo_address(data):
+    """Return the (index, subindex) of an SDO frame, or None when it is too short."""
+    if len(data) < 4:
+        return None
+    return data[1] | (data[2] << 8), data[3]
+
+
+def sdo_expedited_payload(data):
+    """
+    Return the data bytes of an expedited SDO upload response (0x4F/0x4B/0x47/0x43)
+    or download request (0x2F/0x2B/0x27/0x23), or None for any other SDO frame.
+    """
+    if len(data) < 5:
+        return None
+    command = data[0]
+    if (command & 0xE0) not in (0x20, 0x40) or not command & 0x02:
+        return None
+    if command & 0x01:
+        size = 4 - ((command >> 2) & 0x03)
+    else:
+        size = min(4, len(data) - 4)
+    return bytes(data[4:4 + size])
+
+
+def decode_value(payload, type_name=None):
+    """Decode an expedited SDO payload as the integer of the protocol `Type` (unsigned by default)."""
+    size, signed = TYPE_FORMATS.get(type_name, (len(payload), False))
+    return int.from_bytes(payload[:size], byteorder='little', signed=signed)
+
+
+def sdo_abort_code(data):
+    """Return the abort code of an SDO abort frame (command 0x80), or None."""
+    if len(data) < 8 or data[0] != SDO_ABORT:
+        return None
+    return int.from_bytes(data[4:8], byteorder='little')
@@ -0,0 +1,118 @@
+from utils.canopen import (
+    classify_frame, decode_value, is_sdo, sdo_abort_code, sdo_address, sdo_expedited_payload
+)
+from utils.capture_reader import iter_capture
+from utils.protocol_index import ProtocolIndex
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for the export
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ("parquet", "arrow")
+DEFAULT_BATCH_SIZE = 65536
+
+
+def export_schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        pa.field("timestamp", pa.timestamp("ns", tz="UTC"), nullable=False),
+        pa.field("channel", dictionary),
+        pa.field("can_id", pa.uint16(), nullable=False),
+        pa.field("node", pa.uint8(), nullable=False),
+        pa.field("service", dictionary, nullable=False),
+        pa.field("index", pa.uint16()),
+        pa.field("subindex", pa.uint8()),
+        pa.field("payload", pa.binary(), nullable=False),
+        pa.field("parameter", dictionary),
+        pa.field("value", pa.int64()),
+        pa.field("abort_code", pa.uint32()),
+    ])
+
+
+class _BatchColumns:
+    def __init__(self):
+        self.columns = {name: [] for name in export_schema().names}
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def to_record_batch(self, schema):
+        arrays = []
+        for field in schema:
+            values = self.columns[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.record_batch(arrays, schema=schema)
+
+
+def decode_frame(frame, protocol_index):
+    """Return the decoded columns (service, node, index, subindex, parameter, value, abort code) of a frame."""
+    service, node_id = classify_frame(frame.can_id)
+    index = subindex = parameter_name = value = abort_code = None
+    if is_sdo(frame.can_id):
+        address = sdo_address(frame.data)
+        if address is not None:
+            index, subindex = address
+            parameter = protocol_index.lookup(node_id, index, subindex)
+            parameter_name = parameter.name if parameter is not None else None
+            abort_code = sdo_abort_code(frame.data)
+            payload = sdo_expedited_payload(frame.data)
+            if payload is not None:
+                value = decode_value(payload, parameter.type if parameter is not None else None)
+    return service, node_id, index, subindex, parameter_name, value, abort_code
+
+
+def export_capture(capture_path, output_path, file_format="parquet", batch_size=DEFAULT_BATCH_SIZE,
+                   compression="zstd", protocol_index=None):
+    """
+    Convert a capture into a Parquet file (or an Arrow IPC stream), one record
+    batch of `batch_size` frames at a time so memory stays bounded whatever the
+    capture size. Returns the number of frames exported.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the export: pip install pyarrow")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {EXPORT_FORMATS}")
+
+    protocol_index = protocol_index or ProtocolIndex.load()
+    schema = export_schema()
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(output_path, schema, compression=compression)
+    else:
+        # The stream format allows each batch to carry its own dictionaries
+        writer = pa.ipc.new_stream(output_path, schema)
+
+    exported = 0
+    batch = _BatchColumns()
+    columns = batch.columns
+    try:
+        for frame in iter_capture(capture_path):
+            service, node_id, index, subindex, parameter_name, value, abort_code = decode_frame(frame, protocol_index)
+            # Captures have a millisecond resolution: round at the microsecond to drop float noise
+            columns["timestamp"].append(round(frame.timestamp * 1_000_000) * 1000)
+            columns["channel"].append(frame.channel)
+            columns["can_id"].append(frame.can_id)
+            columns["node"].append(node_id)
+            columns["service"].append(service)
+            columns["index"].append(index)
+            columns["subindex"].append(subindex)
+            columns["payload"].append(frame.data)
+            columns["parameter"].append(parameter_name)
+            columns["value"].append(value)
+            columns["abort_code"].append(abort_code)
+            if len(batch) >= batch_size:
+                writer.write_batch(batch.to_record_batch(schema))
+                exported += len(batch)
+                batch = _BatchColumns()
+                columns = batch.columns
+        if len(batch):
+            writer.write_batch(batch.to_record_batch(schema))
+            exported += len(batch)
+    finally:
+        writer.close()
+    return exported
@@ -0,0 +1,231 @@
+import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from heapq import merge
+from pathlib import Path
+
+from utils.canopen import FUNCTION_CODE_MASK, SDO_FUNCTION_CODES
+from utils.capture_reader import capture_segments, iter_segment, read_frames_at
+from utils.log_segments import segment_stem
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+TIME_INDEX_STEP = 1.0  # seconds between two entries of the coarse time index
+
+
+def id_key(can_id):
+    return f"id:{can_id:#05x}"
+
+
+def sdo_key(index, subindex):
+    return f"sdo:{index:#06x}:{subindex:#04x}"
+
+
+def index_path_for(segment_path) -> Path:
+    segment_path = Path(segment_path)
+    if segment_path.suffix == '.csv' and not segment_path.name.startswith('segment_'):
+        # Single-file capture from older logger versions
+        return segment_path.with_name(segment_path.name + INDEX_SUFFIX)
+    return segment_path.with_name(segment_stem(segment_path) + INDEX_SUFFIX)
+
+
+class SegmentIndexBuilder:
+    """
+    Collects, for one segment, the sorted byte offsets (in the uncompressed CSV)
+    of the frames of each arbitration ID and of each SDO (index, subindex), plus a
+    coarse time index (first frame offset of every TIME_INDEX_STEP seconds).
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(lambda: array('Q'))
+        self.time_ms = array('Q')
+        self.time_offsets = array('Q')
+        self._time_bucket = None
+
+    def add(self, offset, timestamp, can_id, data):
+        self.postings[id_key(can_id)].append(offset)
+        if (can_id & FUNCTION_CODE_MASK) in SDO_FUNCTION_CODES and len(data) >= 4:
+            self.postings[sdo_key(data[1] | (data[2] << 8), data[3])].append(offset)
+        bucket = int(timestamp // TIME_INDEX_STEP)
+        if bucket != self._time_bucket:
+            self._time_bucket = bucket
+            self.time_ms.append(int(timestamp * 1000))
+            self.time_offsets.append(offset)
+
+    def write(self, index_path):
+        """Write the index: a JSON header line followed by little-endian uint64 arrays."""
+        arrays = []
+        keys = {}
+        position = 0
+        for key in sorted(self.postings):
+            offsets = self.postings[key]
+            keys[key] = [position, len(offsets)]
+            position += len(offsets)
+            arrays.append(offsets)
+        header = {
+            "version": INDEX_VERSION,
+            "keys": keys,
+            "time": [position, len(self.time_ms)],
+            "time_step": TIME_INDEX_STEP,
+        }
+        arrays.extend([self.time_ms, self.time_offsets])
+        with open(index_path, 'wb') as f:
+            f.write(json.dumps(header).encode('ascii') + b'\n')
+            for values in arrays:
+                if sys.byteorder == 'big':
+                    values = array('Q', values)
+                    values.byteswap()
+                values.tofile(f)
+        return Path(index_path)
+
+    def write_for_segment(self, segment_path):
+        return self.write(index_path_for(segment_path))
+
+
+class SegmentIndex:
+    """Read side of a segment sidecar index."""
+
+    def __init__(self, header, values):
+        self.header = header
+        self.values = values
+        start, count = header["time"]
+        self.time_ms = values[start:start + count]
+        self.time_offsets = values[start + count:start + 2 * count]
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get("version") != INDEX_VERSION:
+                raise ValueError(f"Unsupported index version in {index_path}")
+            values = array('Q')
+            values.frombytes(f.read())
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return cls(header, values)
+
+    def offsets(self, key):
+        entry = self.header["keys"].get(key)
+        if entry is None:
+            return array('Q')
+        start, count = entry
+        return self.values[start:start + count]
+
+    def offset_range(self, start_time=None, end_time=None):
+        """Byte range [low, high) holding the frames between two epoch times (high None: end of segment)."""
+        low, high = None, None
+        if start_time is not None:
+            position = bisect_right(self.time_ms, int(start_time * 1000)) - 1
+            if position >= 0:
+                low = self.time_offsets[position]
+        if end_time is not None:
+            position = bisect_right(self.time_ms, int(end_time * 1000))
+            if position < len(self.time_offsets):
+                high = self.time_offsets[position]
+        return low, high
+
+    def anchor_for(self, offset, default=None):
+        """Epoch time of the time index entry at or before a byte offset."""
+        if not len(self.time_ms):
+            return default
+        position = bisect_right(self.time_offsets, offset) - 1
+        return self.time_ms[max(position, 0)] / 1000
+
+
+def build_capture_index(capture_path, force=False):
+    """Build the missing sidecar indexes of a capture in one streaming pass. Returns the indexes written."""
+    written = []
+    for segment in capture_segments(capture_path):
+        index_path = index_path_for(segment.path)
+        if index_path.exists() and not force:
+            continue
+        builder = SegmentIndexBuilder()
+        for frame in iter_segment(segment):
+            builder.add(frame.offset, frame.timestamp, frame.can_id, frame.data)
+        written.append(builder.write(index_path))
+    return written
+
+
+def _intersect(left, right):
+    result = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] < right[j]:
+            i += 1
+        elif left[i] > right[j]:
+            j += 1
+        else:
+            result.append(left[i])
+            i += 1
+            j += 1
+    return result
+
+
+def query_capture(capture_path, can_ids=None, sdo=None, start_time=None, end_time=None):
+    """
+    Yield the frames of a capture matching all the given criteria, in capture order:
+    `can_ids` (any of these arbitration IDs), `sdo` ((index, subindex) of SDO
+    frames), `start_time`/`end_time` (epoch seconds).
+
+    Segments are skipped using their manifests, then the sidecar indexes give the
+    offsets of the matching frames. Segments without an index are scanned.
+    """
+    can_ids = sorted(set(can_ids)) if can_ids else None
+    for segment in capture_segments(capture_path):
+        manifest = segment.manifest
+        if manifest is not None and manifest.get("frame_count"):
+            if start_time is not None and manifest["end_time"] < start_time:
+                continue
+            if end_time is not None and manifest["start_time"] > end_time:
+                continue
+            if can_ids is not None and set(can_ids).isdisjoint(manifest["can_ids"]):
+                continue
+
+        index_path = index_path_for(segment.path)
+        if not index_path.exists():
+            yield from _scan_segment(segment, can_ids, sdo, start_time, end_time)
+            continue
+
+        index = SegmentIndex.load(index_path)
+        low, high = index.offset_range(start_time, end_time)
+        if can_ids is None and sdo is None:
+            frames = iter_segment(segment, start_offset=low, end_offset=high,
+                                  anchor=index.anchor_for(low or 0, segment.base_time))
+        else:
+            offsets = None
+            if can_ids is not None:
+                offsets = list(merge(*(index.offsets(id_key(can_id)) for can_id in can_ids)))
+            if sdo is not None:
+                sdo_offsets = index.offsets(sdo_key(*sdo))
+                offsets = list(sdo_offsets) if offsets is None else _intersect(offsets, sdo_offsets)
+            if low is not None:
+                offsets = offsets[bisect_left(offsets, low):]
+            if high is not None:
+                offsets = offsets[:bisect_left(offsets, high)]
+            frames = read_frames_at(segment, offsets, [index.anchor_for(offset, segment.base_time) for offset in offsets])
+
+        for frame in frames:
+            # The time index is coarse: trim the frames at both ends of the range
+            if start_time is not None and frame.timestamp < start_time:
+                continue
+            if end_time is not None and frame.timestamp > end_time:
+                continue
+            yield frame
+
+
+def _scan_segment(segment, can_ids, sdo, start_time, end_time):
+    wanted_ids = set(can_ids) if can_ids is not None else None
+    for frame in iter_segment(segment):
+        if wanted_ids is not None and frame.can_id not in wanted_ids:
+            continue
+        if sdo is not None:
+            if ((frame.can_id & FUNCTION_CODE_MASK) not in SDO_FUNCTION_CODES or len(frame.data) < 4 or
+                    (frame.data[1] | (frame.data[2] << 8), frame.data[3]) != tuple(sdo)):
+                continue
+        if start_time is not None and frame.timestamp < start_time:
+            continue
+        if end_time is not None and frame.timestamp > end_time:
+            continue
+        yield frame
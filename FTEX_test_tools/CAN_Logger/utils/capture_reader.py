@@ -0,0 +1,151 @@
+import json
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from utils.log_segments import (
+    CHANNEL_COLUMN, COMPRESSION_EXTENSIONS, manifest_path_for, open_segment_binary
+)
+
+CaptureFrame = namedtuple('CaptureFrame', ['timestamp', 'can_id', 'data', 'channel', 'segment', 'offset'])
+CaptureSegment = namedtuple('CaptureSegment', ['path', 'manifest', 'base_time'])
+
+LOG_NAME_TIME = re.compile(r"can_log_(\d{8}_\d{6})")
+HALF_DAY = 43200
+
+
+def _time_from_log_name(path):
+    match = LOG_NAME_TIME.search(str(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+    return Path(path).stat().st_mtime
+
+
+def capture_segments(capture_path):
+    """
+    List the segments of a capture: the segments of a session directory written by
+    the logger, or a single CSV file (older captures). `base_time` is an epoch time
+    close to the first frame, used to give a date to the time-of-day column.
+    """
+    capture_path = Path(capture_path)
+    if not capture_path.is_dir():
+        return [CaptureSegment(capture_path, None, _time_from_log_name(capture_path))]
+
+    segments = []
+    for path in sorted(capture_path.iterdir()):
+        if not any(path.name.endswith(extension) for extension in COMPRESSION_EXTENSIONS.values()):
+            continue
+        manifest = None
+        manifest_path = manifest_path_for(path)
+        if manifest_path.exists():
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        if manifest is not None and manifest.get("start_time") is not None:
+            base_time = manifest["start_time"]
+        else:
+            # Segment still being written or left behind by a crash
+            base_time = segments[-1].base_time if segments else _time_from_log_name(capture_path)
+        segments.append(CaptureSegment(path, manifest, base_time))
+    return segments
+
+
+def parse_time_of_day(text):
+    hours, minutes, seconds = text.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _local_midnight(epoch, day_shift=0):
+    midnight = datetime.fromtimestamp(epoch).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight + timedelta(days=day_shift)).timestamp()
+
+
+class TimeOfDayResolver:
+    """
+    Turns the time-of-day column of a capture into epoch times, following the
+    frames across midnight. Each resolved time becomes the anchor of the next one.
+    """
+
+    def __init__(self, anchor):
+        self.anchor = anchor
+        self._midnight = _local_midnight(anchor)
+
+    def resolve(self, time_of_day):
+        timestamp = self._midnight + time_of_day
+        if timestamp < self.anchor - HALF_DAY:
+            self._midnight = _local_midnight(self._midnight + HALF_DAY, day_shift=1)
+            timestamp = self._midnight + time_of_day
+        elif timestamp > self.anchor + HALF_DAY:
+            self._midnight = _local_midnight(self._midnight - HALF_DAY)
+            timestamp = self._midnight + time_of_day
+        self.anchor = timestamp
+        return timestamp
+
+
+def parse_data(text):
+    return bytes.fromhex(text) if text else b''
+
+
+def read_header(stream):
+    """Read the CSV header line, return (column names, byte length)."""
+    line = stream.readline()
+    return line.decode('ascii').rstrip('\r\n').split(','), len(line)
+
+
+def iter_segment(segment, start_offset=None, end_offset=None, anchor=None):
+    """
+    Yield the frames of a segment in file order, with epoch timestamps.
+
+    `start_offset`/`end_offset` restrict the read to a byte range of the
+    uncompressed CSV (as found in a sidecar index), `anchor` is an epoch time
+    close to the first frame read (defaults to the segment base time).
+    """
+    with open_segment_binary(segment.path) as stream:
+        columns, offset = read_header(stream)
+        has_channel = CHANNEL_COLUMN in columns
+        if start_offset is not None and start_offset > offset:
+            stream.seek(start_offset)
+            offset = start_offset
+        resolver = TimeOfDayResolver(segment.base_time if anchor is None else anchor)
+        for line in stream:
+            if end_offset is not None and offset >= end_offset:
+                break
+            fields = line.decode('ascii').rstrip('\r\n').split(',')
+            line_offset = offset
+            offset += len(line)
+            if len(fields) < 3:
+                continue
+            yield CaptureFrame(
+                timestamp=resolver.resolve(parse_time_of_day(fields[0])),
+                can_id=int(fields[1], 16),
+                data=parse_data(fields[2]),
+                channel=fields[3] if has_channel and len(fields) > 3 else None,
+                segment=segment.path.name,
+                offset=line_offset,
+            )
+
+
+def read_frames_at(segment, offsets, anchors):
+    """Yield the frames at the given sorted byte offsets of a segment, seeking forward between them."""
+    with open_segment_binary(segment.path) as stream:
+        columns, _ = read_header(stream)
+        has_channel = CHANNEL_COLUMN in columns
+        for offset, anchor in zip(offsets, anchors):
+            stream.seek(offset)
+            fields = stream.readline().decode('ascii').rstrip('\r\n').split(',')
+            if len(fields) < 3:
+                continue
+            yield CaptureFrame(
+                timestamp=TimeOfDayResolver(anchor).resolve(parse_time_of_day(fields[0])),
+                can_id=int(fields[1], 16),
+                data=parse_data(fields[2]),
+                channel=fields[3] if has_channel and len(fields) > 3 else None,
+                segment=segment.path.name,
+                offset=offset,
+            )
+
+
+def iter_capture(capture_path):
+    """Yield every frame of a capture, in capture order."""
+    for segment in capture_segments(capture_path):
+        yield from iter_segment(segment)
@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from utils.canopen import TYPE_FORMATS, decode_value
+from utils.protocol_index import CACHE_DIR
+from utils.sdo_client import DEFAULT_READ_TIMEOUT, DEFAULT_RETRIES, read_parameters
+
+AUDIT_CACHE_FILE = CACHE_DIR / "audit_cache.json"
+SERIAL_NUMBER_PARAMETERS = ("CO_PARAM_SERIAL_NUMBER_MSB", "CO_PARAM_SERIAL_NUMBER_LSB")
+# Read-only persistent values that still change during the life of a device
+NOT_CACHEABLE = {"CO_PARAM_CONTROLLER_ODOMETER"}
+
+
+def is_boot_up_parameter(parameter):
+    """True for the values fixed for a given device (serial number, versions): read once per device and cached."""
+    definition = parameter.definition
+    if definition.get("Query_frequency") == "boot-up":
+        return True
+    return (parameter.access == "R" and definition.get("Persistence") == "Persistent"
+            and parameter.name not in NOT_CACHEABLE)
+
+
+def load_golden(path, column=None):
+    """
+    Load a golden parameter set: {name: value} or, shaped like the persistent test
+    datasets, {name: [value, ...]} where any of the listed values is accepted
+    (only the value at `column` with a column number).
+    """
+    with open(path, 'r') as f:
+        golden = json.load(f)
+    expected = {}
+    for name, value in golden.items():
+        values = value if isinstance(value, list) else [value]
+        if column is not None:
+            values = [values[column]] if column < len(values) else []
+        expected[name] = values
+    return expected
+
+
+class SerialNumberCache:
+    """Boot-up parameter values of each audited device, by serial number, in a JSON file."""
+
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.devices = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            with open(self.path, 'r') as f:
+                self.devices = json.load(f)
+
+    def get(self, serial_number):
+        return self.devices.get(serial_number, {}).get("values", {})
+
+    def put(self, serial_number, values):
+        with self._lock:
+            entry = self.devices.setdefault(serial_number, {"values": {}})
+            entry["values"].update(values)
+            entry["updated"] = datetime.now().isoformat(timespec='seconds')
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.devices, f, indent=4)
+        os.replace(tmp_file, self.path)
+
+
+def format_serial_number(msb, lsb):
+    return f"{msb:08X}{lsb:08X}"
+
+
+def select_parameters(protocol_index, golden=None, names=None, golden_only=False, device="controller"):
+    """
+    The readable parameters to audit: `names`, or the golden ones, or every readable
+    one of the device. The serial number is always read, it keys the cache.
+    """
+    if names:
+        wanted = names
+    elif golden_only and golden is not None:
+        wanted = list(golden)
+    else:
+        wanted = [parameter.name for parameter in protocol_index.by_address.values() if parameter.device == device]
+    selected = []
+    for name in dict.fromkeys([*SERIAL_NUMBER_PARAMETERS, *wanted]):
+        parameter = protocol_index.parameter(name, device)
+        if parameter is None:
+            continue
+        # Only expedited (up to 4 bytes) readable values
+        if "R" in (parameter.access or "") and parameter.type in TYPE_FORMATS:
+            selected.append(parameter)
+    return selected
+
+
+class _DeviceAudit:
+    def __init__(self, bus_name, node_id):
+        self.bus_name = bus_name
+        self.node_id = node_id
+        self.serial_number = None
+        self.values = {}
+        self.errors = {}
+        self.cached = []
+        self.reads = 0
+        self.read_time = 0.0
+
+    def add_results(self, parameters_by_address, results, start, end):
+        for address, result in results.items():
+            parameter = parameters_by_address[address]
+            if result.ok:
+                self.values[parameter.name] = decode_value(result.payload, parameter.type)
+            elif result.timed_out:
+                self.errors[parameter.name] = "timeout"
+            elif result.abort_code is not None:
+                self.errors[parameter.name] = f"abort {result.abort_code:#010x}"
+            else:
+                self.errors[parameter.name] = "unsupported response"
+        self.reads += len(results)
+        if start is not None and end is not None:
+            self.read_time += end - start
+
+    def report(self, golden):
+        mismatches = {}
+        unchecked = []  # golden parameters not read: not in the protocol, not readable, or not selected
+        if golden:
+            for name, expected in golden.items():
+                if name not in self.values:
+                    if name not in self.errors:
+                        unchecked.append(name)
+                elif expected and self.values[name] not in expected:
+                    mismatches[name] = {"expected": expected[0] if len(expected) == 1 else expected,
+                                        "actual": self.values[name]}
+        return {
+            "bus": self.bus_name,
+            "node": f"{self.node_id:#04x}",
+            "serial_number": self.serial_number,
+            "passed": not mismatches and not self.errors and not unchecked,
+            "reads": self.reads,
+            "cached": len(self.cached),
+            "read_time_s": round(self.read_time, 3),
+            "reads_per_s": round(self.reads / self.read_time, 1) if self.read_time > 0 else None,
+            "mismatches": mismatches,
+            "unchecked": unchecked,
+            "errors": self.errors,
+            "values": self.values,
+        }
+
+
+def audit_bus(bus_name, bus, node_ids, parameters, cache, window=1, timeout=DEFAULT_READ_TIMEOUT,
+              retries=DEFAULT_RETRIES):
+    """
+    Audit the nodes of one bus: read their serial numbers, then every parameter
+    not found in the cache for that serial number, pipelined over all the nodes.
+    """
+    protocol_parameters = {(parameter.index, parameter.subindex): parameter for parameter in parameters}
+    serial_parameters = [parameter for parameter in parameters if parameter.name in SERIAL_NUMBER_PARAMETERS]
+    devices = {node_id: _DeviceAudit(bus_name, node_id) for node_id in node_ids}
+
+    if len(serial_parameters) == len(SERIAL_NUMBER_PARAMETERS):
+        addresses = [(parameter.index, parameter.subindex) for parameter in serial_parameters]
+        results, times = read_parameters(bus, {node_id: addresses for node_id in node_ids}, window, timeout, retries)
+        for node_id, device in devices.items():
+            device.add_results(protocol_parameters, results[node_id], *times[node_id])
+            msb, lsb = (device.values.get(name) for name in SERIAL_NUMBER_PARAMETERS)
+            if msb is not None and lsb is not None:
+                device.serial_number = format_serial_number(msb, lsb)
+
+    reads = {}
+    for node_id, device in devices.items():
+        cached_values = cache.get(device.serial_number) if device.serial_number else {}
+        addresses = []
+        for parameter in parameters:
+            if parameter.name in device.values or parameter.name in device.errors:
+                continue
+            if parameter.name in cached_values and is_boot_up_parameter(parameter):
+                device.values[parameter.name] = cached_values[parameter.name]
+                device.cached.append(parameter.name)
+            else:
+                addresses.append((parameter.index, parameter.subindex))
+        reads[node_id] = addresses
+
+    results, times = read_parameters(bus, reads, window, timeout, retries)
+    for node_id, device in devices.items():
+        device.add_results(protocol_parameters, results[node_id], *times[node_id])
+        if device.serial_number:
+            cache.put(device.serial_number, {parameter.name: device.values[parameter.name] for parameter in parameters
+                                             if is_boot_up_parameter(parameter) and parameter.name in device.values})
+    return list(devices.values())
+
+
+def audit_fleet(targets, parameters, golden=None, cache=None, window=1, timeout=DEFAULT_READ_TIMEOUT,
+                retries=DEFAULT_RETRIES):
+    """
+    Audit every target concurrently, one thread per bus. `targets` is a list of
+    (bus name, open bus, node IDs). Returns the report: one entry per device
+    with its diff against `golden`, plus the fleet totals.
+    """
+    cache = cache or SerialNumberCache(None)
+    audits = {}
+    errors = {}
+
+    def run(bus_name, bus, node_ids):
+        try:
+            audits[bus_name] = audit_bus(bus_name, bus, node_ids, parameters, cache, window, timeout, retries)
+        except Exception as e:
+            errors[bus_name] = str(e)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=run, args=target, name=f"audit-{target[0]}") for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    cache.save()
+
+    devices = [device.report(golden) for bus_name, *_ in targets for device in audits.get(bus_name, [])]
+    total_reads = sum(device["reads"] for device in devices)
+    return {
+        "time": datetime.now().isoformat(timespec='seconds'),
+        "devices": devices,
+        "summary": {
+            "devices": len(devices),
+            "passed": sum(device["passed"] for device in devices),
+            "reads": total_reads,
+            "cached": sum(device["cached"] for device in devices),
+            "elapsed_s": round(elapsed, 3),
+            "reads_per_s": round(total_reads / elapsed, 1) if elapsed > 0 else None,
+        },
+        "bus_errors": errors,
+    }
+
+
+def simulated_fleet_values(parameters, golden, node_ids, mismatch_rate=0.0, seed=0):
+    """
+    Parameter values of simulated controllers: the golden values (0 elsewhere), a
+    distinct serial number per node, and a random `mismatch_rate` of wrong values.
+    """
+    rng = random.Random(seed)
+    nodes = {}
+    for node_id in node_ids:
+        objects = {}
+        for parameter in parameters:
+            expected = (golden or {}).get(parameter.name)
+            value = expected[0] if expected else 0
+            if parameter.name == "CO_PARAM_SERIAL_NUMBER_LSB":
+                value = 0x1000 + node_id
+            elif expected and rng.random() < mismatch_rate:
+                value = value ^ 1
+            objects[(parameter.index, parameter.subindex)] = (value, parameter.type)
+        nodes[node_id] = objects
+    return nodes
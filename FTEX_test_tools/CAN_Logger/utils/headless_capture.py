@@ -0,0 +1,152 @@
+import json
+import os
+import signal
+import time
+from datetime import datetime
+from pathlib import Path
+
+from utils.can_filters import compile_obj_dir_filter
+from utils.canopen import FUNCTION_CODE_MASK, SDO_FUNCTION_CODES
+from utils.sdo_latency import SdoLatencyAnalyzer
+
+# Wall-clock checks (stats, duration) are only done every N frames to keep the receive loop tight
+CLOCK_CHECK_FRAMES = 256
+
+
+class HeadlessCapture:
+    """
+    Unattended capture loop: receive -> buffer -> write, with no UI.
+
+    Frames are handed to the log writer (which formats, compresses and writes on
+    its own thread). A one-line status is printed, and optionally written as a
+    JSON snapshot to `stats_file`, every `stats_interval` seconds.
+
+    With a `metrics` registry, the capture, the log writer and the bus register
+    their counters in it, and SDO request/response pairs are timed. With a
+    `live_store` (LiveStoreWriter), the parameter values carried by the SDO
+    frames are published to it for local readers.
+    """
+
+    def __init__(self, bus, log_writer, config, stats_interval=10.0, stats_file=None, metrics=None, live_store=None):
+        self.bus = bus
+        self.log_writer = log_writer
+        self.obj_dir_matches = compile_obj_dir_filter(config['obj_dir_filter'])
+        self.stats_interval = stats_interval
+        self.stats_file = Path(stats_file) if stats_file else None
+        self.running = False
+        self.frames_received = 0
+        self.frames_written = 0
+        self.start_time = None
+        self._last_stats_time = None
+        self._last_stats_frames = 0
+        self.sdo_analyzer = None
+        self.live_store = live_store
+        if metrics is not None:
+            self.register_metrics(metrics)
+
+    def register_metrics(self, metrics):
+        metrics.counter("can_logger_frames_received_total", "Frames received by the capture loop",
+                        func=lambda: self.frames_received)
+        metrics.counter("can_logger_frames_logged_total", "Frames passing the filters, handed to the log writer",
+                        func=lambda: self.frames_written)
+        self.log_writer.register_metrics(metrics)
+        if hasattr(self.bus, 'register_metrics'):
+            self.bus.register_metrics(metrics)
+        self.sdo_analyzer = SdoLatencyAnalyzer()
+        self.sdo_analyzer.register_metrics(metrics)
+        if self.live_store is not None:
+            self.live_store.register_metrics(metrics)
+
+    def install_signal_handlers(self):
+        """Stop on SIGINT/SIGTERM, rotate the log segment on SIGHUP (SIGBREAK on Windows)."""
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        rotate_signal = getattr(signal, 'SIGHUP', None) or getattr(signal, 'SIGBREAK', None)
+        if rotate_signal is not None:
+            signal.signal(rotate_signal, lambda signum, frame: self.log_writer.rotate())
+
+    def stop(self):
+        self.running = False
+
+    def run(self, duration=None, max_frames=None):
+        self.running = True
+        self.start_time = self._last_stats_time = time.monotonic()
+        deadline = self.start_time + duration if duration else None
+
+        recv = self.bus.recv
+        write = self.log_writer.write
+        matches = self.obj_dir_matches
+        sdo = self.sdo_analyzer.add if self.sdo_analyzer is not None else None
+        publish = self.live_store.add if self.live_store is not None else None
+        received = written = 0
+        try:
+            while self.running:
+                msg = recv(0.5)
+                if msg is not None:
+                    received += 1
+                    if matches is None or matches(msg):
+                        write(msg.timestamp, msg.arbitration_id, msg.data, msg.channel)
+                        written += 1
+                    if (sdo is not None or publish is not None) and \
+                            (msg.arbitration_id & FUNCTION_CODE_MASK) in SDO_FUNCTION_CODES:
+                        if sdo is not None:
+                            sdo(msg.timestamp, msg.arbitration_id, msg.data)
+                        if publish is not None:
+                            publish(msg.timestamp, msg.arbitration_id, msg.data, msg.channel)
+                    if received % CLOCK_CHECK_FRAMES and received != max_frames:
+                        continue
+
+                self.frames_received = received
+                self.frames_written = written
+                now = time.monotonic()
+                if now - self._last_stats_time >= self.stats_interval:
+                    self.report_stats(now)
+                if (deadline is not None and now >= deadline) or (max_frames is not None and received >= max_frames):
+                    break
+        finally:
+            self.frames_received = received
+            self.frames_written = written
+            self.running = False
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        runtime = now - self.start_time if self.start_time is not None else 0.0
+        stats = {
+            "time": datetime.now().isoformat(timespec='seconds'),
+            "runtime_s": round(runtime, 3),
+            "frames_received": self.frames_received,
+            "frames_written": self.frames_written,
+            "rate_fps": round(self.frames_received / runtime, 1) if runtime > 0 else 0.0,
+            "session": str(self.log_writer.session_dir),
+            "segment": self.log_writer.current_segment_name,
+            "segments_closed": len(self.log_writer.manifests),
+        }
+        channel_stats = getattr(self.bus, 'channel_stats', None)
+        if channel_stats is not None:
+            stats["channels"] = channel_stats()
+        return stats
+
+    def report_stats(self, now=None):
+        now = time.monotonic() if now is None else now
+        stats = self.snapshot(now)
+        interval = now - self._last_stats_time
+        interval_rate = (self.frames_received - self._last_stats_frames) / interval if interval > 0 else 0.0
+        self._last_stats_time = now
+        self._last_stats_frames = self.frames_received
+        print(f"[{stats['time']}] frames: {stats['frames_received']} received, {stats['frames_written']} written | "
+              f"rate: {interval_rate:.1f} msg/s | segment: {stats['segment']}" + format_channel_stats(stats.get("channels")),
+              flush=True)
+
+        if self.stats_file is not None:
+            # Write then rename, so readers never see a partial file
+            tmp_file = self.stats_file.with_name(self.stats_file.name + '.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(stats, f, indent=4)
+            os.replace(tmp_file, self.stats_file)
+
+
+def format_channel_stats(channels):
+    if not channels:
+        return ""
+    return " | " + " | ".join(f"{channel['name']}: rx {channel['received']} drop {channel['dropped']} err {channel['error_frames']}"
+                              for channel in channels)
@@ -0,0 +1,237 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from utils.canopen import (
+    FUNCTION_CODE_MASK, NODE_ID_MASK, SDO_ABORT, SDO_REQUEST, SDO_RESPONSE, TYPE_FORMATS, decode_value,
+    sdo_expedited_payload
+)
+
+# Shared memory file layout (little endian):
+#   header     magic, version, slot count, directory offset, slots offset, created (epoch), writer pid, closed flag
+#   directory  one (node, subindex, index) entry per slot, in slot order
+#   slots      one (sequence, timestamp, value) entry per slot, 8-byte aligned
+# A slot is written under a seqlock: its sequence number is odd while the slot is
+# being written, and is incremented again (even) once the timestamp and value are set.
+MAGIC = b"FTEXLIVE"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIdII")
+DIRECTORY_ENTRY = struct.Struct("<BBH")
+SLOT = struct.Struct("<Qdq")
+SEQUENCE = struct.Struct("<Q")
+VALUE = struct.Struct("<dq")
+IDENTITY = struct.Struct("<dI")  # created, writer pid: tells two stores written at the same path apart
+IDENTITY_OFFSET = struct.calcsize("<8sIIII")
+CLOSED_OFFSET = HEADER.size - 4
+
+SDO_DOWNLOAD_RESPONSE = 0x60
+READ_RETRIES = 1000
+
+
+def default_store_path():
+    # tmpfs on Linux: the store never touches the disk
+    shm = Path("/dev/shm")
+    return str((shm if shm.is_dir() else Path(tempfile.gettempdir())) / "ftex_live_store")
+
+
+def store_layout(protocol_index):
+    """Slots of the store: every expedited (up to 4 bytes) parameter of every node of the protocol index."""
+    slots = []
+    for node_id, device in sorted(protocol_index.device_by_node.items()):
+        for (parameter_device, index, subindex), parameter in sorted(protocol_index.by_address.items()):
+            if parameter_device == device and parameter.type in TYPE_FORMATS:
+                slots.append((node_id, index, subindex, parameter.type))
+    return slots
+
+
+class LiveStoreWriter:
+    """
+    Publishes the latest value of every parameter seen on the bus to a memory-mapped
+    file, for local readers (LiveStoreReader) in other processes.
+
+    Values come from expedited SDO upload responses, and from expedited downloads
+    once the device acknowledged them. The slots are laid out from the protocol
+    index when the store is created; frames of other parameters are ignored.
+    There must be a single writer per store. On a multi-channel capture, a node ID
+    used on several channels has one slot, holding the latest value of any of them.
+    """
+
+    def __init__(self, path, protocol_index):
+        self.path = Path(path)
+        layout = store_layout(protocol_index)
+        directory_offset = HEADER.size
+        slots_offset = (directory_offset + DIRECTORY_ENTRY.size * len(layout) + 7) & ~7
+        size = slots_offset + SLOT.size * len(layout)
+
+        # Built aside then renamed: a reader opens either the previous store or the complete new one
+        tmp_file = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_file, 'w+b') as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as mapping:
+                self._write_layout(mapping, layout, directory_offset, slots_offset)
+        try:
+            os.replace(tmp_file, self.path)
+        except PermissionError:
+            # Windows: a file still open in a reader cannot be replaced
+            os.remove(tmp_file)
+            self._rewrite_in_place(size, layout, directory_offset, slots_offset)
+        else:
+            self._file = open(self.path, 'r+b')
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        self._slots = {}  # (node, index, subindex) -> (slot offset, type)
+        for i, (node_id, index, subindex, type_name) in enumerate(layout):
+            self._slots[(node_id, index, subindex)] = (slots_offset + i * SLOT.size, type_name)
+        self._sequences = {offset: 0 for offset, _ in self._slots.values()}
+        self._pending_downloads = {}  # (channel, node, index, subindex) -> payload written, until acknowledged
+        self.updates = 0
+
+    @staticmethod
+    def _write_layout(mapping, layout, directory_offset, slots_offset):
+        # The header goes last: a reader never sees a valid header over an incomplete directory
+        for i, (node_id, index, subindex, _) in enumerate(layout):
+            DIRECTORY_ENTRY.pack_into(mapping, directory_offset + i * DIRECTORY_ENTRY.size, node_id, subindex, index)
+        HEADER.pack_into(mapping, 0, MAGIC, VERSION, len(layout), directory_offset, slots_offset, time.time(),
+                         os.getpid(), 0)
+
+    def _rewrite_in_place(self, size, layout, directory_offset, slots_offset):
+        """Reuse the store file of a previous writer, marked closed first so its readers see it is stale."""
+        self._file = open(self.path, 'r+b')
+        if os.fstat(self._file.fileno()).st_size >= HEADER.size:
+            self._file.seek(CLOSED_OFFSET)
+            self._file.write(struct.pack("<I", 1))
+            self._file.flush()
+        try:
+            self._file.truncate(size)
+        except OSError as e:
+            self._file.close()
+            raise OSError(f"Cannot resize the live store {self.path} while readers have it open: "
+                          f"stop them, or use another path ({e})") from e
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._mmap[:] = bytes(size)  # previous values, and header: the identity of the previous store is gone
+        self._write_layout(self._mmap, layout, directory_offset, slots_offset)
+
+    @property
+    def slot_count(self):
+        return len(self._slots)
+
+    def register_metrics(self, metrics):
+        metrics.counter("can_live_store_updates_total", "Parameter values published to the live store",
+                        func=lambda: self.updates)
+        metrics.gauge("can_live_store_slots", "Parameters the live store has a slot for", func=lambda: len(self._slots))
+
+    def update(self, node_id, index, subindex, payload, timestamp):
+        """Publish the payload of an expedited SDO transfer. Returns False for a parameter without a slot."""
+        slot = self._slots.get((node_id, index, subindex))
+        if slot is None:
+            return False
+        offset, type_name = slot
+        sequence = self._sequences[offset] + 1
+        SEQUENCE.pack_into(self._mmap, offset, sequence)
+        VALUE.pack_into(self._mmap, offset + SEQUENCE.size, timestamp, decode_value(payload, type_name))
+        SEQUENCE.pack_into(self._mmap, offset, sequence + 1)
+        self._sequences[offset] = sequence + 1
+        self.updates += 1
+        return True
+
+    def add(self, timestamp, can_id, data, channel=None):
+        """
+        Publish the value carried by a CAN frame, if any. A download is paired with
+        its acknowledgement on the same `channel` only.
+        """
+        function_code = can_id & FUNCTION_CODE_MASK
+        if function_code == SDO_RESPONSE and len(data) >= 4:
+            key = (can_id & NODE_ID_MASK, data[1] | (data[2] << 8), data[3])
+            if data[0] == SDO_DOWNLOAD_RESPONSE:
+                payload = self._pending_downloads.pop((channel, *key), None)
+            elif data[0] == SDO_ABORT:
+                self._pending_downloads.pop((channel, *key), None)  # refused: never published
+                payload = None
+            else:
+                payload = sdo_expedited_payload(data)
+            if payload is not None:
+                self.update(*key, payload, timestamp)
+        elif function_code == SDO_REQUEST and len(data) >= 4 and (data[0] & 0xE0) == 0x20:
+            key = (channel, can_id & NODE_ID_MASK, data[1] | (data[2] << 8), data[3])
+            # At most one pending download per slot and channel: a newer one replaces it
+            self._pending_downloads.pop(key, None)
+            payload = sdo_expedited_payload(data)
+            if payload is not None and key[1:] in self._slots:
+                self._pending_downloads[key] = payload
+
+    def close(self):
+        struct.pack_into("<I", self._mmap, CLOSED_OFFSET, 1)
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+
+
+class LiveStoreReader:
+    """
+    Reads the live store of a running logger, without any lock: each slot is read
+    straight from the shared mapping and read again if the writer updated it
+    meanwhile. Values are (value, timestamp) tuples, timestamps are epoch times.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slot_count, directory_offset, slots_offset, self.created, self.writer_pid, _ = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a live store (version {VERSION})")
+        self._slots = {}  # (node, index, subindex) -> slot offset
+        for i in range(slot_count):
+            node_id, subindex, index = DIRECTORY_ENTRY.unpack_from(self._mmap, directory_offset + i * DIRECTORY_ENTRY.size)
+            self._slots[(node_id, index, subindex)] = slots_offset + i * SLOT.size
+
+    @property
+    def addresses(self):
+        return list(self._slots)
+
+    @property
+    def closed_by_writer(self):
+        return struct.unpack_from("<I", self._mmap, CLOSED_OFFSET)[0] == 1
+
+    def is_stale(self):
+        """True when the logger stopped, or restarted with a new store: reopen the store to follow it."""
+        if self.closed_by_writer or IDENTITY.unpack_from(self._mmap, IDENTITY_OFFSET) != (self.created, self.writer_pid):
+            return True  # stopped, or restarted over this same file (Windows)
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return True
+
+    def _read_slot(self, offset):
+        mapping = self._mmap
+        for _ in range(READ_RETRIES):
+            before, timestamp, value = SLOT.unpack_from(mapping, offset)
+            if before == 0:
+                return None  # never written
+            if not before & 1 and SEQUENCE.unpack_from(mapping, offset)[0] == before:
+                return value, timestamp
+            time.sleep(0)  # being written: let the writer finish
+        raise RuntimeError(f"Live store slot at offset {offset} kept changing while being read")
+
+    def read(self, node_id, index, subindex):
+        """Latest (value, timestamp) of a parameter, or None when it has not been seen yet."""
+        offset = self._slots.get((node_id, index, subindex))
+        return self._read_slot(offset) if offset is not None else None
+
+    def snapshot(self):
+        """{(node, index, subindex): (value, timestamp)} of every parameter seen so far."""
+        values = {}
+        for address, offset in self._slots.items():
+            entry = self._read_slot(offset)
+            if entry is not None:
+                values[address] = entry
+        return values
+
+    def close(self):
+        self._mmap.close()
@@ -0,0 +1,317 @@
+import gzip
+import io
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+CSV_HEADER = ['Time', 'ID', 'Data']
+CHANNEL_COLUMN = 'Channel'  # only present in multi-channel captures
+MANIFEST_SUFFIX = '.manifest.json'
+LINE_TERMINATOR = '\r\n'
+COMPRESSION_EXTENSIONS = {
+    "none": ".csv",
+    "gzip": ".csv.gz",
+    "zstd": ".csv.zst",
+}
+
+# Control items put on the writer queue next to the captured frames
+_ROTATE = object()
+_STOP = object()
+
+
+def format_can_data(data) -> str:
+    return ' '.join(f"{b:02X}" for b in data)
+
+
+def format_timestamp_ms(timestamp: float) -> str:
+    dt = datetime.fromtimestamp(timestamp)
+    return dt.strftime('%H:%M:%S.%f')[:-3]
+
+
+def resolve_compression(compression: str) -> str:
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {list(COMPRESSION_EXTENSIONS)}")
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed, falling back to gzip compression.")
+        return "gzip"
+    return compression
+
+
+def open_segment_for_writing(path: Path, compression: str):
+    """Open a text stream on a segment file, compressing on the fly."""
+    if compression == "gzip":
+        return gzip.open(path, 'wt', newline='', compresslevel=6)
+    if compression == "zstd":
+        raw = open(path, 'wb')
+        writer = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, newline='')
+    return open(path, 'w', newline='')
+
+
+class _ForwardSeekableReader(io.RawIOBase):
+    """
+    Raw stream over a zstandard stream reader, which can only seek forward: lets an
+    io.BufferedReader (readline, line iteration) seek forward through the segment.
+    """
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._reader.readinto(buffer)
+
+    def tell(self):
+        return self._reader.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._reader.seek(offset, whence)  # raises on a backward seek
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+        super().close()
+
+
+def open_segment_binary(path):
+    """
+    Open a (possibly compressed) segment file as a buffered binary stream of the
+    uncompressed CSV. Zstandard segments can only seek forward.
+    """
+    path = Path(path)
+    if path.name.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.name.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.BufferedReader(_ForwardSeekableReader(reader))
+    return open(path, 'rb')
+
+
+def segment_stem(segment_path) -> str:
+    name = Path(segment_path).name
+    for extension in COMPRESSION_EXTENSIONS.values():
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+def manifest_path_for(segment_path) -> Path:
+    segment_path = Path(segment_path)
+    return segment_path.with_name(segment_stem(segment_path) + MANIFEST_SUFFIX)
+
+
+class _Segment:
+    def __init__(self, path: Path, compression: str, with_channel: bool, index_builder=None):
+        self.path = path
+        self.stream = open_segment_for_writing(path, compression)
+        self.with_channel = with_channel
+        self.index_builder = index_builder
+        header = LINE_TERMINATOR.join([','.join(CSV_HEADER + [CHANNEL_COLUMN] if with_channel else CSV_HEADER), ''])
+        self.stream.write(header)
+        self.opened_at = time.monotonic()
+        # Rows are ASCII: character counts are the byte offsets in the uncompressed CSV
+        self.bytes_written = len(header)
+        self.frame_count = 0
+        self.start_time = None
+        self.end_time = None
+        self.can_ids = set()
+        self.channels = set()
+
+    def write(self, timestamp, arbitration_id, data, channel):
+        # None of the fields need CSV quoting, the row is formatted directly
+        line = f"{format_timestamp_ms(timestamp)},{arbitration_id:#04x},{format_can_data(data)}"
+        if self.with_channel:
+            line = f"{line},{channel}"
+            self.channels.add(channel)
+        line += LINE_TERMINATOR
+        self.stream.write(line)
+        if self.index_builder is not None:
+            self.index_builder.add(self.bytes_written, timestamp, arbitration_id, data)
+        self.bytes_written += len(line)
+        self.frame_count += 1
+        if self.start_time is None:
+            self.start_time = timestamp
+        self.end_time = timestamp
+        self.can_ids.add(arbitration_id)
+
+    def close(self, compression: str) -> dict:
+        self.stream.close()
+        manifest = {
+            "segment": self.path.name,
+            "compression": compression,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "frame_count": self.frame_count,
+            "can_ids": sorted(self.can_ids),
+        }
+        if self.with_channel:
+            manifest["channels"] = sorted(self.channels)
+        if self.index_builder is not None:
+            manifest["index"] = self.index_builder.write_for_segment(self.path).name
+        with open(manifest_path_for(self.path), 'w') as f:
+            json.dump(manifest, f, indent=4)
+        return manifest
+
+
+class SegmentedLogWriter:
+    """
+    Writes captured frames into a directory of rolling, compressed CSV segments.
+
+    Frames are handed over to a background thread through a queue, so the capture
+    loop never waits on formatting, compression or disk I/O. A segment is closed
+    once it reaches `max_segment_bytes` of uncompressed CSV or has been open for
+    `max_segment_seconds`, and a small manifest (time range, frame count and the
+    CAN IDs seen) is written next to it.
+
+    With `with_channel`, a `Channel` column records the channel of each frame
+    (multi-channel captures). With `index_builder_factory`, each segment gets a
+    sidecar index built while it is written (see utils.capture_index).
+
+    If the background thread fails (disk full, permission denied on a new segment),
+    it stops, and its exception is raised again by the next `write()`, or by
+    `close()` when no `write()` raised it.
+    """
+
+    def __init__(self, session_dir, compression="gzip", max_segment_bytes=64 * 1024 * 1024,
+                 max_segment_seconds=3600, with_channel=False, index_builder_factory=None):
+        self.session_dir = Path(session_dir)
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self.compression = resolve_compression(compression)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.with_channel = with_channel
+        self.index_builder_factory = index_builder_factory
+        self.manifests = []
+        self.current_segment_name = None
+        self.frames_written = 0
+        self._segment_number = 0
+        self._segment_close_seconds = None
+        self.error = None
+        self._error_raised = False
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="can-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, timestamp, arbitration_id, data, channel=None):
+        if self.error is not None:
+            self._raise_error()
+        self._queue.put((timestamp, arbitration_id, bytes(data), channel))
+
+    def rotate(self):
+        """Close the current segment and start a new one at the next frame."""
+        self._queue.put(_ROTATE)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.error is not None and not self._error_raised:
+            self._raise_error()
+
+    def _raise_error(self):
+        self._error_raised = True
+        raise RuntimeError(f"Log writer stopped: {self.error}") from self.error
+
+    def register_metrics(self, metrics):
+        metrics.counter("can_log_writer_frames_written_total", "Frames written to the log segments",
+                        func=lambda: self.frames_written)
+        metrics.gauge("can_log_writer_queue_depth", "Frames waiting for the log writer thread",
+                      func=self._queue.qsize)
+        metrics.counter("can_log_writer_segments_closed_total", "Log segments closed", func=lambda: len(self.manifests))
+        self._segment_close_seconds = metrics.histogram(
+            "can_log_writer_segment_close_seconds", "Time to flush and close a log segment with its manifest and index")
+
+    def _open_segment(self):
+        path = self.session_dir / f"segment_{self._segment_number:05d}{COMPRESSION_EXTENSIONS[self.compression]}"
+        self._segment_number += 1
+        self.current_segment_name = path.name
+        index_builder = self.index_builder_factory() if self.index_builder_factory is not None else None
+        return _Segment(path, self.compression, self.with_channel, index_builder)
+
+    def _close_segment(self, segment):
+        if segment is not None:
+            start = time.perf_counter()
+            self.manifests.append(segment.close(self.compression))
+            if self._segment_close_seconds is not None:
+                self._segment_close_seconds.observe(time.perf_counter() - start)
+        return None
+
+    def _segment_expired(self, segment):
+        return (segment.bytes_written >= self.max_segment_bytes or
+                time.monotonic() - segment.opened_at >= self.max_segment_seconds)
+
+    def _run(self):
+        try:
+            self._write_segments()
+        except Exception as e:
+            # The queue is no longer drained: the writer must stop taking frames
+            self.error = e
+
+    def _write_segments(self):
+        segment = None
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                # Idle bus: still honour the time-based rotation
+                if segment is not None and self._segment_expired(segment):
+                    segment = self._close_segment(segment)
+                continue
+
+            if item is _STOP:
+                self._close_segment(segment)
+                return
+            if item is _ROTATE:
+                segment = self._close_segment(segment)
+                continue
+
+            if segment is None:
+                segment = self._open_segment()
+            segment.write(*item)
+            self.frames_written += 1
+            if self._segment_expired(segment):
+                segment = self._close_segment(segment)
+
+
+def load_manifests(session_dir):
+    """Load every segment manifest of a capture session, ordered by segment."""
+    manifests = []
+    for manifest_file in sorted(Path(session_dir).glob(f"*{MANIFEST_SUFFIX}")):
+        with open(manifest_file, 'r') as f:
+            manifests.append(json.load(f))
+    return manifests
+
+
+def select_segments(session_dir, start_time=None, end_time=None, can_ids=None):
+    """
+    Return the segment paths of a session that may hold frames matching the query,
+    using only the manifests. Times are epoch seconds, `can_ids` an iterable of IDs.
+    """
+    session_dir = Path(session_dir)
+    wanted_ids = set(can_ids) if can_ids else None
+    selected = []
+    for manifest in load_manifests(session_dir):
+        if manifest["frame_count"] == 0:
+            continue
+        if start_time is not None and manifest["end_time"] < start_time:
+            continue
+        if end_time is not None and manifest["start_time"] > end_time:
+            continue
+        if wanted_ids is not None and wanted_ids.isdisjoint(manifest["can_ids"]):
+            continue
+        selected.append(session_dir / manifest["segment"])
+    return selected
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+
+METRICS_FORMATS = ("prometheus", "json")
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=None, func=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        # Optional callback giving the current value, read at export time only
+        self.func = func
+        self._value = 0
+
+    @property
+    def value(self):
+        return self.func() if self.func is not None else self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self._value += amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self._value = value
+
+
+class Histogram(_Metric):
+    """Histogram with fixed bucket bounds: one bisect and two additions per observation."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def value(self):
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return {
+            "buckets": {**{str(bound): c for bound, c in zip(self.buckets, cumulative)}, "+Inf": cumulative[-1]},
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process, exported as Prometheus text format or as a JSON snapshot.
+
+    Updates take no lock: each metric must be updated from a single thread, an
+    export running on another thread may then be at most one update behind.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=None, func=None):
+        return self._add(Counter(name, help_text, labels, func))
+
+    def gauge(self, name, help_text, labels=None, func=None):
+        return self._add(Gauge(name, help_text, labels, func))
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def prometheus_text(self):
+        lines = []
+        described = set()
+        for metric in self.metrics:
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                value = metric.value
+                for bound, count in value["buckets"].items():
+                    lines.append(f"{metric.name}_bucket{_format_labels({**metric.labels, 'le': bound})} {count}")
+                lines.append(f"{metric.name}_sum{_format_labels(metric.labels)} {value['sum']}")
+                lines.append(f"{metric.name}_count{_format_labels(metric.labels)} {value['count']}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        metrics = []
+        for metric in self.metrics:
+            entry = {"name": metric.name, "type": metric.kind, "value": metric.value}
+            if metric.labels:
+                entry["labels"] = metric.labels
+            metrics.append(entry)
+        return {"time": datetime.now().isoformat(timespec='seconds'), "metrics": metrics}
+
+    def write(self, path, file_format="prometheus"):
+        """Write the metrics to `path`, atomically so scrapers never read a partial file."""
+        path = Path(path)
+        tmp_file = path.with_name(path.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            if file_format == "json":
+                json.dump(self.snapshot(), f, indent=4)
+            else:
+                f.write(self.prometheus_text())
+        os.replace(tmp_file, path)
+
+
+def metrics_format_for(path, file_format=None):
+    """Return the export format of a metrics file: explicit, else from its suffix (.json or Prometheus text)."""
+    if file_format is not None:
+        if file_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format '{file_format}', expected one of {METRICS_FORMATS}")
+        return file_format
+    return "json" if str(path).endswith(".json") else "prometheus"
+
+
+class MetricsExporter:
+    """Rewrites the metrics file every `interval` seconds from a background thread, and once more on stop."""
+
+    def __init__(self, registry, path, file_format=None, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.file_format = metrics_format_for(path, file_format)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            self.registry.write(self.path, self.file_format)
+        except OSError as e:
+            print(f"Error writing the metrics to {self.path}: {e}", flush=True)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.export()
@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from utils.bus import open_bus
+
+
+def channel_configs(config):
+    """
+    Return one bus configuration per channel to capture.
+
+    `config['channels']` lists the channels as objects with a `name` and any of the
+    top-level bus keys (interface, channel, bitrate, baudrate) to override. When it
+    is empty, the single channel described by the top-level keys is captured.
+    """
+    channels = config.get('channels') or []
+    if not channels:
+        return [{**config, "name": config.get('name') or str(config['channel'])}]
+    configs = []
+    for i, channel in enumerate(channels):
+        channel_config = {**config, **channel}
+        channel_config['name'] = channel.get('name') or f"can{i}"
+        configs.append(channel_config)
+    return configs
+
+
+class _ChannelReceiver:
+    def __init__(self, name, bus, queue_size):
+        self.name = name
+        self.bus = bus
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.received = 0
+        self.dropped = 0
+        self.error_frames = 0
+        self.receive_errors = 0
+        # Latest timestamp received: this channel cannot produce anything older
+        self.watermark = float('-inf')
+        self.thread = None
+
+
+class MergedBus:
+    """
+    Receives from several CAN buses at once and returns their frames as one
+    time-ordered stream, each frame tagged with its channel name in `msg.channel`.
+
+    Every bus has its own receive thread and bounded queue (frames beyond
+    `queue_size` are dropped and counted). The queues are merged with a k-way
+    merge on the frame timestamps: a frame is released once every other channel
+    has received a frame at least as recent, or after `max_latency` seconds, so
+    a silent channel delays the stream by at most `max_latency`.
+
+    The object can be used in place of a single `can.Bus` (recv/shutdown).
+    """
+
+    def __init__(self, buses, max_latency=0.05, queue_size=100000):
+        self.max_latency = max_latency
+        self.receivers = [_ChannelReceiver(name, bus, queue_size) for name, bus in buses.items()]
+        self._heads = []  # (timestamp, sequence, receiver index, arrival time) of each non-empty queue head
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        for index, receiver in enumerate(self.receivers):
+            receiver.thread = threading.Thread(target=self._receive, args=(index,),
+                                               name=f"can-rx-{receiver.name}", daemon=True)
+            receiver.thread.start()
+
+    def _receive(self, index):
+        receiver = self.receivers[index]
+        while self._running:
+            try:
+                msg = receiver.bus.recv(0.1)
+            except Exception:
+                receiver.receive_errors += 1
+                time.sleep(0.1)
+                continue
+            if msg is None:
+                continue
+            msg.channel = receiver.name
+            with self._cond:
+                receiver.received += 1
+                if msg.is_error_frame:
+                    receiver.error_frames += 1
+                if msg.timestamp > receiver.watermark:
+                    receiver.watermark = msg.timestamp
+                if len(receiver.queue) >= receiver.queue_size:
+                    receiver.dropped += 1
+                    continue
+                arrival = time.monotonic()
+                receiver.queue.append((msg, arrival))
+                if len(receiver.queue) == 1:
+                    heapq.heappush(self._heads, (msg.timestamp, next(self._sequence), index, arrival))
+                self._cond.notify()
+
+    def _pop_ready(self, now):
+        # Called with the condition held. Returns (msg, None) when the oldest head can be
+        # released, otherwise (None, seconds until it is released whatever happens).
+        if not self._heads:
+            return None, None
+        timestamp, _, index, arrival = self._heads[0]
+        waited = now - arrival
+        if waited < self.max_latency:
+            for other_index, other in enumerate(self.receivers):
+                if other_index != index and other.watermark < timestamp:
+                    return None, self.max_latency - waited
+        heapq.heappop(self._heads)
+        receiver = self.receivers[index]
+        msg, _ = receiver.queue.popleft()
+        if receiver.queue:
+            next_msg, next_arrival = receiver.queue[0]
+            heapq.heappush(self._heads, (next_msg.timestamp, next(self._sequence), index, next_arrival))
+        return msg, None
+
+    def recv(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                msg, release_in = self._pop_ready(now)
+                if msg is not None:
+                    return msg
+                wait = release_in
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def channel_stats(self):
+        with self._cond:
+            return [{
+                "name": receiver.name,
+                "received": receiver.received,
+                "dropped": receiver.dropped,
+                "error_frames": receiver.error_frames,
+                "receive_errors": receiver.receive_errors,
+                "queued": len(receiver.queue),
+            } for receiver in self.receivers]
+
+    def register_metrics(self, metrics):
+        for receiver in self.receivers:
+            labels = {"channel": receiver.name}
+            metrics.counter("can_bus_frames_received_total", "Frames received on the channel", labels,
+                            func=lambda receiver=receiver: receiver.received)
+            metrics.counter("can_bus_frames_dropped_total", "Frames dropped because the channel queue was full", labels,
+                            func=lambda receiver=receiver: receiver.dropped)
+            metrics.counter("can_bus_error_frames_total", "Error frames received on the channel", labels,
+                            func=lambda receiver=receiver: receiver.error_frames)
+            metrics.counter("can_bus_receive_errors_total", "Receive errors of the channel interface", labels,
+                            func=lambda receiver=receiver: receiver.receive_errors)
+            metrics.gauge("can_bus_queue_depth", "Frames waiting in the channel queue for the merge", labels,
+                          func=lambda receiver=receiver: len(receiver.queue))
+
+    def shutdown(self):
+        self._running = False
+        for receiver in self.receivers:
+            receiver.thread.join()
+            receiver.bus.shutdown()
+
+
+def open_capture_bus(config):
+    """Open the bus to capture from: a MergedBus when several channels are configured."""
+    channels = channel_configs(config)
+    if len(channels) == 1:
+        return open_bus(channels[0])
+    buses = {}
+    try:
+        for channel in channels:
+            buses[channel['name']] = open_bus(channel)
+    except Exception:
+        # Do not leave the channels already opened behind
+        for bus in buses.values():
+            bus.shutdown()
+        raise
+    return MergedBus(buses, max_latency=config.get('merge_max_latency_ms', 50) / 1000)
@@ -0,0 +1,149 @@
+import json
+import os
+import pickle
+from collections import namedtuple
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+CACHE_DIR = REPO_ROOT / ".ftex_cache"
+INDEX_CACHE_FILE = CACHE_DIR / "protocol_index.pickle"
+INDEX_CACHE_VERSION = 2  # bumped when the shape of ProtocolIndex changes
+
+# Protocol JSON files of each device, with the node IDs the device answers on by default
+# (see the node ID section of the protocol readme)
+DEVICE_PROTOCOLS = {
+    "controller": {
+        "files": [
+            "FTEX_Controller_Public_CANOpen/FTEX_Controller_CANOpen_Protocol.json",
+            "FTEX_Controller_Internal_CANOpen/FTEX_Controller_Internal_CANOpen_Protocol.json",
+        ],
+        "node_ids": [0x01, 0x03],
+    },
+    "bms": {
+        "files": ["FTEX_Peripherals_CANOpen/FTEX_BMS_CANOpen/FTEX_BMS_CANOpen_Protocol.json"],
+        "node_ids": [0x05, 0x15],
+    },
+    "pas": {
+        "files": ["FTEX_Peripherals_CANOpen/FTEX_PAS_CANOpen_protocol.json"],
+        "node_ids": [0x10],
+    },
+}
+
+ProtocolParameter = namedtuple('ProtocolParameter', [
+    'name', 'device', 'co_id', 'index', 'subindex', 'type', 'access', 'definition'
+])
+
+
+def iter_protocol_parameters(data):
+    """Yield (co_id, index, parameter name, parameter definition) for every parameter of a protocol JSON."""
+    for key, value in data.items():
+        if key == "protocol" or not isinstance(value, dict):
+            continue
+        for co_id, co_id_data in value.items():
+            if not co_id.startswith("CO_ID_") or not isinstance(co_id_data, dict):
+                continue
+            index = int(co_id_data["CANOpen_Index"], 16)
+            for param_name, param_data in co_id_data.get("Parameters", {}).items():
+                yield co_id, index, param_name, param_data
+
+
+def _protocol_files_key(devices, repo_root):
+    key = [INDEX_CACHE_VERSION]
+    for device, device_protocol in sorted(devices.items()):
+        for file_name in device_protocol["files"]:
+            try:
+                stat = (Path(repo_root) / file_name).stat()
+                key.append((device, file_name, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                key.append((device, file_name, None, None))
+        key.append((device, tuple(device_protocol["node_ids"])))
+    return tuple(key)
+
+
+class ProtocolIndex:
+    """
+    Hashed lookups of the parameters of the FTEX protocol JSONs: by parameter name,
+    and by (node ID, index, subindex) since the peripherals reuse controller indexes.
+    A name may be defined by several devices: `parameter(name, device)` tells them apart.
+    """
+
+    def __init__(self, devices=None, repo_root=REPO_ROOT):
+        devices = DEVICE_PROTOCOLS if devices is None else devices
+        self.by_name = {}  # name -> [ProtocolParameter], one per device defining it
+        self.by_address = {}  # (device, index, subindex) -> ProtocolParameter
+        self.device_by_node = {}
+        for device, device_protocol in devices.items():
+            for node_id in device_protocol["node_ids"]:
+                self.device_by_node[node_id] = device
+            for file_name in device_protocol["files"]:
+                path = Path(repo_root) / file_name
+                if not path.exists():
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for co_id, index, param_name, param_data in iter_protocol_parameters(data):
+                    parameter = ProtocolParameter(
+                        name=param_name,
+                        device=device,
+                        co_id=co_id,
+                        index=index,
+                        subindex=int(param_data["Subindex"], 16),
+                        type=param_data.get("Type"),
+                        access=param_data.get("Access"),
+                        definition=param_data,
+                    )
+                    same_name = self.by_name.setdefault(param_name, [])
+                    same_name[:] = [other for other in same_name if other.device != device] + [parameter]
+                    self.by_address[(device, parameter.index, parameter.subindex)] = parameter
+
+    @classmethod
+    def load(cls, devices=None, repo_root=REPO_ROOT, cache_file=INDEX_CACHE_FILE):
+        """
+        Same index as ProtocolIndex(devices, repo_root), from an on-disk cache when
+        the protocol JSONs did not change since it was written (same sizes and
+        modification times). Loading the cache is several times faster than
+        parsing the JSONs, which matters to the short-lived command-line tools.
+        """
+        devices = DEVICE_PROTOCOLS if devices is None else devices
+        key = _protocol_files_key(devices, repo_root)
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_key, index = pickle.load(f)
+            if cached_key == key:
+                return index
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+            pass  # no cache yet, or written by an older version: rebuild it
+
+        index = cls(devices, repo_root)
+        try:
+            cache_file = Path(cache_file)
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((key, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass  # read-only checkout: work without the cache
+        return index
+
+    def parameter(self, name, device=None):
+        """
+        Return the parameter `name` (of `device`), or None. Raises ValueError when
+        no device is given and several devices define the name.
+        """
+        parameters = [parameter for parameter in self.by_name.get(name, ())
+                      if device is None or parameter.device == device]
+        if len(parameters) > 1:
+            devices = ", ".join(parameter.device for parameter in parameters)
+            raise ValueError(f"{name} is defined by several devices ({devices})")
+        return parameters[0] if parameters else None
+
+    def lookup(self, node_id, index, subindex):
+        """Return the parameter at (index, subindex) of the device answering on `node_id`, or None."""
+        device = self.device_by_node.get(node_id)
+        if device is None:
+            return None
+        return self.by_address.get((device, index, subindex))
+
+    def node_ids(self, device):
+        return [node_id for node_id, node_device in self.device_by_node.items() if node_device == device]
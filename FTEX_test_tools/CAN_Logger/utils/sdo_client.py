@@ -0,0 +1,106 @@
+import time
+from collections import deque
+
+import can
+
+from utils.canopen import FUNCTION_CODE_MASK, NODE_ID_MASK, SDO_REQUEST, SDO_RESPONSE, sdo_abort_code, sdo_address, sdo_expedited_payload
+
+SDO_UPLOAD_REQUEST = 0x40
+DEFAULT_READ_TIMEOUT = 0.5  # seconds
+DEFAULT_RETRIES = 2
+
+
+class SdoReadResult:
+    __slots__ = ('payload', 'abort_code', 'timed_out', 'latency')
+
+    def __init__(self, payload=None, abort_code=None, timed_out=False, latency=None):
+        self.payload = payload
+        self.abort_code = abort_code
+        self.timed_out = timed_out
+        self.latency = latency
+
+    @property
+    def ok(self):
+        return self.payload is not None
+
+
+class _NodeReads:
+    def __init__(self, addresses):
+        self.pending = deque(dict.fromkeys(addresses))  # drop duplicates, keep the order
+        self.in_flight = {}  # (index, subindex) -> (sent time, attempt)
+        self.results = {}
+        self.start = None
+        self.end = None
+
+    @property
+    def done(self):
+        return not self.pending and not self.in_flight
+
+
+def read_parameters(bus, reads, window=1, timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES):
+    """
+    Read SDO parameters (expedited uploads) from several nodes of one bus at once.
+
+    `reads` maps each node ID to its (index, subindex) addresses. Every node has up
+    to `window` requests in flight: a new request is sent as soon as a response
+    arrives, so the nodes are read in parallel and each one back-to-back, with no
+    per-request round trip wait on the bus. Responses are matched by node, index
+    and subindex. An unanswered request is sent again up to `retries` times.
+
+    Returns {node: {(index, subindex): SdoReadResult}} and {node: (start, end)}
+    monotonic times of the reads of each node.
+    """
+    nodes = {node: _NodeReads(addresses) for node, addresses in reads.items()}
+
+    def send_next(node, state, now):
+        while state.pending and len(state.in_flight) < window:
+            address = state.pending.popleft()
+            send(node, state, address, 0, now)
+
+    def send(node, state, address, attempt, now):
+        index, subindex = address
+        bus.send(can.Message(arbitration_id=SDO_REQUEST + node, is_extended_id=False,
+                             data=[SDO_UPLOAD_REQUEST, index & 0xFF, index >> 8, subindex, 0, 0, 0, 0]))
+        state.in_flight[address] = (now, attempt)
+
+    now = time.monotonic()
+    for node, state in nodes.items():
+        state.start = now
+        send_next(node, state, now)
+
+    active = {node: state for node, state in nodes.items() if not state.done}
+    for state in nodes.values():
+        if state.done:
+            state.end = now
+    while active:
+        msg = bus.recv(min(timeout, 0.05))
+        now = time.monotonic()
+        if msg is not None and (msg.arbitration_id & FUNCTION_CODE_MASK) == SDO_RESPONSE:
+            node = msg.arbitration_id & NODE_ID_MASK
+            state = active.get(node)
+            address = sdo_address(msg.data) if state is not None else None
+            if address is not None and address in state.in_flight:
+                sent, _ = state.in_flight.pop(address)
+                abort_code = sdo_abort_code(msg.data)
+                if abort_code is not None:
+                    state.results[address] = SdoReadResult(abort_code=abort_code, latency=now - sent)
+                else:
+                    state.results[address] = SdoReadResult(payload=sdo_expedited_payload(msg.data), latency=now - sent)
+                send_next(node, state, now)
+
+        for node, state in list(active.items()):
+            for address, (sent, attempt) in list(state.in_flight.items()):
+                if now - sent < timeout:
+                    continue
+                if attempt < retries:
+                    send(node, state, address, attempt + 1, now)
+                else:
+                    del state.in_flight[address]
+                    state.results[address] = SdoReadResult(timed_out=True)
+            send_next(node, state, now)
+            if state.done:
+                state.end = now
+                del active[node]
+
+    return ({node: state.results for node, state in nodes.items()},
+            {node: (state.start, state.end) for node, state in nodes.items()})
@@ -0,0 +1,179 @@
+from collections import OrderedDict, defaultdict, deque
+
+from utils.canopen import (
+    FUNCTION_CODE_MASK, NODE_ID_MASK, SDO_ABORT, SDO_FUNCTION_CODES, SDO_REQUEST, sdo_abort_code, sdo_address
+)
+from utils.timing_stats import LogHistogram
+
+DEFAULT_SDO_TIMEOUT = 0.5  # seconds
+RECENT_ABORTS = 100  # aborted transfers kept for reporting
+
+# Command specifiers (top 3 bits of the command byte) of the frames opening a transfer.
+# Segment frames do not carry the object address and are not paired.
+COMMAND_SPECIFIER_MASK = 0xE0
+INITIATE_REQUESTS = frozenset((0x20, 0x40))  # initiate download, initiate upload
+INITIATE_RESPONSES = frozenset((0x40, 0x60))  # initiate upload response, initiate download response
+
+# Standard SDO abort codes (CiA 301)
+SDO_ABORT_CODES = {
+    0x05030000: "Toggle bit not alternated",
+    0x05040000: "SDO protocol timed out",
+    0x05040001: "Client/server command specifier not valid or unknown",
+    0x06010000: "Unsupported access to an object",
+    0x06010001: "Attempt to read a write only object",
+    0x06010002: "Attempt to write a read only object",
+    0x06020000: "Object does not exist in the object dictionary",
+    0x06040041: "Object cannot be mapped to the PDO",
+    0x06060000: "Access failed due to a hardware error",
+    0x06070010: "Data type does not match, length of service parameter does not match",
+    0x06090011: "Sub-index does not exist",
+    0x06090030: "Invalid value for parameter",
+    0x06090031: "Value of parameter written too high",
+    0x06090032: "Value of parameter written too low",
+    0x08000000: "General error",
+    0x08000020: "Data cannot be transferred or stored to the application",
+    0x08000022: "Data cannot be transferred or stored to the application because of the present device state",
+}
+
+
+class SdoStats:
+    """Response latency distribution and failures of a set of SDO transfers."""
+
+    __slots__ = ('histogram', 'max_latency', 'timeouts', 'aborts')
+
+    def __init__(self):
+        self.histogram = LogHistogram()
+        self.max_latency = 0.0
+        self.timeouts = 0
+        self.aborts = defaultdict(int)  # abort code -> count
+
+    def add_latency(self, latency):
+        self.histogram.add(latency)
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    @property
+    def responses(self):
+        return self.histogram.count
+
+    def summary(self):
+        return {
+            "responses": self.responses,
+            "p50_ms": _ms(self.histogram.percentile(0.50)),
+            "p99_ms": _ms(self.histogram.percentile(0.99)),
+            "max_ms": _ms(self.max_latency) if self.responses else None,
+            "timeouts": self.timeouts,
+            "aborts": {f"{code:#010x}": count for code, count in sorted(self.aborts.items())},
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class SdoLatencyAnalyzer:
+    """
+    Pairs SDO requests (0x600 + node) with their responses (0x580 + node) by node,
+    index and subindex in a single streaming pass, and collects the response
+    latency per node and per parameter. Memory is bounded by the number of
+    requests waiting for a response.
+
+    Only initiate upload/download requests and responses, and aborts (command
+    0x80, counted with their abort code), are paired: the segments of a
+    segmented transfer are ignored. A request is counted as a timeout when no
+    response arrives within `timeout` seconds (frame time), or when the same
+    request is sent again before its response. A response arriving after the
+    timeout is counted as unmatched, not as a latency.
+    """
+
+    def __init__(self, timeout=DEFAULT_SDO_TIMEOUT, protocol_index=None):
+        self.timeout = timeout
+        self.protocol_index = protocol_index
+        self.outstanding = OrderedDict()  # (node, index, subindex) -> request timestamp, oldest first
+        self.per_node = defaultdict(SdoStats)
+        self.per_parameter = defaultdict(SdoStats)  # (node, index, subindex) -> stats
+        self.unmatched_responses = 0
+        self.recent_aborts = deque(maxlen=RECENT_ABORTS)  # (timestamp, node, index, subindex, abort code)
+        self._latency_histogram = None
+
+    def register_metrics(self, metrics):
+        self._latency_histogram = metrics.histogram("sdo_response_seconds", "SDO response latency seen on the bus")
+        metrics.counter("sdo_timeouts_total", "SDO requests without a response",
+                        func=lambda: sum(stats.timeouts for stats in list(self.per_node.values())))
+        metrics.counter("sdo_aborts_total", "SDO transfers aborted",
+                        func=lambda: sum(sum(stats.aborts.values()) for stats in list(self.per_node.values())))
+        metrics.gauge("sdo_pending_requests", "SDO requests waiting for a response", func=lambda: len(self.outstanding))
+
+    def add(self, timestamp, can_id, data):
+        self.expire(timestamp)
+        function_code = can_id & FUNCTION_CODE_MASK
+        if function_code not in SDO_FUNCTION_CODES:
+            return
+        address = sdo_address(data)
+        if address is None:
+            return
+        command = data[0]
+        opening = INITIATE_REQUESTS if function_code == SDO_REQUEST else INITIATE_RESPONSES
+        if command != SDO_ABORT and (command & COMMAND_SPECIFIER_MASK) not in opening:
+            return  # segment of a segmented transfer
+        key = (can_id & NODE_ID_MASK, address[0], address[1])
+
+        if function_code == SDO_REQUEST:
+            if command == SDO_ABORT:
+                # Client aborting its own transfer
+                self.outstanding.pop(key, None)
+            elif key in self.outstanding:
+                # Sent again before any response: the previous request timed out
+                del self.outstanding[key]
+                self._timeout(key)
+                self.outstanding[key] = timestamp
+            else:
+                self.outstanding[key] = timestamp
+        else:
+            request_time = self.outstanding.pop(key, None)
+            if request_time is None:
+                self.unmatched_responses += 1
+            else:
+                abort_code = sdo_abort_code(data)
+                if abort_code is not None or command == SDO_ABORT:
+                    abort_code = abort_code or 0
+                    self.per_node[key[0]].aborts[abort_code] += 1
+                    self.per_parameter[key].aborts[abort_code] += 1
+                    self.recent_aborts.append((timestamp, *key, abort_code))
+                else:
+                    latency = timestamp - request_time
+                    self.per_node[key[0]].add_latency(latency)
+                    self.per_parameter[key].add_latency(latency)
+                    if self._latency_histogram is not None:
+                        self._latency_histogram.observe(latency)
+
+    def expire(self, now):
+        """Count the requests older than the timeout as timed out."""
+        while self.outstanding:
+            key, request_time = next(iter(self.outstanding.items()))
+            if now - request_time < self.timeout:
+                break
+            del self.outstanding[key]
+            self._timeout(key)
+
+    def _timeout(self, key):
+        self.per_node[key[0]].timeouts += 1
+        self.per_parameter[key].timeouts += 1
+
+    def parameter_name(self, key):
+        if self.protocol_index is not None:
+            parameter = self.protocol_index.lookup(*key)
+            if parameter is not None:
+                return parameter.name
+        return f"{key[1]:#06x}:{key[2]:#04x}"
+
+    def report(self):
+        return {
+            "nodes": {f"{node:#04x}": stats.summary() for node, stats in sorted(self.per_node.items())},
+            "parameters": {
+                f"{key[0]:#04x} {self.parameter_name(key)}": stats.summary()
+                for key, stats in sorted(self.per_parameter.items())
+            },
+            "pending_requests": len(self.outstanding),
+            "unmatched_responses": self.unmatched_responses,
+        }
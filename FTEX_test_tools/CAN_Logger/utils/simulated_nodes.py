@@ -0,0 +1,70 @@
+import threading
+
+import can
+
+from utils.canopen import FUNCTION_CODE_MASK, NODE_ID_MASK, SDO_REQUEST, SDO_RESPONSE, TYPE_FORMATS
+
+# Expedited upload response command byte by data size
+UPLOAD_RESPONSE_COMMANDS = {1: 0x4F, 2: 0x4B, 3: 0x47, 4: 0x43}
+OBJECT_DOES_NOT_EXIST = 0x06020000
+
+
+def encode_upload_response(node_id, index, subindex, value, type_name):
+    size, signed = TYPE_FORMATS.get(type_name, (4, False))
+    data = bytes([UPLOAD_RESPONSE_COMMANDS[size], index & 0xFF, index >> 8, subindex])
+    data += int(value).to_bytes(size, byteorder='little', signed=signed) + bytes(4 - size)
+    return can.Message(arbitration_id=SDO_RESPONSE + node_id, data=data, is_extended_id=False)
+
+
+def encode_abort(node_id, index, subindex, abort_code):
+    data = bytes([0x80, index & 0xFF, index >> 8, subindex]) + abort_code.to_bytes(4, byteorder='little')
+    return can.Message(arbitration_id=SDO_RESPONSE + node_id, data=data, is_extended_id=False)
+
+
+class SimulatedSdoNodes:
+    """
+    SDO servers for any number of simulated nodes on one bus (typically a python-can
+    `virtual` bus), answering expedited uploads from pre-encoded responses.
+
+    `nodes` maps each node ID to {(index, subindex): (value, type)}. Unknown objects
+    are answered with an abort, like a real device.
+    """
+
+    def __init__(self, bus, nodes):
+        self.bus = bus
+        self.responses = {
+            (node_id, index, subindex): encode_upload_response(node_id, index, subindex, value, type_name)
+            for node_id, objects in nodes.items()
+            for (index, subindex), (value, type_name) in objects.items()
+        }
+        self.node_ids = set(nodes)
+        self.requests = 0
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="simulated-sdo-nodes", daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread.is_alive():
+            self._thread.join()
+        self.bus.shutdown()
+
+    def _run(self):
+        while self._running:
+            msg = self.bus.recv(0.1)
+            if msg is None or (msg.arbitration_id & FUNCTION_CODE_MASK) != SDO_REQUEST or len(msg.data) < 4:
+                continue
+            node_id = msg.arbitration_id & NODE_ID_MASK
+            if node_id not in self.node_ids or msg.data[0] != 0x40:
+                continue
+            self.requests += 1
+            index = msg.data[1] | (msg.data[2] << 8)
+            subindex = msg.data[3]
+            response = self.responses.get((node_id, index, subindex))
+            if response is None:
+                response = encode_abort(node_id, index, subindex, OBJECT_DOES_NOT_EXIST)
+            self.bus.send(response)
@@ -0,0 +1,197 @@
+import heapq
+import math
+
+from utils.canopen import FUNCTION_CODE_MASK, HEARTBEAT
+
+# Inter-arrival times are bucketed in microseconds with 5 significant bits:
+# exact below 32 us, then 16 buckets per power of two (<= 6.25% relative error),
+# up to 2^32 us (~71 minutes). Anything above lands in the last bucket.
+HISTOGRAM_SUB_BITS = 5
+HISTOGRAM_SUB_BUCKETS = 1 << HISTOGRAM_SUB_BITS
+HISTOGRAM_MAX_BITS = 32
+HISTOGRAM_BUCKETS = (HISTOGRAM_MAX_BITS - HISTOGRAM_SUB_BITS) * (HISTOGRAM_SUB_BUCKETS // 2) + HISTOGRAM_SUB_BUCKETS
+HEARTBEAT_PERIOD_REQUIREMENT = 0.050  # seconds, see the protocol readme (HMI and BMS section)
+
+
+class LogHistogram:
+    """Fixed-memory, log-bucketed histogram of durations in seconds."""
+
+    __slots__ = ('buckets', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+
+    @staticmethod
+    def bucket_index(seconds: float) -> int:
+        us = int(seconds * 1_000_000)
+        if us < HISTOGRAM_SUB_BUCKETS:
+            return max(us, 0)
+        shift = us.bit_length() - HISTOGRAM_SUB_BITS
+        index = shift * (HISTOGRAM_SUB_BUCKETS // 2) + (us >> shift)
+        return min(index, HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def bucket_bounds(index: int):
+        """Lower and upper bound, in seconds, of the durations counted in a bucket."""
+        if index < HISTOGRAM_SUB_BUCKETS:
+            return index / 1_000_000, (index + 1) / 1_000_000
+        half = HISTOGRAM_SUB_BUCKETS // 2
+        shift = (index - half) // half
+        mantissa = index - shift * half
+        return (mantissa << shift) / 1_000_000, ((mantissa + 1) << shift) / 1_000_000
+
+    def add(self, seconds: float):
+        self.buckets[self.bucket_index(seconds)] += 1
+        self.count += 1
+
+    def percentile(self, fraction: float):
+        """Return the estimated duration at `fraction` (0..1), or None when empty."""
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                low, high = self.bucket_bounds(index)
+                return (low + high) / 2
+        return None
+
+
+class IdTimingStats:
+    """Streaming timing statistics of the frames of one CAN ID."""
+
+    __slots__ = ('count', 'first_timestamp', 'last_timestamp', 'min_period', 'max_period',
+                 '_mean_period', '_m2_period', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.min_period = float('inf')
+        self.max_period = 0.0
+        self._mean_period = 0.0
+        self._m2_period = 0.0
+        self.histogram = LogHistogram()
+
+    def add(self, timestamp: float):
+        self.count += 1
+        if self.last_timestamp is None:
+            self.first_timestamp = timestamp
+        else:
+            period = timestamp - self.last_timestamp
+            if period < self.min_period:
+                self.min_period = period
+            if period > self.max_period:
+                self.max_period = period
+            # Welford's online mean/variance of the period
+            n = self.histogram.count + 1
+            delta = period - self._mean_period
+            self._mean_period += delta / n
+            self._m2_period += delta * (period - self._mean_period)
+            self.histogram.add(period)
+        self.last_timestamp = timestamp
+
+    @property
+    def rate(self) -> float:
+        """Average frames per second over the observed time span."""
+        if self.count < 2 or self.last_timestamp == self.first_timestamp:
+            return 0.0
+        return (self.count - 1) / (self.last_timestamp - self.first_timestamp)
+
+    @property
+    def mean_period(self):
+        return self._mean_period if self.histogram.count else None
+
+    @property
+    def jitter(self):
+        """Standard deviation of the period, in seconds."""
+        if self.histogram.count < 2:
+            return None
+        return math.sqrt(self._m2_period / (self.histogram.count - 1))
+
+    @property
+    def p50_period(self):
+        return self.histogram.percentile(0.50)
+
+    @property
+    def p99_period(self):
+        return self.histogram.percentile(0.99)
+
+
+class TimingStats:
+    """
+    Per-ID timing statistics driven by the frame timestamps reported by the interface.
+
+    The `top_k` busiest IDs are kept in a min-heap updated on every frame, so
+    displaying them never requires sorting all the IDs seen so far.
+    """
+
+    def __init__(self, top_k=3):
+        self.top_k = top_k
+        self.per_id = {}
+        self.msg_count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.min_gap = float('inf')
+        self.max_gap = 0.0
+        self._top_heap = []  # [count, can_id] entries, smallest count first
+        self._top_entries = {}
+
+    def add(self, timestamp: float, can_id: int):
+        if self.last_timestamp is not None:
+            gap = timestamp - self.last_timestamp
+            if gap > self.max_gap:
+                self.max_gap = gap
+            if gap < self.min_gap:
+                self.min_gap = gap
+        else:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        self.msg_count += 1
+
+        stats = self.per_id.get(can_id)
+        if stats is None:
+            stats = self.per_id[can_id] = IdTimingStats()
+        stats.add(timestamp)
+        self._update_top(can_id, stats.count)
+
+    def _update_top(self, can_id, count):
+        entry = self._top_entries.get(can_id)
+        if entry is not None:
+            entry[0] = count
+            heapq.heapify(self._top_heap)  # top_k entries at most
+        elif len(self._top_heap) < self.top_k:
+            entry = [count, can_id]
+            self._top_entries[can_id] = entry
+            heapq.heappush(self._top_heap, entry)
+        elif count > self._top_heap[0][0]:
+            # Counts only grow, so an ID enters the top-K by overtaking its smallest member
+            entry = [count, can_id]
+            evicted = heapq.heapreplace(self._top_heap, entry)
+            del self._top_entries[evicted[1]]
+            self._top_entries[can_id] = entry
+
+    def top_ids(self):
+        """Return the busiest IDs as (can_id, count) pairs, busiest first."""
+        return [(can_id, count) for count, can_id in sorted(self._top_heap, reverse=True)]
+
+    @property
+    def rate(self) -> float:
+        if self.msg_count < 2 or self.last_timestamp == self.first_timestamp:
+            return 0.0
+        return (self.msg_count - 1) / (self.last_timestamp - self.first_timestamp)
+
+    def heartbeats(self):
+        """Return the (node_id, stats) pairs of the heartbeat producers seen on the bus."""
+        return [(can_id - HEARTBEAT, stats)
+                for can_id, stats in sorted(self.per_id.items())
+                if can_id & FUNCTION_CODE_MASK == HEARTBEAT]
+
+    @staticmethod
+    def meets_heartbeat_requirement(stats, requirement=HEARTBEAT_PERIOD_REQUIREMENT):
+        """True when the heartbeat max period is within the requirement, None before two heartbeats."""
+        if stats.histogram.count == 0:
+            return None
+        return stats.max_period <= requirement
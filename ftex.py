@@ -0,0 +1,90 @@
+"""
+ftex: single entry point of the FTEX protocol tools.
+
+    ftex validate SCHEMA PATH...     FTEX_Schema_validator.py
+    ftex log [--headless ...]        CAN_Logger/can_logger.py
+    ftex emulate [--model ...]       BMS_Emulator/bms_emulator.py
+    ftex replay CAPTURE [...]        CAN_Logger/replay_capture.py
+    ftex analyze latency|query|export|audit|live ...
+
+The arguments after the subcommand are passed to the tool as they are. This module
+only imports the standard library needed to pick the subcommand: the tool, and its
+dependencies (python-can, curses, jsonschema, NumPy, ...), are imported once chosen,
+so `ftex --help` and `ftex validate` start fast.
+"""
+import argparse
+import importlib
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+TOOLS_DIR = REPO_ROOT / "FTEX_test_tools"
+CACHE_DIR = REPO_ROOT / ".ftex_cache"
+SCHEMA_VALIDATION_CACHE = CACHE_DIR / "schema_validation.json"
+
+# Modules this entry point must not import before a subcommand needs them (checked by tests/test_ftex_cli.py)
+HEAVY_MODULES = ("can", "curses", "jsonschema", "numpy", "pyarrow")
+# Start time budgets, in ms on top of the start of a bare interpreter (checked by the tests and the benchmarks)
+STARTUP_BUDGETS = {"help": 50.0, "validate": 100.0}
+
+# Subcommand -> (directory of the tool, module, description)
+COMMANDS = {
+    "validate": (REPO_ROOT, "FTEX_Schema_validator", "Validate protocol JSONs, test datasets and featuresets"),
+    "log": (TOOLS_DIR / "CAN_Logger", "can_logger", "Capture the CAN traffic (interactive, or --headless)"),
+    "emulate": (TOOLS_DIR / "BMS_Emulator", "bms_emulator", "Emulate a BMS (or two) on the CAN bus"),
+    "replay": (TOOLS_DIR / "CAN_Logger", "replay_capture", "Replay a capture on a CAN bus"),
+    "analyze": (None, None, "Analyze captures and devices: latency, query, export, audit or live"),
+}
+ANALYZE_COMMANDS = {
+    "latency": (TOOLS_DIR / "CAN_Logger", "sdo_latency", "SDO response latency, timeouts and aborts"),
+    "query": (TOOLS_DIR / "CAN_Logger", "query_capture", "Find frames in a capture by time, CAN ID or parameter"),
+    "export": (TOOLS_DIR / "CAN_Logger", "export_capture", "Export a capture to Parquet/Arrow"),
+    "audit": (TOOLS_DIR / "CAN_Logger", "audit_fleet", "Audit the configuration of controllers against a golden set"),
+    "live": (TOOLS_DIR / "CAN_Logger", "live_values", "Latest parameter values published by a headless capture"),
+}
+
+
+def command_parser(prog, commands, description):
+    epilog = "commands:\n" + "\n".join(f"  {name:<10} {help_text}" for name, (_, _, help_text) in commands.items())
+    parser = argparse.ArgumentParser(prog=prog, description=description, epilog=epilog,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=list(commands), metavar='command', help='Tool to run (see below)')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments of the tool (see ftex <command> --help)')
+    return parser
+
+
+def run_tool(prog, directory, module_name, args):
+    if not directory.is_dir():
+        print(f"{directory} not found: install ftex from a checkout of the repository (pip install -e .)")
+        return 1
+    sys.path.insert(0, str(directory))
+    sys.argv = [prog, *args]
+    module = importlib.import_module(module_name)
+    try:
+        result = module.main()
+    except KeyboardInterrupt:
+        return 130
+    return result if isinstance(result, int) else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = command_parser('ftex', COMMANDS, 'FTEX CANopen protocol tools.').parse_args(argv)
+    prog = f"ftex {args.command}"
+    tool_args = args.args
+
+    if args.command == "analyze":
+        args = command_parser(prog, ANALYZE_COMMANDS, 'Analyze captures and devices.').parse_args(tool_args)
+        prog = f"{prog} {args.command}"
+        directory, module_name, _ = ANALYZE_COMMANDS[args.command]
+        return run_tool(prog, directory, module_name, args.args)
+
+    if args.command == "validate" and '--cache' not in tool_args:
+        # Files that did not change since they last passed skip the JSON Schema validation
+        tool_args = [*tool_args, '--cache', str(SCHEMA_VALIDATION_CACHE)]
+    directory, module_name, _ = COMMANDS[args.command]
+    return run_tool(prog, directory, module_name, tool_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
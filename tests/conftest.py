@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# The tools import their helpers as `utils.*`, from the tool directory
+sys.path.insert(0, str(REPO_ROOT / "FTEX_test_tools" / "CAN_Logger"))
+# The BMS emulator modules are imported through their package path (BMS_Emulator.*)
+sys.path.append(str(REPO_ROOT / "FTEX_test_tools"))
@@ -0,0 +1,185 @@
+import json
+import threading
+
+import can
+import pytest
+
+from conftest import REPO_ROOT
+
+pytest.importorskip("serial")
+import BMS_Emulator.bms_emulator as bms_emulator  # noqa: E402
+from BMS_Emulator.utils.sdo_response_table import SdoResponseTable  # noqa: E402
+
+EMULATOR_DIR = REPO_ROOT / "FTEX_test_tools" / "BMS_Emulator"
+NODE_ID = 0x05
+
+
+@pytest.fixture(scope="module")
+def object_dict():
+    return bms_emulator.parse_eds_to_dic(str(EMULATOR_DIR / "bms.eds"))
+
+
+@pytest.fixture
+def pack_values():
+    with open(EMULATOR_DIR / "bms_values.json", 'r') as f:
+        return json.load(f)
+
+
+def payload(msg):
+    return bytes(msg.data[4:8])
+
+
+def test_response_table_encodes_each_type(object_dict, pack_values):
+    table = SdoResponseTable(NODE_ID, object_dict)
+    assert table.response(0x0030, 0x00) is None  # not set yet
+    table.update({**pack_values, "CO_PARAM_EXTERNAL_BMS_TEMPERATURE": -10})
+
+    soc = table.response(0x0030, 0x00)
+    assert soc.arbitration_id == 0x585
+    assert bytes(soc.data[:4]) == bytes([0x4F, 0x30, 0x00, 0x00])
+    assert payload(soc) == bytes([85, 0, 0, 0])
+    temperature = table.response(0x0020, 0x01)
+    assert temperature.data[0] == 0x4B
+    assert payload(temperature) == (-10).to_bytes(2, 'little', signed=True) + bytes(2)
+    model_number = table.response(0x0040, 0x03)
+    assert model_number.data[0] == 0x43
+    assert int.from_bytes(payload(model_number), 'little') == 456789
+
+
+def test_response_table_saturates_and_rejects_unknown_parameters(object_dict):
+    table = SdoResponseTable(NODE_ID, object_dict)
+    table.set("CO_PARAM_EXTERNAL_BMS_SOC", 300)
+    assert payload(table.response(0x0030, 0x00))[0] == 0xFF
+    table.set("CO_PARAM_EXTERNAL_BMS_TEMPERATURE", -40000)
+    assert payload(table.response(0x0020, 0x01))[:2] == (-32768).to_bytes(2, 'little', signed=True)
+    assert table.set("CO_PARAM_UNKNOWN", 1) is False
+    assert table.response(0x7000, 0x00) is None
+
+
+def test_response_frames_are_replaced_not_modified(object_dict):
+    table = SdoResponseTable(NODE_ID, object_dict)
+    table.set("CO_PARAM_EXTERNAL_BMS_SOC", 50)
+    before = table.response(0x0030, 0x00).data
+    table.set("CO_PARAM_EXTERNAL_BMS_SOC", 51)
+    assert payload(table.response(0x0030, 0x00))[0] == 51
+    assert before[4] == 50
+
+
+def test_emulator_answers_reads_on_a_virtual_bus(object_dict, pack_values, monkeypatch):
+    monkeypatch.setattr(bms_emulator, "VERBOSE", False)
+    tables, publish = bms_emulator.create_response_tables(object_dict, [pack_values])
+    stop = threading.Event()
+    emulator_bus = can.Bus(interface='virtual', channel="bms_emulator_test")
+
+    def serve():
+        while not stop.is_set():
+            msg = emulator_bus.recv(0.05)
+            if msg is not None:
+                bms_emulator.parse_sdo_request(emulator_bus, msg, tables)
+
+    server = threading.Thread(target=serve)
+    server.start()
+    try:
+        with can.Bus(interface='virtual', channel="bms_emulator_test") as client:
+            def read(index, subindex, node_id=NODE_ID):
+                client.send(can.Message(arbitration_id=0x600 + node_id, is_extended_id=False,
+                                        data=[0x40, index & 0xFF, index >> 8, subindex, 0, 0, 0, 0]))
+                return client.recv(1.0)
+
+            assert payload(read(0x0030, 0x01))[:2] == (4500).to_bytes(2, 'little')
+            publish(0, {"CO_PARAM_EXTERNAL_BMS_VOLTAGE": 4321})
+            assert payload(read(0x0030, 0x01))[:2] == (4321).to_bytes(2, 'little')
+            abort = read(0x7000, 0x00)
+            assert abort.data[0] == 0x80 and bytes(abort.data[1:4]) == bytes([0x00, 0x70, 0x00])
+            assert read(0x0030, 0x00, node_id=0x06) is None  # another node
+    finally:
+        stop.set()
+        server.join()
+        emulator_bus.shutdown()
+
+
+class TestEquivalentCircuitModel:
+    @pytest.fixture(autouse=True)
+    def numpy(self):
+        pytest.importorskip("numpy")
+
+    def model(self, values, **kwargs):
+        from BMS_Emulator.utils.battery_model import EquivalentCircuitModel
+        return EquivalentCircuitModel(values, **kwargs)
+
+    def test_initial_state(self, pack_values):
+        from BMS_Emulator.utils.battery_model import STATE_DISCHARGING
+        values = self.model(pack_values).values()
+        assert values["CO_PARAM_EXTERNAL_BMS_SOC"] == 85
+        assert values["CO_PARAM_EXTERNAL_BMS_ERROR_STATE"] == 0
+        assert values["CO_PARAM_EXTERNAL_BMS_STATE"] == STATE_DISCHARGING
+        assert values["CO_PARAM_EXTERNAL_BMS_VOLTAGE"] == 6850  # open circuit, 85% between 6000 and 7000 cV
+
+    def test_inconsistent_soc_is_rejected(self, pack_values):
+        with pytest.raises(ValueError):
+            self.model({**pack_values, "CO_PARAM_EXTERNAL_BMS_SOC": 50})
+
+    def test_discharge_and_charge(self, pack_values):
+        from BMS_Emulator.utils.battery_model import STATE_CHARGING, STATE_DISCHARGING
+        model = self.model(pack_values)
+        for _ in range(60):
+            model.step(60.0, 5000.0)  # 5 A for an hour
+        values = model.values()
+        # About 68 V * 5 A for an hour
+        assert 3400 - 350 < values["CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY"] < 3400 - 320
+        assert values["CO_PARAM_EXTERNAL_BMS_CURRENT"] == 5000
+        assert values["CO_PARAM_EXTERNAL_BMS_VOLTAGE"] < 6850
+        assert values["CO_PARAM_EXTERNAL_BMS_TEMPERATURE"] >= 25
+        assert values["CO_PARAM_EXTERNAL_BMS_STATE"] == STATE_DISCHARGING
+        model.step(60.0, -2000.0)
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_STATE"] == STATE_CHARGING
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_ERROR_STATE"] == 0
+
+    def test_error_flags(self, pack_values):
+        from BMS_Emulator.utils.battery_model import (
+            CHARGE_OVERCURRENT_ERROR, DISCHARGE_OVERCURRENT_ERROR, OVERTEMPERATURE_ERROR, STATE_ERROR,
+            UNDERTEMPERATURE_ERROR, UNDERVOLTAGE_ERROR
+        )
+        model = self.model(pack_values, pack_count=3)
+        model.step(1.0, [6000.0, -7000.0, 1000.0])  # limits: 5500 mA discharge, 6000 mA charge
+        assert model.error_state.tolist() == [DISCHARGE_OVERCURRENT_ERROR, CHARGE_OVERCURRENT_ERROR, 0]
+        assert model.state[:2].tolist() == [STATE_ERROR, STATE_ERROR]
+
+        model.temperature[:] = [70.0, -30.0, 25.0]
+        model.voltage[2] = 3000.0
+        model.current[:] = 0.0
+        model.update_state()
+        assert model.error_state.tolist() == [OVERTEMPERATURE_ERROR, UNDERTEMPERATURE_ERROR, UNDERVOLTAGE_ERROR]
+        assert (model.state == STATE_ERROR).all()
+
+    def test_empty_pack_cuts_the_discharge(self, pack_values):
+        from BMS_Emulator.utils.battery_model import STATE_FULLY_DISCHARGED
+        model = self.model({**pack_values, "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": 1,
+                            "CO_PARAM_EXTERNAL_BMS_SOC": 0})
+        model.step(3600.0, 5000.0)
+        assert model.remaining_wh[0] == 0.0
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_STATE"] == STATE_FULLY_DISCHARGED
+        model.step(1.0, 5000.0)
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_CURRENT"] == 0
+
+    def test_full_pack_stops_charging(self, pack_values):
+        from BMS_Emulator.utils.battery_model import STATE_FULLY_CHARGED
+        model = self.model({**pack_values, "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": 4000,
+                            "CO_PARAM_EXTERNAL_BMS_SOC": 100})
+        model.step(1.0, -2000.0)
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_CURRENT"] == 0
+        assert model.values()["CO_PARAM_EXTERNAL_BMS_STATE"] == STATE_FULLY_CHARGED
+
+    def test_cycle_counted_each_time_the_soc_goes_below_the_threshold(self, pack_values):
+        model = self.model({**pack_values, "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": 3900,
+                            "CO_PARAM_EXTERNAL_BMS_SOC": 98})
+        cycles = pack_values["CO_PARAM_EXTERNAL_BMS_CYCLE_COUNT"]
+        for expected in (cycles + 1, cycles + 2):
+            while model.soc[0] >= 94.0:
+                model.step(60.0, 5000.0)
+            for _ in range(10):
+                model.step(60.0, 5000.0)  # staying below the threshold is still the same cycle
+            assert model.values()["CO_PARAM_EXTERNAL_BMS_CYCLE_COUNT"] == expected
+            while model.soc[0] < 97.0:
+                model.step(60.0, -5000.0)
+            assert model.values()["CO_PARAM_EXTERNAL_BMS_CYCLE_COUNT"] == expected
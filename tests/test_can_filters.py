@@ -0,0 +1,82 @@
+import can
+import pytest
+
+from utils.can_filters import (
+    build_can_filters, compile_obj_dir_filter, parse_obj_dir_entry, upgrade_obj_dir_filter
+)
+
+
+def sdo_frame(can_id, index, subindex, command=0x40):
+    return can.Message(arbitration_id=can_id, is_extended_id=False,
+                       data=bytes([command, index & 0xFF, index >> 8, subindex, 0, 0, 0, 0]))
+
+
+def test_no_can_id_receives_everything():
+    assert build_can_filters([]) is None
+    assert build_can_filters(None) is None
+
+
+def test_aligned_block_of_ids_is_merged():
+    assert build_can_filters(range(0x580, 0x588)) == [{"can_id": 0x580, "can_mask": 0x7F8, "extended": False}]
+
+
+def test_unaligned_ids_are_kept_apart():
+    filters = build_can_filters([0x581, 0x582, 0x701])
+    assert filters == [
+        {"can_id": 0x581, "can_mask": 0x7FF, "extended": False},
+        {"can_id": 0x582, "can_mask": 0x7FF, "extended": False},
+        {"can_id": 0x701, "can_mask": 0x7FF, "extended": False},
+    ]
+
+
+def test_merged_filters_match_exactly_the_given_ids():
+    can_ids = {0x181, 0x585, 0x605, 0x700, 0x701, 0x702, 0x703, 0x704}
+    filters = build_can_filters(can_ids)
+    assert len(filters) < len(can_ids)
+    matched = {can_id for can_id in range(0x800)
+               if any(can_id & f["can_mask"] == f["can_id"] & f["can_mask"] for f in filters)}
+    assert matched == can_ids
+
+
+def test_empty_obj_dir_filter_matches_everything():
+    assert compile_obj_dir_filter([]) is None
+    assert compile_obj_dir_filter("") is None
+
+
+def test_index_entry_matches_every_subindex():
+    matches = compile_obj_dir_filter(["2000"])
+    assert matches(sdo_frame(0x605, 0x2000, 0x00))
+    assert matches(sdo_frame(0x585, 0x2000, 0x7F, command=0x4B))
+    assert not matches(sdo_frame(0x605, 0x2001, 0x00))
+
+
+def test_address_entry_matches_its_subindex_only():
+    matches = compile_obj_dir_filter(["2000:01", "0x2010:0a"])
+    assert matches(sdo_frame(0x605, 0x2000, 0x01))
+    assert matches(sdo_frame(0x605, 0x2010, 0x0A))
+    assert not matches(sdo_frame(0x605, 0x2000, 0x02))
+    assert not matches(sdo_frame(0x605, 0x0120, 0x00))
+
+
+def test_non_sdo_and_short_frames_are_rejected():
+    matches = compile_obj_dir_filter(["2000"])
+    assert not matches(sdo_frame(0x705, 0x2000, 0x00))
+    assert not matches(sdo_frame(0x185, 0x2000, 0x00))
+    assert not matches(can.Message(arbitration_id=0x605, is_extended_id=False, data=bytes([0x40, 0x00, 0x20])))
+
+
+def test_integer_entries_keep_their_previous_meaning():
+    # Saved by earlier versions: the address bytes of the frame, little endian
+    assert parse_obj_dir_entry(0x012000) == (0x2000, 0x01)
+    assert parse_obj_dir_entry(0x2000) == (0x2000, 0x00)
+    matches = compile_obj_dir_filter([0x012000])
+    assert matches(sdo_frame(0x605, 0x2000, 0x01))
+    assert not matches(sdo_frame(0x605, 0x2000, 0x00))
+    assert not matches(sdo_frame(0x605, 0x0120, 0x00))
+    assert upgrade_obj_dir_filter([0x012000, "2001"]) == (["2000:01", "2001"], [(0x012000, "2000:01")])
+
+
+@pytest.mark.parametrize("entry", [0x1000000, -1, "", "12345", "2000:100", "2000:", "index", 1.5, True])
+def test_invalid_entries_are_rejected(entry):
+    with pytest.raises(ValueError):
+        compile_obj_dir_filter([entry])
@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from utils.capture_index import SegmentIndexBuilder, index_path_for, query_capture
+from utils.capture_reader import capture_segments
+from utils.log_segments import SegmentedLogWriter
+from utils.protocol_index import ProtocolIndex
+
+CAN_LOGGER_DIR = Path(__file__).resolve().parents[1] / "FTEX_test_tools" / "CAN_Logger"
+SOC = "CO_PARAM_EXTERNAL_BMS_SOC"
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    """
+    Session of 3 frames per 10 ms step, over several indexed segments: an upload of
+    the BMS SOC (0x605/0x585), and a heartbeat (0x705).
+    """
+    session_dir = tmp_path_factory.mktemp("session")
+    soc = ProtocolIndex.load().parameter(SOC)
+    address = [soc.index & 0xFF, soc.index >> 8, soc.subindex]
+    start = round(time.time()) - 60
+    log_writer = SegmentedLogWriter(session_dir, compression="gzip", max_segment_bytes=4 * 1024,
+                                    index_builder_factory=SegmentIndexBuilder)
+    for step in range(300):
+        timestamp = start + step * 0.01
+        log_writer.write(timestamp, 0x605, bytes([0x40, *address, 0, 0, 0, 0]))
+        log_writer.write(timestamp + 0.002, 0x585, bytes([0x4F, *address, step % 100, 0, 0, 0]))
+        log_writer.write(timestamp + 0.004, 0x705, bytes([0x05]))
+    log_writer.close()
+    return session_dir, start
+
+
+def test_session_is_indexed(session):
+    session_dir, _ = session
+    segments = capture_segments(session_dir)
+    assert len(segments) > 1
+    assert all(index_path_for(segment.path).exists() for segment in segments)
+
+
+def test_query_by_can_id(session):
+    session_dir, _ = session
+    frames = list(query_capture(session_dir, can_ids=[0x705]))
+    assert len(frames) == 300 and {frame.can_id for frame in frames} == {0x705}
+
+
+def test_query_by_time_range(session):
+    session_dir, start = session
+    frames = list(query_capture(session_dir, start_time=start + 1.0 - 0.0005, end_time=start + 1.5 + 0.0005))
+    assert frames[0].can_id == 0x605 and frames[-1].can_id == 0x605
+    assert len(frames) == 50 * 3 + 1
+    assert all(start + 0.999 <= frame.timestamp <= start + 1.501 for frame in frames)
+
+
+def test_query_by_parameter_and_time(session):
+    session_dir, start = session
+    soc = ProtocolIndex.load().parameter(SOC, "bms")
+    frames = list(query_capture(session_dir, can_ids=[0x585], sdo=(soc.index, soc.subindex),
+                                start_time=start + 2.0 - 0.0005))
+    assert [frame.data[4] for frame in frames] == list(range(100))
+
+
+def test_cli_query_by_parameter_name(session):
+    session_dir, _ = session
+    process = subprocess.run([sys.executable, "query_capture.py", str(session_dir), "--param", SOC],
+                             capture_output=True, text=True, cwd=CAN_LOGGER_DIR)
+    assert process.returncode == 0, process.stderr
+    lines = process.stdout.splitlines()[1:]
+    assert len(lines) == 600  # requests and responses of the BMS nodes
+    assert {line.split(",")[1] for line in lines} == {"0x605", "0x585"}
+
+
+def test_unindexed_segments_are_scanned(session, tmp_path):
+    session_dir, _ = session
+    indexed = [(frame.timestamp, frame.can_id) for frame in query_capture(session_dir, can_ids=[0x585])]
+    copy = tmp_path / "copy"
+    copy.mkdir()
+    for path in session_dir.iterdir():
+        if path.suffix == ".gz" or path.name.endswith(".json"):
+            (copy / path.name).write_bytes(path.read_bytes())
+    assert not any(index_path_for(segment.path).exists() for segment in capture_segments(copy))
+    assert [(frame.timestamp, frame.can_id) for frame in query_capture(copy, can_ids=[0x585])] == indexed
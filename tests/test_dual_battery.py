@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from conftest import REPO_ROOT
+
+pytest.importorskip("serial")
+from BMS_Emulator.bms_emulator import SECOND_NODE_ID, create_response_tables, parse_eds_to_dic  # noqa: E402
+from BMS_Emulator.utils.dual_battery import AGGREGATION, VALID_RANGES  # noqa: E402
+
+EMULATOR_DIR = REPO_ROOT / "FTEX_test_tools" / "BMS_Emulator"
+BMS_PROTOCOL = REPO_ROOT / "FTEX_Peripherals_CANOpen" / "FTEX_BMS_CANOpen" / "FTEX_BMS_CANOpen_Protocol.json"
+MAIN_NODE_ID = 0x05
+
+
+@pytest.fixture
+def dual_tables(capsys):
+    object_dict = parse_eds_to_dic(str(EMULATOR_DIR / "bms.eds"))
+    capsys.readouterr()
+    with open(EMULATOR_DIR / "bms_values.json", 'r') as f:
+        main_pack = json.load(f)
+    second_pack = {**main_pack,
+                   "CO_PARAM_EXTERNAL_BMS_SOC": 50,
+                   "CO_PARAM_EXTERNAL_BMS_CURRENT": 60000,
+                   "CO_PARAM_EXTERNAL_BMS_MAXIMUM_CAPACITY": 2000,
+                   "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": 1000,
+                   "CO_PARAM_EXTERNAL_BMS_FULL_VOLTAGE": 6800}
+    tables, publish = create_response_tables(object_dict, [main_pack, second_pack])
+    return tables, publish
+
+
+def reported(table, index, subindex, signed=False):
+    data = table.response(index, subindex).data
+    return int.from_bytes(data[4:8], byteorder='little', signed=signed)
+
+
+def test_main_node_reports_both_packs(dual_tables):
+    tables, _ = dual_tables
+    main = tables[MAIN_NODE_ID]
+    # Capacities: 4000 + 2000 Wh, clamped to the 5000 Wh of the Valid_Range
+    assert reported(main, 0x50, 0x08) == 5000
+    assert reported(main, 0x50, 0x09) == 4400
+    # SOC weighted by the actual capacities: (85 * 4000 + 50 * 2000) / 6000
+    assert reported(main, 0x30, 0x00) == 73
+    # Current: 50 A + 60 A, clamped to the 100 A of the Valid_Range
+    assert reported(main, 0x30, 0x02, signed=True) == 100000
+    assert reported(main, 0x50, 0x00) == 11000
+    assert reported(main, 0x50, 0x04) == 6800
+    # Values of the main pack only
+    assert reported(main, 0x30, 0x01) == 4500
+
+    second = tables[SECOND_NODE_ID]
+    assert reported(second, 0x50, 0x08) == 2000
+    assert reported(second, 0x30, 0x00) == 50
+    assert reported(second, 0x30, 0x02, signed=True) == 60000
+
+
+def test_updates_keep_the_aggregates_consistent(dual_tables):
+    tables, publish = dual_tables
+    main = tables[MAIN_NODE_ID]
+    publish(1, {"CO_PARAM_EXTERNAL_BMS_CURRENT": -20000, "CO_PARAM_EXTERNAL_BMS_SOC": 55})
+    assert reported(main, 0x30, 0x02, signed=True) == 30000
+    assert reported(main, 0x30, 0x00) == round((85 * 4000 + 55 * 2000) / 6000)
+    publish(1, {"CO_PARAM_EXTERNAL_BMS_MAXIMUM_CAPACITY": 1000, "CO_PARAM_EXTERNAL_BMS_REMAINING_CAPACITY": 550})
+    assert reported(main, 0x50, 0x08) == 5000
+    assert reported(main, 0x50, 0x09) == 3950
+    assert reported(main, 0x30, 0x00) == round((85 * 4000 + 55 * 1000) / 5000)
+    publish(0, {"CO_PARAM_EXTERNAL_BMS_VOLTAGE": 4400})
+    assert reported(main, 0x30, 0x01) == 4400
+    assert reported(tables[SECOND_NODE_ID], 0x30, 0x01) == 4500
+
+
+def test_valid_ranges_match_the_bms_protocol():
+    with open(BMS_PROTOCOL, 'r') as f:
+        protocol = json.load(f)
+    ranges = {}
+    for category, objects in protocol.items():
+        if category == "protocol":
+            continue
+        for obj in objects.values():
+            for name, parameter in obj.get("Parameters", {}).items():
+                if "Valid_Range" in parameter:
+                    ranges[name] = (parameter["Valid_Range"]["min"], parameter["Valid_Range"]["max"])
+    assert set(VALID_RANGES) == set(AGGREGATION)
+    assert VALID_RANGES == {name: ranges[name] for name in VALID_RANGES}
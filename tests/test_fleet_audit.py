@@ -0,0 +1,133 @@
+import json
+import subprocess
+import sys
+
+import can
+import pytest
+
+from conftest import REPO_ROOT
+from utils.fleet_audit import AUDIT_CACHE_FILE, SerialNumberCache, audit_fleet, select_parameters, simulated_fleet_values
+from utils.protocol_index import ProtocolIndex
+from utils.sdo_client import read_parameters
+from utils.simulated_nodes import OBJECT_DOES_NOT_EXIST, SimulatedSdoNodes
+
+CAN_LOGGER_DIR = REPO_ROOT / "FTEX_test_tools" / "CAN_Logger"
+GOLDEN = {
+    "CO_PARAM_CAN_BAUD_RATE": [3],
+    "CO_PARAM_WHEEL_DIAMETER": [27, 28],
+    "CO_PARAM_PACK_VERSION": [7],
+}
+
+
+@pytest.fixture(scope="module")
+def protocol_index():
+    return ProtocolIndex.load()
+
+
+@pytest.fixture
+def simulated_bus(request):
+    """Start simulated nodes on a virtual bus, return the bus of the client auditing them."""
+    simulations, clients = [], []
+
+    def start(nodes):
+        channel = f"fleet_audit_{request.node.name}"
+        simulations.append(SimulatedSdoNodes(can.Bus(interface='virtual', channel=channel), nodes).start())
+        clients.append(can.Bus(interface='virtual', channel=channel))
+        return clients[-1]
+
+    yield start
+    for client in clients:
+        client.shutdown()
+    for simulation in simulations:
+        simulation.stop()
+
+
+@pytest.mark.parametrize("window", [1, 4])
+def test_read_parameters_from_several_nodes(simulated_bus, window):
+    nodes = {node_id: {(0x2000, subindex): (node_id * 100 + subindex, "uint16_t") for subindex in range(8)}
+             for node_id in (1, 2, 3)}
+    bus = simulated_bus(nodes)
+    addresses = [(0x2000, subindex) for subindex in range(8)] + [(0x2001, 0x00)]
+    reads = {1: addresses, 2: addresses, 3: addresses, 4: [(0x2000, 0x00)]}  # node 4 does not exist
+    results, times = read_parameters(bus, reads, window=window, timeout=0.1, retries=1)
+
+    for node_id in (1, 2, 3):
+        for subindex in range(8):
+            result = results[node_id][(0x2000, subindex)]
+            assert result.ok and int.from_bytes(result.payload, 'little') == node_id * 100 + subindex
+        assert results[node_id][(0x2001, 0x00)].abort_code == OBJECT_DOES_NOT_EXIST
+        start, end = times[node_id]
+        assert end >= start
+    assert results[4][(0x2000, 0x00)].timed_out
+
+
+def fleet(protocol_index, node_ids, golden=GOLDEN):
+    parameters = select_parameters(protocol_index, golden, golden_only=True)
+    golden_values = {name: values[:1] for name, values in golden.items()}
+    return parameters, simulated_fleet_values(parameters, golden_values, node_ids)
+
+
+def test_audit_reports_mismatches(protocol_index, simulated_bus):
+    parameters, nodes = fleet(protocol_index, [1, 3])
+    wheel = protocol_index.parameter("CO_PARAM_WHEEL_DIAMETER", "controller")
+    nodes[3][(wheel.index, wheel.subindex)] = (29, wheel.type)
+    bus = simulated_bus(nodes)
+    report = audit_fleet([("can0", bus, [1, 3])], parameters, GOLDEN, timeout=0.2)
+
+    devices = {device["node"]: device for device in report["devices"]}
+    assert devices["0x01"]["passed"]
+    assert devices["0x01"]["serial_number"] == "0000000000001001"
+    assert not devices["0x03"]["passed"]
+    assert devices["0x03"]["mismatches"] == {"CO_PARAM_WHEEL_DIAMETER": {"expected": [27, 28], "actual": 29}}
+    assert (report["summary"]["devices"], report["summary"]["passed"]) == (2, 1)
+    assert report["summary"]["reads"] == 2 * len(parameters)
+    assert not report["bus_errors"]
+
+
+def test_audit_fails_devices_on_errors_and_unchecked_parameters(protocol_index, simulated_bus):
+    parameters, nodes = fleet(protocol_index, [1])
+    baud_rate = protocol_index.parameter("CO_PARAM_CAN_BAUD_RATE", "controller")
+    del nodes[1][(baud_rate.index, baud_rate.subindex)]
+    bus = simulated_bus(nodes)
+    golden = {**GOLDEN, "CO_PARAM_NOT_IN_THE_PROTOCOL": [1]}
+    device, = audit_fleet([("can0", bus, [1])], parameters, golden, timeout=0.2)["devices"]
+    assert not device["passed"]
+    assert device["errors"] == {"CO_PARAM_CAN_BAUD_RATE": f"abort {OBJECT_DOES_NOT_EXIST:#010x}"}
+    assert device["unchecked"] == ["CO_PARAM_NOT_IN_THE_PROTOCOL"]
+
+
+def test_boot_up_values_come_from_the_cache(protocol_index, simulated_bus, tmp_path):
+    parameters, nodes = fleet(protocol_index, [1, 2])
+    bus = simulated_bus(nodes)
+    cache_file = tmp_path / "cache" / "audit_cache.json"
+
+    first = audit_fleet([("can0", bus, [1, 2])], parameters, GOLDEN, SerialNumberCache(cache_file), timeout=0.2)
+    assert first["summary"]["cached"] == 0
+    cached = json.loads(cache_file.read_text())
+    assert cached["0000000000001001"]["values"]["CO_PARAM_PACK_VERSION"] == 7
+
+    second = audit_fleet([("can0", bus, [1, 2])], parameters, GOLDEN, SerialNumberCache(cache_file), timeout=0.2)
+    # The serial number is always read, the pack version comes from the cache
+    assert [device["cached"] for device in second["devices"]] == [1, 1]
+    assert second["summary"]["reads"] == first["summary"]["reads"] - 2
+    assert all(device["passed"] for device in second["devices"])
+
+
+def test_default_cache_is_ignored_by_git():
+    assert AUDIT_CACHE_FILE == REPO_ROOT / ".ftex_cache" / "audit_cache.json"
+    result = subprocess.run(["git", "check-ignore", "-q", str(AUDIT_CACHE_FILE)], cwd=REPO_ROOT)
+    if result.returncode == 128:
+        pytest.skip("not a git checkout")
+    assert result.returncode == 0
+
+
+def test_simulated_audit_cli(tmp_path):
+    golden_file = tmp_path / "golden.json"
+    golden_file.write_text(json.dumps(GOLDEN))
+    report_file = tmp_path / "report.json"
+    result = subprocess.run([sys.executable, "audit_fleet.py", str(golden_file), "--golden-only", "--simulate", "3",
+                             "--no-cache", "--report", str(report_file)],
+                            cwd=CAN_LOGGER_DIR, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "3/3 device(s) passed" in result.stdout
+    assert json.loads(report_file.read_text())["summary"]["devices"] == 3
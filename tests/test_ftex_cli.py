@@ -0,0 +1,50 @@
+import subprocess
+import sys
+import time
+
+from conftest import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT))
+from ftex import HEAVY_MODULES, STARTUP_BUDGETS  # noqa: E402
+
+FTEX_CLI = REPO_ROOT / "ftex.py"
+SCHEMA_FILE = REPO_ROOT / "FTEX_Protocol_JSON_Schema.json"
+PROTOCOL_FILE = REPO_ROOT / "FTEX_Peripherals_CANOpen" / "FTEX_PAS_CANOpen_protocol.json"
+
+
+def imported_modules(*args):
+    """Top-level packages imported by `python -X importtime ftex.py ARGS`."""
+    process = subprocess.run([sys.executable, "-X", "importtime", str(FTEX_CLI), *args], capture_output=True, text=True)
+    assert process.returncode == 0, process.stderr
+    modules = set()
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "imported package" not in line:
+            modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+def start_time(*command, runs=5):
+    """Best of `runs` wall-clock times of a command, in ms: the start time without the noise of other processes."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def test_help_starts_within_budget():
+    interpreter = start_time(sys.executable, "-c", "pass")
+    help_time = start_time(sys.executable, str(FTEX_CLI), "--help")
+    assert help_time - interpreter <= STARTUP_BUDGETS["help"], \
+        f"ftex --help takes {help_time - interpreter:.1f} ms on top of the interpreter start"
+
+
+def test_help_imports_no_heavy_module():
+    assert not imported_modules("--help") & set(HEAVY_MODULES)
+
+
+def test_cached_validate_imports_no_heavy_module(tmp_path):
+    args = ["validate", str(SCHEMA_FILE), str(PROTOCOL_FILE), "--cache", str(tmp_path / "schema_validation.json")]
+    imported_modules(*args)  # first run: validates, and fills the cache
+    assert not imported_modules(*args) & set(HEAVY_MODULES)
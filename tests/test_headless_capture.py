@@ -0,0 +1,136 @@
+import json
+import os
+import signal
+import threading
+
+import can
+import pytest
+
+import can_logger
+from utils.capture_reader import iter_capture
+from utils.headless_capture import HeadlessCapture
+from utils.log_segments import SegmentedLogWriter
+
+
+def virtual_config(channel, log_dir):
+    config = can_logger.load_config(log_dir / "can_config.json")  # defaults
+    config.update({"interface": "virtual", "channel": channel, "log_dir": str(log_dir)})
+    return config
+
+
+@pytest.fixture
+def restore_signal_handlers():
+    handled = [signal.SIGINT, signal.SIGTERM] + [getattr(signal, name) for name in ('SIGHUP', 'SIGBREAK')
+                                                 if hasattr(signal, name)]
+    handlers = {signum: signal.getsignal(signum) for signum in handled}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+@pytest.fixture
+def bus_pair(request):
+    channel = f"headless_{request.node.name}"
+    capture_bus = can.Bus(interface='virtual', channel=channel)
+    sender = can.Bus(interface='virtual', channel=channel)
+    yield capture_bus, sender
+    sender.shutdown()
+    capture_bus.shutdown()
+
+
+def send_frames(bus, count, index=0x2000):
+    for i in range(count):
+        data = bytes([0x40, index & 0xFF, index >> 8, i & 0xFF, 0, 0, 0, 0])
+        bus.send(can.Message(arbitration_id=0x605, data=data, is_extended_id=False))
+
+
+def test_capture_writes_filtered_frames_and_stats_file(tmp_path, bus_pair, capsys):
+    capture_bus, sender = bus_pair
+    writer = SegmentedLogWriter(tmp_path / "session", compression="none")
+    stats_file = tmp_path / "stats.json"
+    capture = HeadlessCapture(capture_bus, writer, {"obj_dir_filter": ["2000"]}, stats_interval=0,
+                              stats_file=stats_file)
+    send_frames(sender, 50, index=0x2000)
+    send_frames(sender, 30, index=0x2001)
+    sender.send(can.Message(arbitration_id=0x705, data=[0x05], is_extended_id=False))
+    capture.run(max_frames=81)
+    writer.close()
+
+    assert (capture.frames_received, capture.frames_written) == (81, 50)
+    frames = list(iter_capture(writer.session_dir))
+    assert len(frames) == 50
+    assert all(frame.data[1:3] == b"\x00\x20" for frame in frames)
+    stats = json.loads(stats_file.read_text())
+    assert stats["frames_received"] == 81
+    assert stats["frames_written"] == 50
+    assert stats["session"] == str(writer.session_dir)
+    assert not stats_file.with_name(stats_file.name + ".tmp").exists()
+    assert "81 received, 50 written" in capsys.readouterr().out
+
+
+def test_stop_ends_the_capture(tmp_path, bus_pair):
+    capture_bus, _ = bus_pair
+    writer = SegmentedLogWriter(tmp_path / "session", compression="none")
+    capture = HeadlessCapture(capture_bus, writer, {"obj_dir_filter": []}, stats_interval=3600)
+    thread = threading.Thread(target=capture.run)
+    thread.start()
+    threading.Timer(0.2, capture.stop).start()
+    thread.join(timeout=3)
+    writer.close()
+    assert not thread.is_alive()
+    assert not capture.running
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason="SIGHUP rotation is tested where the signal can be sent")
+def test_signals_rotate_the_segment_and_stop(tmp_path, bus_pair, restore_signal_handlers):
+    capture_bus, sender = bus_pair
+    writer = SegmentedLogWriter(tmp_path / "session", compression="none")
+    capture = HeadlessCapture(capture_bus, writer, {"obj_dir_filter": []}, stats_interval=3600)
+    capture.install_signal_handlers()
+
+    send_frames(sender, 10)
+    capture.run(max_frames=10)
+    os.kill(os.getpid(), signal.SIGHUP)
+    send_frames(sender, 20)
+    capture.run(max_frames=20)
+    writer.close()
+    assert [manifest["frame_count"] for manifest in writer.manifests] == [10, 20]
+
+    thread = threading.Thread(target=capture.run)
+    thread.start()
+    while not capture.running:
+        pass
+    os.kill(os.getpid(), signal.SIGTERM)
+    thread.join(timeout=3)
+    assert not thread.is_alive()
+
+
+def test_run_headless_captures_for_the_duration(tmp_path, restore_signal_handlers, capsys):
+    config = virtual_config("headless_run", tmp_path / "logs")
+    with can.Bus(interface='virtual', channel="headless_run") as sender:
+        timer = threading.Timer(0.2, send_frames, args=(sender, 25))
+        timer.start()
+        can_logger.run_headless(config, duration=1.0, stats_interval=3600, stats_file=tmp_path / "stats.json")
+        timer.join()
+    session_dir, = (tmp_path / "logs").iterdir()
+    assert len(list(iter_capture(session_dir))) == 25
+    assert json.loads((tmp_path / "stats.json").read_text())["frames_written"] == 25
+    assert "Capture stopped, 1 segment(s) written." in capsys.readouterr().out
+
+
+def test_run_headless_releases_the_bus_when_the_log_writer_fails(tmp_path, monkeypatch, restore_signal_handlers):
+    opened = []
+
+    def open_capture_bus(config):
+        bus = can.Bus(interface='virtual', channel="headless_writer_failure")
+        opened.append(bus)
+        return bus
+
+    def create_log_file(config):
+        raise PermissionError("log directory is read-only")
+
+    monkeypatch.setattr(can_logger, "open_capture_bus", open_capture_bus)
+    monkeypatch.setattr(can_logger, "create_log_file", create_log_file)
+    with pytest.raises(PermissionError):
+        can_logger.run_headless(virtual_config("headless_writer_failure", tmp_path / "logs"), duration=0.1)
+    assert len(opened) == 1 and opened[0]._is_shutdown
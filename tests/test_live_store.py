@@ -0,0 +1,198 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import utils.live_store
+from utils.live_store import SEQUENCE, LiveStoreReader, LiveStoreWriter
+from utils.protocol_index import ProtocolIndex
+
+CAN_LOGGER_DIR = Path(__file__).resolve().parents[1] / "FTEX_test_tools" / "CAN_Logger"
+BMS_NODE = 0x05
+CONTROLLER_NODE = 0x01
+
+# Writer process updating one BMS slot as fast as it can, value == timestamp, until the store is closed
+HAMMER_WRITER = """
+import sys, time
+from utils.live_store import LiveStoreWriter
+from utils.protocol_index import ProtocolIndex
+writer = LiveStoreWriter(sys.argv[1], ProtocolIndex.load())
+index, subindex = int(sys.argv[2]), int(sys.argv[3])
+print("ready", flush=True)
+end = time.monotonic() + float(sys.argv[4])
+i = 0
+while time.monotonic() < end:
+    i += 1
+    writer.update(0x05, index, subindex, i.to_bytes(4, "little"), float(i))
+writer.close()
+"""
+
+
+def find_parameter(protocol_index, device, type_name):
+    return next(parameter for parameter in protocol_index.by_address.values()
+                if parameter.device == device and parameter.type == type_name)
+
+
+def sdo_frame(command, parameter, payload=b""):
+    return bytes([command, parameter.index & 0xFF, parameter.index >> 8, parameter.subindex]) + payload.ljust(4, b"\0")
+
+
+@pytest.fixture(scope="module")
+def protocol_index():
+    return ProtocolIndex.load()
+
+
+@pytest.fixture
+def store(tmp_path, protocol_index):
+    writer = LiveStoreWriter(tmp_path / "live_store", protocol_index)
+    reader = LiveStoreReader(writer.path)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_upload_response_is_published(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "bms", "uint16_t")
+    writer.add(100.0, 0x580 + BMS_NODE, sdo_frame(0x4B, parameter, b"\x34\x12"))
+    assert reader.read(BMS_NODE, parameter.index, parameter.subindex) == (0x1234, 100.0)
+    assert reader.snapshot() == {(BMS_NODE, parameter.index, parameter.subindex): (0x1234, 100.0)}
+
+
+def test_download_is_published_once_acknowledged(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "controller", "int16_t")
+    address = (CONTROLLER_NODE, parameter.index, parameter.subindex)
+    writer.add(1.0, 0x600 + CONTROLLER_NODE, sdo_frame(0x2B, parameter, b"\xfe\xff"))
+    assert reader.read(*address) is None
+    writer.add(2.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x60, parameter))
+    assert reader.read(*address) == (-2, 2.0)
+
+
+def test_download_is_paired_with_the_ack_of_its_channel(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "controller", "int16_t")
+    address = (CONTROLLER_NODE, parameter.index, parameter.subindex)
+    writer.add(1.0, 0x600 + CONTROLLER_NODE, sdo_frame(0x2B, parameter, b"\x05\x00"), channel="can0")
+    writer.add(2.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x60, parameter), channel="can1")
+    assert reader.read(*address) is None
+    writer.add(3.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x60, parameter), channel="can0")
+    assert reader.read(*address) == (5, 3.0)
+
+
+def test_aborted_download_is_never_published(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "controller", "int16_t")
+    address = (CONTROLLER_NODE, parameter.index, parameter.subindex)
+    writer.add(1.0, 0x600 + CONTROLLER_NODE, sdo_frame(0x2B, parameter, b"\x07\x00"))
+    writer.add(2.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x80, parameter, b"\x00\x00\x02\x06"))
+    writer.add(3.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x60, parameter))
+    assert reader.read(*address) is None
+    assert not writer._pending_downloads
+
+
+def test_pending_downloads_are_bounded(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "controller", "int16_t")
+    for value in range(10):
+        writer.add(1.0, 0x600 + CONTROLLER_NODE, sdo_frame(0x2B, parameter, bytes([value, 0])))
+    writer.add(1.0, 0x600 + 0x7F, sdo_frame(0x2B, parameter, b"\x01\x00"))  # node without slots
+    assert len(writer._pending_downloads) == 1
+    writer.add(2.0, 0x580 + CONTROLLER_NODE, sdo_frame(0x60, parameter))
+    assert reader.read(CONTROLLER_NODE, parameter.index, parameter.subindex) == (9, 2.0)
+
+
+def test_never_written_and_unknown_slots(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "bms", "uint32_t")
+    assert (BMS_NODE, parameter.index, parameter.subindex) in reader.addresses
+    assert reader.read(BMS_NODE, parameter.index, parameter.subindex) is None
+    assert reader.read(0x7F, 0xFFFF, 0xFF) is None
+    assert len(reader.addresses) == writer.slot_count
+    assert reader.snapshot() == {}
+
+
+def test_reader_is_stale_after_close(tmp_path, protocol_index):
+    writer = LiveStoreWriter(tmp_path / "live_store", protocol_index)
+    reader = LiveStoreReader(writer.path)
+    assert not reader.is_stale()
+    writer.close()
+    assert reader.closed_by_writer and reader.is_stale()
+    reader.close()
+
+
+def test_reader_is_stale_after_restart(tmp_path, protocol_index):
+    writer = LiveStoreWriter(tmp_path / "live_store", protocol_index)
+    reader = LiveStoreReader(writer.path)
+    restarted = LiveStoreWriter(writer.path, protocol_index)
+    assert not reader.closed_by_writer and reader.is_stale()
+    reader.close()
+    restarted.close()
+    writer.close()
+
+
+def test_store_rewritten_in_place_when_it_cannot_be_replaced(tmp_path, protocol_index, monkeypatch):
+    # Windows: the store of the previous writer is still open in a reader
+    parameter = find_parameter(protocol_index, "bms", "uint16_t")
+    address = (BMS_NODE, parameter.index, parameter.subindex)
+    writer = LiveStoreWriter(tmp_path / "live_store", protocol_index)
+    writer.add(1.0, 0x580 + BMS_NODE, sdo_frame(0x4B, parameter, b"\x01\x00"))
+    reader = LiveStoreReader(writer.path)
+    writer.close()
+
+    def replace(source, destination):
+        raise PermissionError("file in use")
+
+    monkeypatch.setattr(utils.live_store.os, "replace", replace)
+    restarted = LiveStoreWriter(writer.path, protocol_index)
+    assert reader.is_stale()
+    reader.close()
+    assert not (tmp_path / "live_store.tmp").exists()
+
+    reader = LiveStoreReader(restarted.path)
+    assert not reader.is_stale()
+    assert reader.read(*address) is None  # values of the previous writer are gone
+    restarted.add(2.0, 0x580 + BMS_NODE, sdo_frame(0x4B, parameter, b"\x02\x00"))
+    assert reader.read(*address) == (2, 2.0)
+    reader.close()
+    restarted.close()
+
+
+def test_slot_being_written_is_not_returned(store, protocol_index):
+    writer, reader = store
+    parameter = find_parameter(protocol_index, "bms", "uint16_t")
+    writer.add(1.0, 0x580 + BMS_NODE, sdo_frame(0x4B, parameter, b"\x01\x00"))
+    offset, _ = writer._slots[(BMS_NODE, parameter.index, parameter.subindex)]
+    SEQUENCE.pack_into(writer._mmap, offset, writer._sequences[offset] + 1)  # writer stopped mid-update
+    with pytest.raises(RuntimeError):
+        reader.read(BMS_NODE, parameter.index, parameter.subindex)
+
+
+def test_concurrent_reads_are_never_torn(tmp_path, protocol_index):
+    parameter = find_parameter(protocol_index, "bms", "uint32_t")
+    path = tmp_path / "live_store"
+    writer = subprocess.Popen(
+        [sys.executable, "-c", HAMMER_WRITER, str(path), str(parameter.index), str(parameter.subindex), "0.5"],
+        stdout=subprocess.PIPE, text=True, cwd=CAN_LOGGER_DIR)
+    try:
+        assert writer.stdout.readline().strip() == "ready"
+        reader = LiveStoreReader(path)
+        reads = 0
+        while not reader.closed_by_writer:
+            entry = reader.read(BMS_NODE, parameter.index, parameter.subindex)
+            if entry is not None:
+                value, timestamp = entry
+                assert value == int(timestamp)
+                reads += 1
+        reader.close()
+    finally:
+        writer.wait(10)
+    assert reads > 0
+
+
+def test_not_a_live_store(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        LiveStoreReader(path)
@@ -0,0 +1,71 @@
+import shutil
+import time
+
+import pytest
+
+from utils.capture_index import SegmentIndexBuilder, build_capture_index, index_path_for, query_capture
+from utils.capture_reader import capture_segments, iter_capture
+from utils.log_segments import SegmentedLogWriter
+
+FRAME_COUNT = 600
+
+
+def write_session(session_dir, compression):
+    """Capture of FRAME_COUNT frames, 10 ms apart, on 0x585 (even frames) and 0x605, over several segments."""
+    start = round(time.time()) - 60
+    log_writer = SegmentedLogWriter(session_dir, compression=compression, max_segment_bytes=8 * 1024,
+                                    index_builder_factory=SegmentIndexBuilder)
+    frames = []
+    for i in range(FRAME_COUNT):
+        frame = (start + i * 0.01, 0x585 if i % 2 == 0 else 0x605, bytes([0x4B, 0x30, 0x00, 0x01, i & 0xFF, 0, 0, 0]))
+        log_writer.write(*frame)
+        frames.append(frame)
+    log_writer.close()
+    return frames
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_round_trip_write_index_query(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    frames = write_session(tmp_path, compression)
+    segments = capture_segments(tmp_path)
+    assert len(segments) > 1
+    assert all(index_path_for(segment.path).exists() for segment in segments)
+
+    read = [(round(frame.timestamp, 3), frame.can_id, frame.data) for frame in iter_capture(tmp_path)]
+    assert read == [(round(timestamp, 3), can_id, data) for timestamp, can_id, data in frames]
+
+    # Seeks through the segments, from the sidecar indexes
+    by_id = list(query_capture(tmp_path, can_ids=[0x605]))
+    assert len(by_id) == FRAME_COUNT // 2 and {frame.can_id for frame in by_id} == {0x605}
+    start_time, end_time = frames[200][0], frames[399][0]
+    by_time = list(query_capture(tmp_path, start_time=start_time - 0.001, end_time=end_time + 0.001))
+    assert [frame.data[4] for frame in by_time] == [i & 0xFF for i in range(200, 400)]
+
+    # Rebuilt by reading the segments back
+    assert len(build_capture_index(tmp_path, force=True)) == len(segments)
+    assert len(list(query_capture(tmp_path, can_ids=[0x585], start_time=start_time - 0.001))) == 200
+
+
+def failing_writer(tmp_path):
+    session_dir = tmp_path / "session"
+    log_writer = SegmentedLogWriter(session_dir, compression="none")
+    shutil.rmtree(session_dir)  # the first segment cannot be created
+    log_writer.write(1.0, 0x585, b"\x4b\x30\x00\x01")
+    log_writer._thread.join(5)
+    return log_writer
+
+
+def test_writer_error_is_raised_by_write(tmp_path):
+    log_writer = failing_writer(tmp_path)
+    assert isinstance(log_writer.error, FileNotFoundError)
+    with pytest.raises(RuntimeError, match="Log writer stopped"):
+        log_writer.write(2.0, 0x585, b"\x4b\x30\x00\x01")
+    log_writer.close()  # already reported: does not wait nor raise again
+
+
+def test_writer_error_is_raised_by_close(tmp_path):
+    log_writer = failing_writer(tmp_path)
+    with pytest.raises(RuntimeError, match="Log writer stopped"):
+        log_writer.close()
@@ -0,0 +1,106 @@
+import json
+import time
+
+import can
+import pytest
+
+from utils.headless_capture import HeadlessCapture
+from utils.log_segments import SegmentedLogWriter
+from utils.metrics import MetricsExporter, MetricsRegistry, metrics_format_for
+from utils.simulated_nodes import SimulatedSdoNodes
+
+
+def parse_prometheus(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    frames = {"count": 0}
+    registry.counter("frames_total", "Frames received", {"channel": "can0"}, func=lambda: frames["count"])
+    registry.counter("frames_total", "Frames received", {"channel": "can1"}).inc(3)
+    registry.gauge("queue_depth", "Frames queued").set(7)
+    histogram = registry.histogram("response_seconds", "Response time", buckets=(0.001, 0.01))
+    for value in (0.0005, 0.001, 0.005, 0.5):
+        histogram.observe(value)
+    frames["count"] = 42  # callbacks are read at export time
+
+    text = registry.prometheus_text()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert lines.count("# HELP frames_total Frames received") == 1
+    assert lines.count("# TYPE frames_total counter") == 1
+    assert "# TYPE queue_depth gauge" in lines
+    assert "# TYPE response_seconds histogram" in lines
+    assert parse_prometheus(text) == {
+        'frames_total{channel="can0"}': 42,
+        'frames_total{channel="can1"}': 3,
+        'queue_depth': 7,
+        'response_seconds_bucket{le="0.001"}': 2,
+        'response_seconds_bucket{le="0.01"}': 3,
+        'response_seconds_bucket{le="+Inf"}': 4,
+        'response_seconds_sum': pytest.approx(0.5065),
+        'response_seconds_count': 4,
+    }
+
+
+def test_json_snapshot_and_format_selection(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames received", {"channel": "can0"}).inc(2)
+    path = tmp_path / "metrics.json"
+    registry.write(path, metrics_format_for(path))
+    snapshot = json.loads(path.read_text())
+    assert snapshot["metrics"] == [{"name": "frames_total", "type": "counter", "value": 2, "labels": {"channel": "can0"}}]
+    assert not (tmp_path / "metrics.json.tmp").exists()
+    assert metrics_format_for("metrics.prom") == "prometheus"
+    assert metrics_format_for("metrics.prom", "json") == "json"
+    with pytest.raises(ValueError):
+        metrics_format_for("metrics.prom", "xml")
+
+
+def test_exporter_writes_on_stop(tmp_path):
+    registry = MetricsRegistry()
+    counter = registry.counter("frames_total", "Frames received")
+    path = tmp_path / "metrics.prom"
+    exporter = MetricsExporter(registry, path, interval=3600).start()
+    counter.inc(5)
+    exporter.stop()
+    assert parse_prometheus(path.read_text()) == {"frames_total": 5}
+
+
+def test_headless_capture_metrics(tmp_path):
+    # A client polling a simulated BMS: the capture counts the frames and times the SDO responses
+    channel = "metrics_capture"
+    nodes = SimulatedSdoNodes(can.Bus(interface='virtual', channel=channel),
+                              {0x05: {(0x0030, 0x00): (85, "uint8_t")}}).start()
+    capture_bus = can.Bus(interface='virtual', channel=channel)
+    client = can.Bus(interface='virtual', channel=channel)
+    registry = MetricsRegistry()
+    writer = SegmentedLogWriter(tmp_path / "session", compression="none")
+    capture = HeadlessCapture(capture_bus, writer, {"obj_dir_filter": []}, stats_interval=3600, metrics=registry)
+    try:
+        for _ in range(20):
+            client.send(can.Message(arbitration_id=0x605, data=[0x40, 0x30, 0x00, 0x00, 0, 0, 0, 0],
+                                    is_extended_id=False))
+            time.sleep(0.005)
+        capture.run(max_frames=40)
+    finally:
+        writer.close()
+        client.shutdown()
+        capture_bus.shutdown()
+        nodes.stop()
+
+    samples = parse_prometheus(registry.prometheus_text())
+    assert samples["can_logger_frames_received_total"] == 40
+    assert samples["can_logger_frames_logged_total"] == 40
+    assert samples["can_log_writer_frames_written_total"] == 40
+    assert samples["can_log_writer_segments_closed_total"] == 1
+    assert samples["sdo_response_seconds_count"] == 20
+    assert samples['sdo_response_seconds_bucket{le="+Inf"}'] == 20
+    assert samples["sdo_timeouts_total"] == 0
+    assert samples["sdo_pending_requests"] == 0
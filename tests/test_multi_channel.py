@@ -0,0 +1,128 @@
+import time
+
+import can
+import pytest
+
+import utils.multi_channel
+from utils.multi_channel import MergedBus, channel_configs, open_capture_bus
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def frame(can_id, timestamp, **kwargs):
+    return can.Message(arbitration_id=can_id, data=[0x05], is_extended_id=False, timestamp=timestamp, **kwargs)
+
+
+@pytest.fixture
+def channels(request):
+    # Senders keep the timestamps they are given, as if the frames were stamped by the interfaces
+    name = request.node.name
+    buses = {f"can{i}": can.Bus(interface='virtual', channel=f"{name}_{i}") for i in range(2)}
+    senders = [can.Bus(interface='virtual', channel=f"{name}_{i}", preserve_timestamps=True) for i in range(2)]
+    yield buses, senders
+    for sender in senders:
+        sender.shutdown()
+
+
+def test_frames_are_merged_in_timestamp_order(channels):
+    buses, senders = channels
+    merged = MergedBus(buses, max_latency=1.0)
+    try:
+        # The second channel delivers all its frames before the first one
+        for i in range(50):
+            senders[1].send(frame(0x185, 100.0 + 2 * i + 1))
+        for i in range(50):
+            senders[0].send(frame(0x701, 100.0 + 2 * i))
+        received = [merged.recv(2.0) for _ in range(100)]
+    finally:
+        merged.shutdown()
+    assert None not in received
+    # Frames of the second channel wait for the first channel to go past them (or for max_latency)
+    assert [msg.timestamp for msg in received] == [100.0 + i for i in range(100)]
+    assert {msg.channel for msg in received if msg.arbitration_id == 0x701} == {"can0"}
+    assert {msg.channel for msg in received if msg.arbitration_id == 0x185} == {"can1"}
+    assert all(bus._is_shutdown for bus in buses.values())
+
+
+def test_silent_channel_delays_frames_by_max_latency_only(channels):
+    buses, senders = channels
+    merged = MergedBus(buses, max_latency=0.1)
+    try:
+        senders[0].send(frame(0x701, 100.0))
+        start = time.monotonic()
+        msg = merged.recv(2.0)
+        waited = time.monotonic() - start
+    finally:
+        merged.shutdown()
+    assert msg is not None and msg.channel == "can0"
+    assert 0.05 <= waited < 1.0
+
+
+def test_drop_and_error_frame_counters(channels):
+    buses, senders = channels
+    merged = MergedBus(buses, max_latency=0.05, queue_size=5)
+    try:
+        for i in range(20):
+            senders[0].send(frame(0x701, 100.0 + i))
+        senders[1].send(frame(0x000, 100.0, is_error_frame=True))
+        assert wait_until(lambda: sum(channel["received"] for channel in merged.channel_stats()) == 21)
+        stats = {channel["name"]: channel for channel in merged.channel_stats()}
+    finally:
+        merged.shutdown()
+    assert stats["can0"]["received"] == 20
+    assert stats["can0"]["dropped"] == 15
+    assert stats["can0"]["queued"] == 5
+    assert stats["can1"]["error_frames"] == 1
+    assert stats["can1"]["dropped"] == 0
+
+
+class FailingBus:
+    def __init__(self):
+        self.is_shutdown = False
+
+    def recv(self, timeout=None):
+        time.sleep(0.01)
+        raise can.CanOperationError("device unplugged")
+
+    def shutdown(self):
+        self.is_shutdown = True
+
+
+def test_receive_errors_are_counted():
+    failing = FailingBus()
+    merged = MergedBus({"can0": failing})
+    try:
+        assert wait_until(lambda: merged.channel_stats()[0]["receive_errors"] >= 2)
+    finally:
+        merged.shutdown()
+    assert failing.is_shutdown
+
+
+def test_opened_channels_are_closed_when_another_fails(monkeypatch):
+    opened = []
+
+    def open_bus(config):
+        if config["name"] == "broken":
+            raise can.CanInitializationError("no such channel")
+        bus = can.Bus(interface='virtual', channel=config["channel"])
+        opened.append(bus)
+        return bus
+
+    monkeypatch.setattr(utils.multi_channel, "open_bus", open_bus)
+    config = {"interface": "virtual", "channel": "", "channels": [
+        {"name": "motor", "channel": "open_failure_0"},
+        {"name": "battery", "channel": "open_failure_1"},
+        {"name": "broken", "channel": "open_failure_2"},
+    ]}
+    assert [channel["name"] for channel in channel_configs(config)] == ["motor", "battery", "broken"]
+    with pytest.raises(can.CanInitializationError):
+        open_capture_bus(config)
+    assert len(opened) == 2
+    assert all(bus._is_shutdown for bus in opened)
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from utils.protocol_index import ProtocolIndex
+
+
+def write_protocol(path, parameters):
+    data = {"protocol": {}, "section": {"CO_ID_TEST": {"CANOpen_Index": "0x2000", "Parameters": parameters}}}
+    path.write_text(json.dumps(data))
+
+
+@pytest.fixture
+def protocol_index(tmp_path):
+    write_protocol(tmp_path / "bms.json", {"CO_PARAM_SHARED": {"Subindex": "0x00", "Type": "uint8_t"},
+                                           "CO_PARAM_BMS_ONLY": {"Subindex": "0x01", "Type": "uint16_t"}})
+    write_protocol(tmp_path / "pas.json", {"CO_PARAM_SHARED": {"Subindex": "0x02", "Type": "uint32_t"}})
+    devices = {"bms": {"files": ["bms.json"], "node_ids": [0x05]}, "pas": {"files": ["pas.json"], "node_ids": [0x10]}}
+    return ProtocolIndex(devices, repo_root=tmp_path)
+
+
+def test_name_defined_by_several_devices(protocol_index):
+    assert protocol_index.parameter("CO_PARAM_SHARED", "bms").subindex == 0
+    assert protocol_index.parameter("CO_PARAM_SHARED", "pas").subindex == 2
+    with pytest.raises(ValueError, match="several devices"):
+        protocol_index.parameter("CO_PARAM_SHARED")
+
+
+def test_name_defined_by_one_device(protocol_index):
+    assert protocol_index.parameter("CO_PARAM_BMS_ONLY").device == "bms"
+    assert protocol_index.parameter("CO_PARAM_BMS_ONLY", "pas") is None
+    assert protocol_index.parameter("CO_PARAM_UNKNOWN") is None
+    assert protocol_index.lookup(0x10, 0x2000, 2).name == "CO_PARAM_SHARED"
@@ -0,0 +1,21 @@
+import sys
+
+from conftest import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT))
+import FTEX_Schema_validator as validator  # noqa: E402
+
+
+def protocol(index, parameters):
+    return {"protocol": {}, "section": {f"CO_ID_{index}": {"CANOpen_Index": index, "Parameters": parameters}}}
+
+
+def test_name_defined_by_two_protocols_is_reported():
+    protocol_index = validator.ProtocolIndex()
+    protocol_index.add_protocol(protocol("0x2000", {"CO_PARAM_SHARED": {"Subindex": "0x00", "Type": "uint8_t"}}), "a.json")
+    protocol_index.add_protocol(protocol("0x3000", {"CO_PARAM_SHARED": {"Subindex": "0x00", "Type": "uint16_t"}}), "b.json")
+    protocol_index.add_protocol(protocol("0x3000", {"CO_PARAM_ONLY_B": {"Subindex": "0x01", "Type": "uint8_t",
+                                                                        "Access": "R/W"}}), "b.json")
+    assert protocol_index.duplicate_names() == {"CO_PARAM_SHARED": ["a.json", "b.json"]}
+    assert not validator.validate_test_file({"CO_PARAM_SHARED": [1]}, protocol_index)
+    assert validator.validate_test_file({"CO_PARAM_ONLY_B": [1]}, protocol_index, write_test=True)
@@ -0,0 +1,67 @@
+from utils.sdo_latency import SdoLatencyAnalyzer
+
+NODE = 0x05
+
+
+def request(command, index=0x2000, subindex=0x00, payload=b'\x00\x00\x00\x00'):
+    return 0x600 + NODE, bytes([command, index & 0xFF, index >> 8, subindex]) + payload
+
+
+def response(command, index=0x2000, subindex=0x00, payload=b'\x00\x00\x00\x00'):
+    return 0x580 + NODE, bytes([command, index & 0xFF, index >> 8, subindex]) + payload
+
+
+def test_expedited_upload_latency():
+    analyzer = SdoLatencyAnalyzer(timeout=0.5)
+    analyzer.add(10.000, *request(0x40))
+    analyzer.add(10.004, *response(0x4B, payload=b'\x2a\x00\x00\x00'))
+    stats = analyzer.per_node[NODE]
+    assert stats.responses == 1
+    assert abs(stats.max_latency - 0.004) < 1e-9
+    assert stats.timeouts == 0 and not analyzer.outstanding
+
+
+def test_segment_frames_are_not_paired():
+    analyzer = SdoLatencyAnalyzer(timeout=0.5)
+    # Segmented upload: initiate, segment requests 0x60/0x70 and their responses (toggle bit, last segment flag)
+    analyzer.add(1.000, *request(0x40))
+    analyzer.add(1.002, *response(0x41, payload=b'\x10\x00\x00\x00'))
+    analyzer.add(1.004, 0x600 + NODE, bytes([0x60, 0x00, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(1.006, 0x580 + NODE, bytes([0x00, 0x00, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(1.008, 0x600 + NODE, bytes([0x70, 0x00, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(1.010, 0x580 + NODE, bytes([0x11, 0x00, 0x20, 0x00, 0, 0, 0, 0]))
+    # Segmented download: initiate, acknowledgement, then download segments (0x00-0x1F) acknowledged by 0x20/0x30
+    analyzer.add(2.000, *request(0x21, index=0x2001, payload=b'\x10\x00\x00\x00'))
+    analyzer.add(2.002, *response(0x60, index=0x2001))
+    analyzer.add(2.004, 0x600 + NODE, bytes([0x00, 0x01, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(2.006, 0x580 + NODE, bytes([0x20, 0x01, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(2.008, 0x600 + NODE, bytes([0x11, 0x01, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(2.010, 0x580 + NODE, bytes([0x30, 0x01, 0x20, 0x00, 0, 0, 0, 0]))
+    analyzer.add(5.000, 0x700 + NODE, bytes([0x05]))
+
+    stats = analyzer.per_node[NODE]
+    assert stats.responses == 2  # the two initiate exchanges only
+    assert abs(stats.max_latency - 0.002) < 1e-9
+    assert stats.timeouts == 0
+    assert analyzer.unmatched_responses == 0
+    assert not analyzer.outstanding
+
+
+def test_late_response_is_a_timeout_not_a_latency():
+    analyzer = SdoLatencyAnalyzer(timeout=0.5)
+    analyzer.add(10.0, *request(0x40))
+    analyzer.add(10.8, *response(0x4B))
+    stats = analyzer.per_node[NODE]
+    assert stats.timeouts == 1
+    assert stats.responses == 0
+    assert analyzer.unmatched_responses == 1
+
+
+def test_abort_is_counted_with_its_code():
+    analyzer = SdoLatencyAnalyzer(timeout=0.5)
+    analyzer.add(10.0, *request(0x2B, payload=b'\xff\xff\x00\x00'))
+    analyzer.add(10.001, *response(0x80, payload=(0x06090031).to_bytes(4, 'little')))
+    stats = analyzer.per_node[NODE]
+    assert dict(stats.aborts) == {0x06090031: 1}
+    assert stats.responses == 0 and stats.timeouts == 0
+    assert analyzer.recent_aborts[-1][1:] == (NODE, 0x2000, 0x00, 0x06090031)
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from utils.timing_stats import HISTOGRAM_BUCKETS, LogHistogram, TimingStats
+
+
+@pytest.mark.parametrize("us", [0, 1, 31, 32, 33, 63, 64, 1000, 50_000, 1_000_000, 3_600_000_000])
+def test_bucket_bounds_contain_the_duration(us):
+    seconds = us / 1_000_000
+    low, high = LogHistogram.bucket_bounds(LogHistogram.bucket_index(seconds))
+    assert low <= seconds < high
+    # Exact below 32 us, then at most 1/16 (6.25%) of the duration wide
+    assert high - low <= max(1e-6, low / 16) + 1e-12
+
+
+def test_buckets_are_contiguous_and_increasing():
+    previous_high = 0.0
+    for index in range(HISTOGRAM_BUCKETS):
+        low, high = LogHistogram.bucket_bounds(index)
+        assert low == pytest.approx(previous_high)
+        assert high > low
+        previous_high = high
+
+
+def test_out_of_range_durations_are_clamped():
+    assert LogHistogram.bucket_index(-0.001) == 0
+    assert LogHistogram.bucket_index(10 ** 6) == HISTOGRAM_BUCKETS - 1
+
+
+def test_percentiles_within_the_bucket_error():
+    histogram = LogHistogram()
+    rng = random.Random(1)
+    durations = sorted(rng.uniform(0.001, 0.2) for _ in range(10000))
+    for duration in durations:
+        histogram.add(duration)
+    assert LogHistogram().percentile(0.5) is None
+    for fraction in (0.5, 0.9, 0.99):
+        exact = durations[int(fraction * len(durations)) - 1]
+        assert histogram.percentile(fraction) == pytest.approx(exact, rel=0.0625)
+
+
+def test_top_ids_follow_the_busiest_ids():
+    stats = TimingStats(top_k=3)
+    rng = random.Random(2)
+    counts = {}
+    for i in range(5000):
+        # Skewed load over 20 IDs: the busiest change over time
+        can_id = 0x180 + min(int(rng.expovariate(0.3 if i < 2500 else 0.1)), 19)
+        stats.add(i * 0.001, can_id)
+        counts[can_id] = counts.get(can_id, 0) + 1
+    expected = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:3]
+    assert [count for _, count in stats.top_ids()] == [count for _, count in expected]
+    assert all(counts[can_id] == count for can_id, count in stats.top_ids())
+
+
+def test_heartbeat_requirement():
+    stats = TimingStats()
+    for i in range(100):
+        stats.add(i * 0.040, 0x705)  # BMS: every 40 ms
+        stats.add(i * 0.040 + 0.001, 0x585)
+    for i in range(10):
+        stats.add(i * 0.040 + (0.030 if i == 5 else 0.0), 0x701)  # controller: one 70 ms gap
+    stats.add(1.0, 0x710)  # single heartbeat
+
+    heartbeats = dict(stats.heartbeats())
+    assert set(heartbeats) == {0x01, 0x05, 0x10}
+    assert TimingStats.meets_heartbeat_requirement(heartbeats[0x05]) is True
+    assert TimingStats.meets_heartbeat_requirement(heartbeats[0x01]) is False
+    assert TimingStats.meets_heartbeat_requirement(heartbeats[0x10]) is None
+    assert heartbeats[0x05].jitter == pytest.approx(0.0, abs=1e-9)
+    assert heartbeats[0x05].p50_period == pytest.approx(0.040, rel=0.0625)